@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_project.settings')
 
 application = get_asgi_application()
+
+# Under an ASGI server (e.g. `uvicorn django_project.asgi:application`) the task events
+# endpoint (/events/, see tasks/events.py) is a long-lived Server-Sent Events stream.
+# Under WSGI the same endpoint answers once and the browser polls it
+# With DJANGO_ASYNC_API=1 the JSON API is served by its async views (see tasks/api.py)
@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from tasks.fragments import card_stats
+
+
+logger = logging.getLogger(__name__)
+
+
+# A Prometheus histogram with one series per label value, kept in process memory.
+# Every worker process has its own, the scraper sums them up. The last bucket must be +Inf
+class Histogram:
+    def __init__(self, name, documentation, buckets, label='view'):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.label = label
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, label_value, value):
+        with self.lock:
+            counts, total = self.series.get(label_value, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self.series[label_value] = (counts, total + value)
+
+    # The Prometheus text format: cumulative buckets, then sum and count
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = sorted((label_value, list(counts), total)
+                            for label_value, (counts, total) in self.series.items())
+        for label_value, counts, total in series:
+            label = f'{self.label}="{escape_label(label_value)}"'
+            for bound, bucket_count in zip(self.buckets, counts):
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{{{label},le="{le}"}} {bucket_count}')
+            lines.append(f'{self.name}_sum{{{label}}} {total!r}')
+            lines.append(f'{self.name}_count{{{label}}} {counts[-1]}')
+        return lines
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, float('inf'))
+
+REQUEST_SECONDS = Histogram('django_request_duration_seconds', 'Wall time of the requests', SECONDS_BUCKETS)
+DB_QUERIES = Histogram('django_request_db_queries', 'Database queries per request', QUERY_BUCKETS)
+DB_SECONDS = Histogram('django_request_db_duration_seconds', 'Database time per request', SECONDS_BUCKETS)
+TEMPLATE_SECONDS = Histogram('django_request_template_duration_seconds',
+                             'Template response render time per request', SECONDS_BUCKETS)
+HISTOGRAMS = (REQUEST_SECONDS, DB_QUERIES, DB_SECONDS, TEMPLATE_SECONDS)
+
+
+# What one request spent, filled by the database execute wrapper and the render callback
+class RequestMetrics:
+    def __init__(self, keep_sql):
+        self.keep_sql = keep_sql
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.sql = []
+
+    # connection.execute_wrapper() hook, it sees every query of the request
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += elapsed
+            if self.keep_sql:
+                self.sql.append((elapsed, sql))
+
+
+# This middleware records the wall time, the database queries and time, and the template
+# render time of every request into the histograms above, labeled by URL name.
+# With SLOW_REQUEST_SECONDS set, slower requests are logged with their SQL.
+# It should come first in MIDDLEWARE so that it sees the other middleware's queries.
+# It is async-capable, so that under ASGI the async views aren't run through a thread
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, started = self.start(request)
+        with ExitStack() as stack:
+            self.wrap_connections(stack, metrics)
+            response = self.get_response(request)
+        self.finish(request, metrics, started)
+        return response
+
+    # The queries of an ASGI request run in its thread sensitive thread (see
+    # asgiref.sync.sync_to_async), the wrappers go on that thread's connections
+    async def __acall__(self, request):
+        metrics, started = self.start(request)
+        stack = ExitStack()
+        await sync_to_async(self.wrap_connections)(stack, metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.finish(request, metrics, started)
+        return response
+
+    def start(self, request):
+        slow_after = getattr(settings, 'SLOW_REQUEST_SECONDS', None)
+        request._metrics = RequestMetrics(keep_sql=slow_after is not None)
+        return request._metrics, time.perf_counter()
+
+    def wrap_connections(self, stack, metrics):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics))
+
+    def finish(self, request, metrics, started):
+        elapsed = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unmatched'
+        REQUEST_SECONDS.observe(view, elapsed)
+        DB_QUERIES.observe(view, metrics.queries)
+        DB_SECONDS.observe(view, metrics.db_seconds)
+        TEMPLATE_SECONDS.observe(view, metrics.render_seconds)
+
+        slow_after = getattr(settings, 'SLOW_REQUEST_SECONDS', None)
+        if slow_after is not None and elapsed >= slow_after:
+            self.log_slow_request(request, view, elapsed, metrics)
+
+    # Called right before a TemplateResponse is rendered
+    def process_template_response(self, request, response):
+        metrics = request._metrics
+        started = time.perf_counter()
+
+        def rendered(response):
+            metrics.render_seconds += time.perf_counter() - started
+        response.add_post_render_callback(rendered)
+        return response
+
+    def log_slow_request(self, request, view, elapsed, metrics):
+        lines = [f'Slow request {request.method} {request.get_full_path()} ({view}): {elapsed:.3f}s, '
+                 f'{metrics.queries} queries in {metrics.db_seconds:.3f}s, '
+                 f'rendering {metrics.render_seconds:.3f}s']
+        lines += [f'  {seconds * 1000:.1f} ms: {sql}' for seconds, sql in metrics.sql]
+        logger.warning('\n'.join(lines))
+
+
+# The timings are not for everyone: see METRICS_ALLOWED_IPS and METRICS_TOKEN
+def metrics_allowed(request):
+    if request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ()):
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    header = request.headers.get('Authorization', '')
+    return bool(token) and header.startswith('Bearer ') and constant_time_compare(header[len('Bearer '):], token)
+
+
+# The /metrics endpoint, in the Prometheus text format
+def metrics_view(request):
+    if not metrics_allowed(request):
+        raise PermissionDenied
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render()
+    cards = card_stats.snapshot()
+    lines += [
+        '# HELP task_card_cache_hits_total Task card fragment cache hits',
+        '# TYPE task_card_cache_hits_total counter',
+        f"task_card_cache_hits_total {cards['hits']}",
+        '# HELP task_card_cache_misses_total Task card fragment cache misses',
+        '# TYPE task_card_cache_misses_total counter',
+        f"task_card_cache_misses_total {cards['misses']}",
+    ]
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,97 @@
+"""
+Production settings for django_project project.
+
+Run with DJANGO_SETTINGS_MODULE=django_project.production_settings, behind gunicorn
+(see gunicorn.conf.py). Everything deployment specific comes from the environment.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES, MIDDLEWARE
+
+# The development key is committed to the repository, it's never used here
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('DJANGO_SECRET_KEY must be set')
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+
+
+# Database
+# Keep connections open between requests instead of connecting on every request,
+# and check them before reuse so a restarted Postgres doesn't break the first request
+# https://docs.djangoproject.com/en/4.2/ref/databases/#persistent-connections
+
+DATABASES['default'].update({
+    'NAME': os.environ.get('POSTGRES_DB', DATABASES['default']['NAME']),
+    'USER': os.environ.get('POSTGRES_USER', DATABASES['default']['USER']),
+    'PASSWORD': os.environ.get('POSTGRES_PASSWORD', DATABASES['default']['PASSWORD']),
+    'HOST': os.environ.get('POSTGRES_HOST', DATABASES['default']['HOST']),
+    'PORT': os.environ.get('POSTGRES_PORT', DATABASES['default']['PORT']),
+    'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 60)),
+    'CONN_HEALTH_CHECKS': True,
+})
+
+
+# Static files are collected at build time and served by WhiteNoise from the app
+# server, compressed and with far-future cache headers on the hashed names
+# https://whitenoise.readthedocs.io/
+
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+MIDDLEWARE = MIDDLEWARE.copy()
+MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1,
+                  'whitenoise.middleware.WhiteNoiseMiddleware')
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Uploaded media have no web server in front of them in the compose setup
+SERVE_MEDIA = os.environ.get('DJANGO_SERVE_MEDIA', '1') == '1'
+
+# The gunicorn workers don't share a local memory cache: without a shared session cache,
+# sessions and users are read from the database
+if not os.environ.get('SESSION_CACHE_BACKEND'):
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+    AUTH_USER_CACHE_TIMEOUT = None
+
+# A purge in one worker's local memory wouldn't reach the others' cached pages
+if not os.environ.get('PAGE_CACHE_BACKEND'):
+    TASK_PAGE_CACHE_TIMEOUT = None
+
+# e.g. DJANGO_SLOW_REQUEST_SECONDS=0.5 logs slower requests with their SQL
+if os.environ.get('DJANGO_SLOW_REQUEST_SECONDS'):
+    SLOW_REQUEST_SECONDS = float(os.environ['DJANGO_SLOW_REQUEST_SECONDS'])
+
+# e.g. METRICS_ALLOWED_IPS=10.0.0.5,10.0.0.6 for the scrapers on the internal network
+if os.environ.get('METRICS_ALLOWED_IPS'):
+    METRICS_ALLOWED_IPS = os.environ['METRICS_ALLOWED_IPS'].split(',')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+
+# Logging at DEBUG level on every request is expensive, only log INFO and above
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': os.environ.get('DJANGO_LOG_LEVEL', 'INFO'),
+    },
+}
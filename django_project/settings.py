@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'django_project.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -94,6 +95,58 @@ DATABASES = {
 
 AUTH_USER_MODEL = 'users.User'
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Local memory in development. In production, point the task card and session caches at
+# a shared backend, e.g. TASK_CARD_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'task_cards': {
+        'BACKEND': os.environ.get('TASK_CARD_CACHE_BACKEND',
+                                  'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('TASK_CARD_CACHE_LOCATION', 'task-cards'),
+        'TIMEOUT': 24 * 60 * 60,
+    },
+    'sessions': {
+        'BACKEND': os.environ.get('SESSION_CACHE_BACKEND',
+                                  'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('SESSION_CACHE_LOCATION', 'sessions'),
+    },
+    'pages': {
+        'BACKEND': os.environ.get('PAGE_CACHE_BACKEND',
+                                  'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('PAGE_CACHE_LOCATION', 'pages'),
+    },
+}
+
+TASK_CARD_CACHE = 'task_cards'
+
+# Sessions are read from the cache and written through to the database, and the logged in
+# user comes from the cache with its profile (see users/backends.py), so that a page view
+# costs no auth queries. Both are only correct when every process shares the cache: local
+# memory is fine for runserver, not for several gunicorn workers
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+
+AUTHENTICATION_BACKENDS = ['users.backends.CachedUserBackend']
+AUTH_USER_CACHE = 'sessions'
+AUTH_USER_CACHE_TIMEOUT = 300
+
+# The lists and the task pages are cached whole for anonymous visitors (see
+# tasks/pagecache.py) and purged by the task and profile signals. The timeout bounds how
+# long a page that no signal purges (e.g. a due date passing) is served; None disables it.
+# A stale page is served for TASK_PAGE_CACHE_STALE_SECONDS more while one request renders it
+TASK_PAGE_CACHE = 'pages'
+TASK_PAGE_CACHE_TIMEOUT = 60
+TASK_PAGE_CACHE_STALE_SECONDS = 0
+
+# The JSON API (tasks/api.py) has async views for an ASGI server, e.g. the compose web-async
+# service. Under WSGI every async view would be run in an event loop of its own
+TASK_ASYNC_API = os.environ.get('DJANGO_ASYNC_API') == '1'
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -141,20 +194,50 @@ LOGIN_REDIRECT_URL = 'tasks-home'
 
 LOGIN_URL = 'login'
 
+# Task lists use keyset (?cursor=) pagination instead of numbered pages when this is on.
+# It never counts the rows, so deep pages stay as fast as the first one
+TASK_CURSOR_PAGINATION = False
+
+# Paginator counts are cached per filter combination for this many seconds.
+# On Postgres, counts above the threshold use the planner's estimate (None disables it)
+TASK_COUNT_CACHE_TIMEOUT = 30
+TASK_COUNT_ESTIMATE_THRESHOLD = 100000
+
+# manage.py archive_tasks moves tasks completed more than this many days ago to the
+# archive table, the completed list reads it when the date filter reaches that far back
+# (None: no archive)
+TASK_ARCHIVE_AFTER_DAYS = 365
+
+# The open task list is patched live from /events/ (see tasks/events.py): changes are
+# polled every TASK_EVENTS_POLL_SECONDS (on Postgres NOTIFY wakes the poller earlier),
+# and under ASGI a stream stays open for TASK_EVENTS_STREAM_SECONDS before the browser reconnects
+TASK_EVENTS_POLL_SECONDS = 2
+TASK_EVENTS_STREAM_SECONDS = 120
+
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Requests slower than this many seconds are logged with their SQL by the metrics
+# middleware (None: off). The histograms are served at /metrics either way
+SLOW_REQUEST_SECONDS = None
+
+# /metrics answers the requests from these addresses, and the ones with the header
+# `Authorization: Bearer <METRICS_TOKEN>` when it's set (e.g. for a Prometheus scraper)
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+METRICS_TOKEN = None
+
+# Formatting DEBUG records of every library on every request is expensive,
+# DJANGO_LOG_LEVEL=DEBUG brings them back
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
-            'level': 'DEBUG',
         },
     },
     'root': {
         'handlers': ['console'],
-        'level': 'DEBUG',
+        'level': os.environ.get('DJANGO_LOG_LEVEL', 'INFO'),
     },
 }
\ No newline at end of file
@@ -16,10 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.contrib.auth import views as auth_views
-from django.urls import path, include
+from django.urls import path, re_path, include
 from users import views as user_views
 from django.conf import settings
 from django.conf.urls.static import static
+from django.views.static import serve
+from .metrics import metrics_view
 
 
 urlpatterns = [
@@ -28,8 +30,15 @@ urlpatterns = [
     path('register/', user_views.register, name='register'),
     path('logout/', auth_views.LogoutView.as_view(template_name='users/logout.html'), name='logout'),
     path('profile/', user_views.profile, name='profile'),
+    path('metrics', metrics_view, name='metrics'),
+    path(settings.MEDIA_URL.lstrip('/') + 'avatars/<path:path>', user_views.avatar, name='avatar'),
     path('', include('tasks.urls')),
 ] 
 
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+elif getattr(settings, 'SERVE_MEDIA', False):
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), serve,
+                {'document_root': settings.MEDIA_ROOT}),
+    ]
@@ -0,0 +1,31 @@
+# gunicorn configuration for the production run mode:
+#   gunicorn -c gunicorn.conf.py django_project.wsgi
+# or under ASGI, with the async API views (see the compose web-async service):
+#   DJANGO_ASYNC_API=1 GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker \
+#   gunicorn -c gunicorn.conf.py django_project.asgi:application
+# Every value can be overridden from the environment.
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# (2 x cores) + 1 sync workers is gunicorn's recommended starting point
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+# A uvicorn worker serves many requests at once from its event loop. Every request that
+# queries the database holds a connection of its own meanwhile (Django has no pool), so
+# WEB_CONCURRENCY x in-flight requests must stay under Postgres' max_connections
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then to bound memory growth, with jitter so they don't all restart at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Load the app once in the master, workers fork from it (faster start, shared memory)
+preload_app = True
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""Closed-loop HTTP load test for a running server.
+
+Every client sends requests back to back for --duration seconds, cycling over --paths.
+Prints throughput and latency percentiles, or JSON with --json. Only uses the standard
+library, so it can run from anywhere, e.g. against the compose production profile:
+
+    docker compose --profile prod up -d web
+    python scripts/loadtest.py --url http://localhost:8001 --concurrency 32 --duration 30
+
+With several --url values, every target gets the same runs, e.g. the sync WSGI service
+against the ASGI one with the async API views, with the containers' memory from docker stats:
+
+    docker compose --profile prod up -d web web-async
+    python scripts/loadtest.py --url http://localhost:8001 http://localhost:8002 \
+        --container django_test_task-web-1 django_test_task-web-async-1 \
+        --paths /api/tasks/ /api/tasks/completed/ --concurrency 100 250 500 1000
+"""
+import argparse
+import http.client
+import json
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+DEFAULT_PATHS = ['/', '/completed/', '/?page=2', '/completed/?page=2']
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+class Client(threading.Thread):
+    def __init__(self, url, paths, deadline, offset):
+        super().__init__(daemon=True)
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.connection_class = (http.client.HTTPSConnection if parts.scheme == 'https'
+                                 else http.client.HTTPConnection)
+        self.paths = paths
+        self.deadline = deadline
+        self.offset = offset
+        self.latencies = []
+        self.errors = 0
+        self.statuses = {}
+
+    def run(self):
+        connection = self.connection_class(self.host, self.port, timeout=30)
+        index = self.offset
+        while time.monotonic() < self.deadline:
+            path = self.paths[index % len(self.paths)]
+            index += 1
+            start = time.perf_counter()
+            try:
+                # keep-alive, like a browser or a reverse proxy would
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                connection.close()
+                connection = self.connection_class(self.host, self.port, timeout=30)
+                continue
+            self.latencies.append(time.perf_counter() - start)
+            self.statuses[response.status] = self.statuses.get(response.status, 0) + 1
+        connection.close()
+
+
+MEMORY_UNITS = {'B': 1, 'KiB': 1024, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3,
+                'kB': 1000, 'MB': 1000 ** 2, 'GB': 1000 ** 3}
+
+
+# Samples a container's memory usage with `docker stats` while a run goes on
+class MemorySampler(threading.Thread):
+    def __init__(self, container):
+        super().__init__(daemon=True)
+        self.container = container
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def sample(self):
+        output = subprocess.run(['docker', 'stats', '--no-stream', '--format', '{{.MemUsage}}', self.container],
+                                capture_output=True, text=True).stdout
+        match = re.match(r'\s*([\d.]+)\s*([A-Za-z]+)', output)
+        if match and match.group(2) in MEMORY_UNITS:
+            self.samples.append(float(match.group(1)) * MEMORY_UNITS[match.group(2)])
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.sample()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.sample()
+        mib = 1024 ** 2
+        return {
+            'peak_mib': round(max(self.samples) / mib, 1) if self.samples else None,
+            'end_mib': round(self.samples[-1] / mib, 1) if self.samples else None,
+        }
+
+
+def run(url, paths, concurrency, duration, container=None):
+    deadline = time.monotonic() + duration
+    clients = [Client(url, paths, deadline, i) for i in range(concurrency)]
+    sampler = MemorySampler(container) if container else None
+    if sampler:
+        sampler.start()
+    started = time.monotonic()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.monotonic() - started
+    memory = sampler.stop() if sampler else None
+
+    latencies = [latency for client in clients for latency in client.latencies]
+    statuses = {}
+    for client in clients:
+        for status, count in client.statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+    return {
+        'url': url,
+        'concurrency': concurrency,
+        'duration_s': round(elapsed, 2),
+        'requests': len(latencies),
+        'errors': sum(client.errors for client in clients),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'requests_per_s': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+            'p50': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99': round(percentile(latencies, 0.99) * 1000, 2),
+        },
+        'memory': memory,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', nargs='+', default=['http://localhost:8000'],
+                        help='One set of runs per server, e.g. the sync and the async deployment')
+    parser.add_argument('--container', nargs='*', default=[],
+                        help='The docker container of each --url, for its memory usage')
+    parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[16],
+                        help='One run per value, e.g. --concurrency 1 16 64')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per run')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args(argv)
+    if args.container and len(args.container) != len(args.url):
+        parser.error('give one --container per --url')
+
+    containers = args.container or [None] * len(args.url)
+    results = [run(url, args.paths, concurrency, args.duration, container)
+               for concurrency in args.concurrency for url, container in zip(args.url, containers)]
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+    for result in results:
+        latency = result['latency_ms']
+        print(f"{result['url']} c={result['concurrency']}: {result['requests_per_s']} req/s, "
+              f"p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms, "
+              f"{result['errors']} errors, statuses {result['statuses']}"
+              + (f", memory peak {result['memory']['peak_mib']} MiB" if result['memory'] else ''))
+
+
+if __name__ == '__main__':
+    main()
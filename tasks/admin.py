@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import Task
+from .models import ArchivedTask, Task, TaskEvent, TaskNotification, UserTaskStats, Watermark
 # Register your models here.
 
-admin.site.register(Task)
\ No newline at end of file
+admin.site.register(Task)
+admin.site.register(ArchivedTask)
+admin.site.register(TaskEvent)
+admin.site.register(TaskNotification)
+admin.site.register(UserTaskStats)
+admin.site.register(Watermark)
@@ -0,0 +1,240 @@
+import hashlib
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models import Count, F, Max
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views import View
+from .filters import CreationFilter, CompletionFilter
+from .models import Task
+from .pagination import count_cache_timeout, task_count_key
+from users.models import User
+
+
+# Rows are serialized straight from .values(), no model instances are built
+TASK_FIELDS = ('id', 'title', 'content', 'status', 'date_posted', 'due_date',
+               'date_completed', 'completion_comment', 'updated')
+TASK_EXPRESSIONS = {
+    'author_username': F('author__username'),
+    'completer_username': F('completer__username'),
+}
+
+# Deleting the newest task would move max(updated) backwards, so the signals remember
+# when a task was last deleted and it counts as a modification
+LAST_DELETED_KEY = 'task-last-deleted'
+# The rows carry the usernames: the signals remember when a profile (and so a username)
+# last changed, and it counts as a modification too
+USERS_CHANGED_KEY = 'task-users-changed'
+
+
+def version_marks(track_deletions):
+    return [LAST_DELETED_KEY, USERS_CHANGED_KEY] if track_deletions else [USERS_CHANGED_KEY]
+
+
+# The rows' max(updated) and count are cached like the list counts (see
+# CachedCountPaginator), every task change invalidates them
+def task_version(queryset, track_deletions=True):
+    key = task_count_key(queryset, 'version')
+    marks = version_marks(track_deletions)
+    values = cache.get_many([key] + marks)
+    stats = values.get(key)
+    if stats is None:
+        stats = queryset.aggregate(last_modified=Max('updated'), count=Count('id'))
+        cache.set(key, stats, count_cache_timeout())
+    return combine_version(stats, [values.get(mark) for mark in marks])
+
+
+async def atask_version(queryset, track_deletions=True):
+    key = await sync_to_async(task_count_key)(queryset, 'version')
+    marks = version_marks(track_deletions)
+    values = await cache.aget_many([key] + marks)
+    stats = values.get(key)
+    if stats is None:
+        stats = await queryset.aaggregate(last_modified=Max('updated'), count=Count('id'))
+        await cache.aset(key, stats, count_cache_timeout())
+    return combine_version(stats, [values.get(mark) for mark in marks])
+
+
+def combine_version(stats, marks):
+    last_modified = stats['last_modified']
+    for mark in marks:
+        if mark and (last_modified is None or mark > last_modified):
+            last_modified = mark
+    return last_modified, stats['count']
+
+
+# The query string of the request was invalid, `errors` are the 400 response's
+class InvalidQuery(Exception):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+# This is the base of the read-only JSON endpoints. Before serializing anything it gets
+# the rows' max(updated) and count (cached, see task_version()), which make the ETag and
+# Last-Modified headers, so that polling clients get a 304 without any query
+class TaskAPIView(View):
+    filterset_class = None
+    page_size = 20
+    max_page_size = 100
+    # a single task is gone when its row is, deletions of other tasks don't modify it
+    single_object = False
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except Http404:
+            return JsonResponse({'detail': 'Not found.'}, status=404)
+
+    def get(self, request, *args, **kwargs):
+        try:
+            queryset, page, page_size = self.parse_query(request, self.get_queryset())
+        except InvalidQuery as error:
+            return JsonResponse({'errors': error.errors}, status=400)
+
+        last_modified, count = task_version(queryset, track_deletions=not self.single_object)
+        if self.single_object and not count:
+            raise Http404
+        etag, timestamp, response = self.conditional_response(request, last_modified, count)
+        if response is None:
+            rows = list(self.page_rows(queryset, page, page_size))
+            response = JsonResponse(self.make_body(request, rows, count, page, page_size))
+        return self.add_validators(response, etag, timestamp)
+
+    # The filtered queryset and the page bounds
+    def parse_query(self, request, queryset):
+        if self.filterset_class is not None:
+            filterset = self.filterset_class(request.GET, queryset=queryset)
+            if not filterset.is_valid():
+                raise InvalidQuery(filterset.errors)
+            queryset = filterset.qs
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+            page_size = min(max(int(request.GET.get('page_size', self.page_size)), 1), self.max_page_size)
+        except ValueError:
+            raise InvalidQuery({'page': ['Enter a whole number.']})
+        return queryset, page, page_size
+
+    def conditional_response(self, request, last_modified, count):
+        etag = self.make_etag(request, last_modified, count)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        return etag, timestamp, get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+    def page_rows(self, queryset, page, page_size):
+        offset = (page - 1) * page_size
+        return queryset.values(*TASK_FIELDS, **TASK_EXPRESSIONS)[offset:offset + page_size]
+
+    def add_validators(self, response, etag, timestamp):
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def make_etag(self, request, last_modified, count):
+        source = f'{request.get_full_path()}|{last_modified.isoformat() if last_modified else ""}|{count}'
+        return '"%s"' % hashlib.sha1(source.encode()).hexdigest()
+
+    def make_body(self, request, rows, count, page, page_size):
+        num_pages = max((count + page_size - 1) // page_size, 1)
+        return {
+            'count': count,
+            'page': page,
+            'num_pages': num_pages,
+            'next': self.page_url(request, page + 1) if page < num_pages else None,
+            'previous': self.page_url(request, page - 1) if page > 1 else None,
+            'results': rows,
+        }
+
+    def page_url(self, request, page):
+        query = request.GET.copy()
+        query['page'] = page
+        return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+# This is the API twin of TaskListView
+class OpenTaskListAPIView(TaskAPIView):
+    filterset_class = CreationFilter
+
+    def get_queryset(self):
+        return Task.objects.open()
+
+
+# This is the API twin of CompletedTasksListView
+class CompletedTaskListAPIView(TaskAPIView):
+    filterset_class = CompletionFilter
+
+    def get_queryset(self):
+        return Task.objects.completed()
+
+
+# This is the API twin of UserTaskListView
+class UserTaskListAPIView(TaskAPIView):
+    def get_queryset(self):
+        user = get_object_or_404(User, username=self.kwargs.get('username'))
+        return Task.objects.by_author(user)
+
+
+# This is the API twin of TaskDetailView
+class TaskDetailAPIView(TaskAPIView):
+    single_object = True
+
+    def get_queryset(self):
+        return Task.objects.filter(pk=self.kwargs.get('pk'))
+
+    def make_body(self, request, rows, count, page, page_size):
+        return rows[0]
+
+
+# The async twins of the endpoints above, for an ASGI server (see TASK_ASYNC_API): the same
+# queries through the async ORM, so that a request waiting on the database doesn't hold a
+# worker thread. The JSON bodies need no template rendering
+class AsyncTaskAPIMixin:
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except Http404:
+            return JsonResponse({'detail': 'Not found.'}, status=404)
+
+    async def aget_queryset(self):
+        return self.get_queryset()
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            queryset, page, page_size = self.parse_query(request, await self.aget_queryset())
+        except InvalidQuery as error:
+            return JsonResponse({'errors': error.errors}, status=400)
+
+        last_modified, count = await atask_version(queryset, track_deletions=not self.single_object)
+        if self.single_object and not count:
+            raise Http404
+        etag, timestamp, response = self.conditional_response(request, last_modified, count)
+        if response is None:
+            rows = [row async for row in self.page_rows(queryset, page, page_size).aiterator()]
+            response = JsonResponse(self.make_body(request, rows, count, page, page_size))
+        return self.add_validators(response, etag, timestamp)
+
+
+class AsyncOpenTaskListAPIView(AsyncTaskAPIMixin, OpenTaskListAPIView):
+    pass
+
+
+class AsyncCompletedTaskListAPIView(AsyncTaskAPIMixin, CompletedTaskListAPIView):
+    pass
+
+
+class AsyncUserTaskListAPIView(AsyncTaskAPIMixin, UserTaskListAPIView):
+    async def aget_queryset(self):
+        try:
+            user = await User.objects.aget(username=self.kwargs.get('username'))
+        except User.DoesNotExist:
+            raise Http404
+        return Task.objects.by_author(user)
+
+
+class AsyncTaskDetailAPIView(AsyncTaskAPIMixin, TaskDetailAPIView):
+    pass
@@ -0,0 +1,106 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import ArchivedTask, Task, TaskNotification
+
+
+# The fields copied from a task to its archived row, the trigger computes the search vector
+ARCHIVED_FIELDS = [field.attname for field in ArchivedTask._meta.concrete_fields
+                   if field.name not in ('archived', 'search_vector')]
+
+
+# Tasks completed before this are archived, None when there is no archive
+def archive_boundary(now=None):
+    days = getattr(settings, 'TASK_ARCHIVE_AFTER_DAYS', None)
+    if days is None:
+        return None
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+# Moves one batch of the oldest completed tasks to the archive in a transaction,
+# returns how many were moved. The tasks are removed without the delete signals:
+# they aren't gone, so the statistics and the caches keep them. A task whose id is
+# already archived raises IntegrityError and the batch is rolled back, rather than
+# deleting a row the archive doesn't hold
+def archive_batch(before, batch_size):
+    with transaction.atomic():
+        tasks = list(Task.objects.filter(status=Task.COMPLETED, date_completed__lt=before)
+                     .order_by('date_completed', 'id').select_for_update()[:batch_size])
+        if not tasks:
+            return 0
+        ids = [task.pk for task in tasks]
+        ArchivedTask.objects.bulk_create(
+            [ArchivedTask(**{name: getattr(task, name) for name in ARCHIVED_FIELDS}) for task in tasks])
+        TaskNotification.objects.filter(task_id__in=ids).delete()
+        # a plain DELETE: the notifications are gone and the history (TaskEvent) keeps
+        # the ids without a constraint, so nothing else refers to these rows
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(Task._meta.db_table)} '
+                           f'WHERE {connection.ops.quote_name(Task._meta.pk.column)} IN '
+                           f'({", ".join(["%s"] * len(ids))})', ids)
+    return len(tasks)
+
+
+# Reads several identically ordered querysets as one: the rows of the first one, then the
+# ones of the next one, and so on. The completed list chains the task table and the archive,
+# every archived task was completed before the tasks that are still in the task table.
+# It supports what the paginators use: count(), slicing, filter() and reverse()
+class ArchiveChain:
+    ordered = True
+
+    def __init__(self, *querysets):
+        self.querysets = querysets
+        self.model = querysets[0].model
+        # filled by count(), or by CachedCountPaginator with its cached counts
+        self.counts = {}
+
+    @property
+    def query(self):
+        return self.querysets[0].query
+
+    def count_of(self, index):
+        if index not in self.counts:
+            self.counts[index] = self.querysets[index].count()
+        return self.counts[index]
+
+    def count(self):
+        return sum(self.count_of(index) for index in range(len(self.querysets)))
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        for queryset in self.querysets:
+            yield from queryset
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            rows = self[item:item + 1]
+            if not rows:
+                raise IndexError(item)
+            return rows[0]
+        start, stop = item.start or 0, item.stop
+        rows = []
+        for index, queryset in enumerate(self.querysets):
+            if stop is not None and start >= stop:
+                break
+            chunk = list(queryset[start:stop])
+            if chunk:
+                rows += chunk
+                if stop is not None:
+                    stop -= start + len(chunk)
+                start = 0
+            elif start:
+                # the slice starts after this queryset
+                size = self.count_of(index)
+                start -= size
+                if stop is not None:
+                    stop -= size
+        return rows
+
+    def filter(self, *args, **kwargs):
+        return ArchiveChain(*(queryset.filter(*args, **kwargs) for queryset in self.querysets))
+
+    def reverse(self):
+        return ArchiveChain(*(queryset.reverse() for queryset in reversed(self.querysets)))
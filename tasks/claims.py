@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Task
+from .signals import tasks_updated
+
+
+# Claiming moves an open task to IN_PROGRESS for one completer, as a single conditional
+# UPDATE ... WHERE status = OPEN AND (completer IS NULL OR completer = me): of several
+# completers claiming the same task at once, exactly one gets it. The UPDATE is also
+# conditional on the version that was read, so the read row is the exact previous state for
+# the statistics; when another write came in between, the task is read again.
+# Returns whether the user got the task
+def claim_task(task_id, user, attempts=3):
+    for _ in range(attempts):
+        row = (Task.objects.claimable_by(user).filter(pk=task_id)
+               .values_list('version', *Task.STATS_FIELDS).first())
+        if row is None:
+            return False
+        with transaction.atomic():
+            claimed = Task.objects.claimable_by(user).filter(pk=task_id, version=row[0]).update(
+                status=Task.IN_PROGRESS, completer=user, version=F('version') + 1, updated=timezone.now())
+            if claimed:
+                tasks_updated.send(sender=Task, task_ids=[task_id], previous={task_id: row[1:]}, actor=user,
+                                   changes={'status': Task.IN_PROGRESS, 'completer_id': user.pk})
+                return True
+    return False
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from .fragments import render_card
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+
+NOTIFY_CHANNEL = 'task_events'
+# Rows are scanned again for this long after their `updated`: a transaction that commits
+# late can make a row visible with a timestamp below the mark. Clients apply events idempotently
+EVENT_LAG = timedelta(seconds=5)
+# A client never catches up on more than this
+CATCH_UP = timedelta(minutes=10)
+CHANGES_LIMIT = 100
+# A scan reads at most this many pages, the next one carries on after the last row
+MAX_SCAN_PAGES = 5
+KEEPALIVE_SECONDS = 15
+
+
+def poll_seconds():
+    return getattr(settings, 'TASK_EVENTS_POLL_SECONDS', 2)
+
+
+# Streams are closed after this many seconds and the browser reconnects with Last-Event-ID.
+# The ASGI handler doesn't notice a disconnected client, this bounds how long it streams to nobody
+def stream_seconds():
+    return getattr(settings, 'TASK_EVENTS_STREAM_SECONDS', 120)
+
+
+def uses_notify():
+    return connection.vendor == 'postgresql'
+
+
+# Called by the Task signals. NOTIFY is transactional, listeners get it on commit
+def notify_task_events():
+    if uses_notify():
+        with connection.cursor() as cursor:
+            cursor.execute(f'NOTIFY {NOTIFY_CHANNEL}')
+
+
+# What a change means for the open task list. `html` is the task's card while it's open,
+# without it the task leaves the list. A task is `created` until its first save bumps the
+# version, however late its transaction commits
+def task_event(task):
+    if task.status == Task.COMPLETED:
+        kind = 'completed'
+    elif task.version == 0:
+        kind = 'created'
+    elif task.completer_id is not None:
+        kind = 'assigned'
+    else:
+        kind = 'updated'
+    return {
+        'id': task.pk,
+        'kind': kind,
+        'status': task.status,
+        'updated': task.updated.isoformat(),
+        'html': render_card('tasks/cards/open_task.html', task) if task.status == Task.OPEN else None,
+    }
+
+
+# The high-water mark scan: the tasks changed after `since` (less EVENT_LAG), oldest first.
+# `seen` is {task id: updated} of the events already sent, rows in it are skipped and
+# it's pruned here.
+# The rows are read in pages of CHANGES_LIMIT, each one after the (updated, id) of the last
+# row of the previous page: a bulk update gives many rows the same `updated`. After
+# MAX_SCAN_PAGES the scan stops and returns that (updated, id) as `after`, the next scan is
+# given it and carries on from there; `after` is None once the scan caught up.
+# Returns the events, the new mark and `after`
+def task_changes(since, seen=None, after=None):
+    queryset = Task.objects.with_related().order_by('updated', 'id')
+    tasks = []
+    for _ in range(MAX_SCAN_PAGES):
+        if after is None:
+            page = queryset.filter(updated__gt=since - EVENT_LAG)
+        else:
+            page = queryset.filter(Q(updated__gt=after[0]) | Q(updated=after[0], pk__gt=after[1]))
+        page = list(page[:CHANGES_LIMIT])
+        tasks += page
+        if len(page) < CHANGES_LIMIT:
+            after = None
+            break
+        after = (page[-1].updated, page[-1].pk)
+    events = []
+    for task in tasks:
+        if seen is not None and seen.get(task.pk) == task.updated:
+            continue
+        events.append(task_event(task))
+        if seen is not None:
+            seen[task.pk] = task.updated
+    mark = max(since, tasks[-1].updated) if tasks else since
+    if seen is not None:
+        for pk, updated in list(seen.items()):
+            if updated <= mark - EVENT_LAG:
+                del seen[pk]
+    return events, mark, after
+
+
+# The event id the browser sends back as Last-Event-ID: the mark, and the last row when
+# the scan stopped before catching up
+def event_id(mark, after=None):
+    if after is None:
+        return mark.isoformat()
+    return f'{after[0].isoformat()}/{after[1]}'
+
+
+# One scanner thread per process feeds every open stream, so the database sees one query
+# per poll however many browsers are connected. On Postgres it LISTENs, a change wakes it
+# right away and the poll only covers missed notifications
+class TaskEventHub:
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.subscribers = set()
+        self.thread = None
+        self.listener = None
+
+    # Returns a queue that receives every event from now on (as (event, mark) pairs)
+    def subscribe(self):
+        queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            self.subscribers.add((loop, queue))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='task-event-hub', daemon=True)
+                self.thread.start()
+            self.lock.notify()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self.lock:
+            self.subscribers = {(loop, q) for loop, q in self.subscribers if q is not queue}
+
+    def run(self):
+        mark = timezone.now()
+        seen = {}
+        after = None
+        while True:
+            with self.lock:
+                while not self.subscribers:
+                    self.lock.wait()
+            # behind after a big update, the next pages are read on the next tick
+            self.wait_for_change(poll_seconds() if after is None else 0)
+            try:
+                connection.close_if_unusable_or_obsolete()
+                events, mark, after = task_changes(mark, seen, after)
+            except Exception:
+                logger.exception('Task event scan failed')
+                connection.close()
+                continue
+            with self.lock:
+                subscribers = list(self.subscribers)
+            for event in events:
+                for loop, queue in subscribers:
+                    loop.call_soon_threadsafe(queue.put_nowait, (event, mark))
+
+    def wait_for_change(self, timeout):
+        if not uses_notify():
+            time.sleep(timeout)
+            return
+        try:
+            if self.listener is None:
+                self.listener = connection.get_new_connection(connection.get_connection_params())
+                self.listener.autocommit = True
+                self.listener.cursor().execute(f'LISTEN {NOTIFY_CHANNEL}')
+            if select.select([self.listener], [], [], timeout)[0]:
+                self.listener.poll()
+                self.listener.notifies.clear()
+        except Exception:
+            logger.exception('Listening for task events failed')
+            if self.listener is not None:
+                self.listener.close()
+                self.listener = None
+            time.sleep(timeout)
+
+
+hub = TaskEventHub()
+
+
+def format_event(event, mark=None):
+    return f"id: {(mark or event['updated'])}\nevent: task\ndata: {json.dumps(event)}\n\n"
+
+
+# The browser sends the id of the last event it got when it reconnects, the page
+# passes ?since= on the first connection. Returns (since, after), see event_id()
+def parse_since(request):
+    now = timezone.now()
+    value = request.headers.get('Last-Event-ID') or request.GET.get('since') or ''
+    value, _, pk = value.partition('/')
+    try:
+        since = datetime.fromisoformat(value)
+        pk = int(pk) if pk else None
+    except ValueError:
+        return now, None
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since, dt_timezone.utc)
+    if since < now - CATCH_UP or since > now:
+        return min(max(since, now - CATCH_UP), now), None
+    return since, (since, pk) if pk is not None else None
+
+
+async def stream_events(since, after=None):
+    queue = hub.subscribe()
+    try:
+        deadline = time.monotonic() + stream_seconds()
+        yield f'retry: {int(poll_seconds() * 1000)}\n\n'
+        # subscribed first, so nothing falls between the catch-up and the hub's events.
+        # The catch-up is read a scan at a time
+        while True:
+            events, mark, after = await sync_to_async(task_changes)(since, after=after)
+            for event in events:
+                yield format_event(event)
+            if after is None:
+                break
+            yield f'id: {event_id(mark, after)}\n\n'
+            since = mark
+        while time.monotonic() < deadline:
+            try:
+                event, mark = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield format_event(event, mark.isoformat())
+    finally:
+        hub.unsubscribe(queue)
+
+
+# The Server-Sent Events endpoint of the open task list. Under ASGI (django_project/asgi.py)
+# the response is a stream. Under WSGI a stream would hold a worker, so it's the polling
+# fallback: the changes since the browser's mark, then the connection closes and EventSource
+# reconnects after `retry` milliseconds
+async def task_events(request):
+    since, after = parse_since(request)
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if isinstance(request, ASGIRequest):
+        return StreamingHttpResponse(stream_events(since, after), content_type='text/event-stream',
+                                     headers=headers)
+
+    events, mark, after = await sync_to_async(task_changes)(since, after=after)
+    body = ''.join(format_event(event) for event in events)
+    body += f'retry: {int(poll_seconds() * 1000)}\nid: {event_id(mark, after)}\n\n'
+    return HttpResponse(body, content_type='text/event-stream', headers=headers)
@@ -1,10 +1,26 @@
 import django_filters
-from .models import Task
+from django import forms
+from .archive import archive_boundary
+from .models import ArchivedTask, Task
 from django_filters.widgets import RangeWidget
+from .search import search_tasks
 
 
 # This file contains the filter logic. django_filters library handles it
-class CreationFilter(django_filters.FilterSet):
+
+
+# Both lists share the full-text search box (see tasks/search.py)
+class SearchFilterSet(django_filters.FilterSet):
+    q = django_filters.CharFilter(method='search', label='Search',
+                                  widget=forms.TextInput(attrs={'class': 'form-control',
+                                                                'type': 'search',
+                                                                'placeholder': 'Search tasks'}))
+
+    def search(self, queryset, name, value):
+        return search_tasks(queryset, value)
+
+
+class CreationFilter(SearchFilterSet):
     date_field = django_filters.DateFromToRangeFilter(field_name='date_posted', 
                                                       widget=RangeWidget(attrs={'type': 'date', 
                                                                                 'class': 'form-control',}))
@@ -13,10 +29,26 @@ class CreationFilter(django_filters.FilterSet):
         fields = ['date_posted']
 
 
-class CompletionFilter(django_filters.FilterSet):
+class CompletionFilter(SearchFilterSet):
     date_field = django_filters.DateFromToRangeFilter(field_name='date_completed', 
                                                       widget=RangeWidget(attrs={'type': 'date', 
                                                                                 'class': 'form-control',}))
     class Meta:
         model = Task
-        fields = ['date_posted']
\ No newline at end of file
+        fields = ['date_posted']
+
+    # Whether the completion dates can reach into the archive (see tasks/archive.py)
+    def reaches_archive(self):
+        boundary = archive_boundary()
+        if boundary is None:
+            return False
+        dates = self.form.cleaned_data.get('date_field') if self.form.is_valid() else None
+        return not dates or dates.start is None or dates.start < boundary
+
+    # The same filters applied to the archived tasks
+    def archive_qs(self):
+        queryset = ArchivedTask.objects.completed().with_related()
+        archive_filter = CompletionFilter(self.data, queryset=queryset)
+        if archive_filter.is_bound and archive_filter.form.is_valid():
+            queryset = archive_filter.qs
+        return queryset
\ No newline at end of file
@@ -0,0 +1,65 @@
+from datetime import date, datetime, time
+from django import forms
+from django.core.exceptions import ValidationError
+from django.forms.utils import from_current_timezone
+from django.forms.widgets import NumberInput
+from django.utils import timezone
+from .models import Task
+
+
+# This is a View for the DateTime input (it has separate pickers matched to a single field)
+class DateTimeMultiWidget(forms.MultiWidget):
+    def __init__(self, attrs=None):
+        date_widget = NumberInput(attrs={'type': 'date',
+                                         'class': 'form-control',
+                                         'style': 'margin-right: 0.5em;'})
+        time_widget = NumberInput(attrs={'type': 'time',
+                                         'class': 'form-control',
+                                         'style': 'margin-left: 0.5em;'})
+        widgets = (date_widget, time_widget)
+        super().__init__(widgets, attrs)
+
+    def subwidgets(self, name, value, attrs=None):
+        context = self.get_context(name, value, attrs)
+        return context['widget']['subwidgets']
+
+    # the pickers show the local date and the time to the minute
+    def decompress(self, value):
+        if value:
+            value = timezone.localtime(value)
+            return [value.date().isoformat(), value.time().isoformat(timespec='minutes')]
+        return [None, None]
+
+
+# The date and time come from the pickers (see DateTimeMultiWidget) as the ISO strings
+# '2024-05-01' and '13:30' (or '13:30:15'), so they are parsed with fromisoformat, without
+# building an intermediate string or going through strptime's format matching.
+# A missing time is midnight. Malformed values are validation errors of the field
+class SplitISODateTimeField(forms.Field):
+    widget = DateTimeMultiWidget
+    default_error_messages = {
+        'invalid': 'Enter a valid date and time.',
+    }
+
+    def to_python(self, value):
+        if isinstance(value, datetime):
+            return value
+        date_str, time_str = value if isinstance(value, (list, tuple)) else (value, None)
+        if not date_str:
+            if time_str:
+                raise ValidationError(self.error_messages['invalid'], code='invalid')
+            return None
+        try:
+            parsed = datetime.combine(date.fromisoformat(date_str),
+                                      time.fromisoformat(time_str) if time_str else time())
+        except (TypeError, ValueError):
+            raise ValidationError(self.error_messages['invalid'], code='invalid')
+        return from_current_timezone(parsed)
+
+
+# The task form of the create and update views
+class TaskForm(forms.ModelForm):
+    class Meta:
+        model = Task
+        fields = ['title', 'content', 'due_date', 'completer']
+        field_classes = {'due_date': SplitISODateTimeField}
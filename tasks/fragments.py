@@ -0,0 +1,83 @@
+import threading
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+
+
+# The card templates, each one is cached separately for every task
+CARD_TEMPLATES = (
+    'tasks/cards/open_task.html',
+    'tasks/cards/completed_task.html',
+    'tasks/cards/user_task.html',
+)
+
+
+# In-process hit/miss counters of the task card cache
+class CardCacheStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def reset(self):
+        with self.lock:
+            self.hits = self.misses = 0
+
+
+card_stats = CardCacheStats()
+
+
+def card_cache():
+    return caches[getattr(settings, 'TASK_CARD_CACHE', 'default')]
+
+
+def card_key(template_name, task_id):
+    return f'task-card:{template_name}:{task_id}'
+
+
+# A card is stale when the task, its author's profile (avatar, username) or its
+# completer's profile (username) changed
+def card_version(task):
+    return (task.updated.timestamp() if task.updated else None,
+            profile_version(task.author),
+            profile_version(task.completer) if task.completer_id else None)
+
+
+def profile_version(user):
+    profile = getattr(user, 'profile', None)
+    return profile.updated.timestamp() if profile and profile.updated else None
+
+
+# Renders a task card, or returns it from the cache. Cards are rendered with the task only,
+# so they never contain anything specific to the current user
+def render_card(template_name, task):
+    cache = card_cache()
+    key = card_key(template_name, task.pk)
+    version = card_version(task)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == version:
+        card_stats.record(hit=True)
+        return cached[1]
+
+    card_stats.record(hit=False)
+    html = render_to_string(template_name, {'task': task})
+    cache.set(key, (version, html))
+    return html
+
+
+# Called by the Task signals
+def invalidate_cards(task_ids):
+    keys = [card_key(template_name, task_id) for task_id in task_ids for template_name in CARD_TEMPLATES]
+    if keys:
+        card_cache().delete_many(keys)
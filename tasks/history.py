@@ -0,0 +1,118 @@
+from django.db import transaction
+from django.template.defaultfilters import date as date_filter
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+from .models import Task, TaskEvent
+from users.models import User
+
+
+# The recorded events of the current transaction, written with one bulk_create when it
+# commits (right away outside of a transaction). A rollback drops the on_commit callback,
+# the next event then starts a new buffer. Events recorded in a savepoint that is rolled
+# back while the transaction goes on are still written
+class EventBuffer:
+    def __init__(self, using):
+        self.using = using
+        self.events = []
+        self.flushed = False
+
+    def flush(self):
+        self.flushed = True
+        TaskEvent.objects.using(self.using).bulk_create(self.events)
+
+
+def current_buffer(connection):
+    buffer = getattr(connection, 'task_event_buffer', None)
+    if buffer is None or buffer.flushed or not connection.in_atomic_block:
+        return None
+    if not any(func == buffer.flush for sids, func, robust in connection.run_on_commit):
+        return None
+    return buffer
+
+
+def record_events(events, using=None):
+    if not events:
+        return
+    connection = transaction.get_connection(using)
+    buffer = current_buffer(connection)
+    if buffer is not None:
+        buffer.events.extend(events)
+        return
+    buffer = connection.task_event_buffer = EventBuffer(connection.alias)
+    buffer.events.extend(events)
+    # the change is already saved, a failing history write is logged rather than raised
+    transaction.on_commit(buffer.flush, using=connection.alias, robust=True)
+
+
+def event_kind(changes):
+    if 'status' in changes:
+        return {
+            Task.COMPLETED: TaskEvent.COMPLETED,
+            Task.IN_PROGRESS: TaskEvent.CLAIMED,
+            Task.OPEN: TaskEvent.REOPENED,
+        }[changes['status'][1]]
+    if 'completer_id' in changes:
+        return TaskEvent.ASSIGNED
+    return TaskEvent.UPDATED
+
+
+# {field: [old, new]} of the fields that differ between two Task.history_state() tuples
+def diff_states(old, new):
+    return {field: [before, after] for field, before, after in zip(Task.HISTORY_FIELDS, old, new)
+            if before != after}
+
+
+def task_saved_event(task, created, actor=None):
+    state = task.history_state()
+    if created:
+        changes = {field: [None, value] for field, value in zip(Task.HISTORY_FIELDS, state)}
+        kind = TaskEvent.CREATED
+    else:
+        previous = getattr(task, '_loaded_history_state', None)
+        if previous is None:
+            return None
+        changes = diff_states(previous, state)
+        if not changes:
+            return None
+        kind = event_kind(changes)
+    return TaskEvent(task_id=task.pk, actor=actor, kind=kind, changes=changes, created_at=timezone.now())
+
+
+# The events of a set-based update (see tasks_updated): `previous` holds the stats fields
+# before it, which cover the status and the completer
+def tasks_updated_events(previous, changes, actor=None):
+    now = timezone.now()
+    events = []
+    for task_id, state in previous.items():
+        old = dict(zip(Task.STATS_FIELDS, state))
+        diff = {field: [old[field], value] for field, value in changes.items()
+                if field in Task.HISTORY_FIELDS and field in old and old[field] != value}
+        if diff:
+            events.append(TaskEvent(task_id=task_id, actor=actor, kind=event_kind(diff),
+                                    changes=diff, created_at=now))
+    return events
+
+
+# Turns the events' changes into (label, old, new) rows for the timeline, with the
+# statuses and completers by name. The completers of a page are loaded in one query
+def describe_events(events):
+    labels = {field.attname: field.verbose_name for field in Task._meta.concrete_fields}
+    statuses = dict(Task.TASK_STATUS)
+    user_ids = {value for event in events for value in event.changes.get('completer_id', ()) if value}
+    usernames = dict(User.objects.filter(pk__in=user_ids).values_list('pk', 'username')) if user_ids else {}
+
+    def display(field, value):
+        if value is None or value == '':
+            return '-'
+        if field == 'status':
+            return statuses.get(value, value)
+        if field == 'completer_id':
+            return usernames.get(value, f'#{value}')
+        if field == 'due_date':
+            return date_filter(parse_datetime(value) if isinstance(value, str) else value, 'H:i j M, Y')
+        return value
+
+    for event in events:
+        event.rows = [(labels.get(field, field), display(field, old), display(field, new))
+                      for field, (old, new) in event.changes.items()]
+    return events
@@ -0,0 +1,46 @@
+import time
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from django.utils import timezone
+from tasks.api import LAST_DELETED_KEY
+from tasks.archive import archive_batch, archive_boundary
+from tasks.pagecache import purge_all_pages
+from tasks.pagination import invalidate_task_counts
+
+
+# This command moves the tasks completed more than TASK_ARCHIVE_AFTER_DAYS days ago to the
+# archive table, oldest first. The age is a setting rather than an option since the completed
+# list relies on it to know when to read the archive. Every batch is its own transaction,
+# so it can be interrupted at any time and run again to continue
+class Command(BaseCommand):
+    help = 'Move old completed tasks to the archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Seconds to wait between batches, to go easy on the database')
+
+    def handle(self, *args, **options):
+        before = archive_boundary()
+        if before is None:
+            raise CommandError('TASK_ARCHIVE_AFTER_DAYS is not set')
+
+        archived = 0
+        try:
+            while True:
+                moved = archive_batch(before, options['batch_size'])
+                archived += moved
+                if moved < options['batch_size']:
+                    break
+                self.stderr.write(f'Archived {archived} tasks')
+                time.sleep(options['sleep'])
+        except IntegrityError as e:
+            raise CommandError(f'A task of the batch after {archived} tasks is already archived: {e}')
+        finally:
+            if archived:
+                # the lists changed without the delete signals
+                invalidate_task_counts()
+                cache.set(LAST_DELETED_KEY, timezone.now(), None)
+                purge_all_pages()
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} tasks completed before {before:%Y-%m-%d %H:%M}'))
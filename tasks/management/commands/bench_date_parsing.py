@@ -0,0 +1,36 @@
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from tasks.forms import SplitISODateTimeField
+
+
+# The due date parsing that DateTimeMultiWidget.value_from_datadict used to do on every POST
+def strptime_parse(date_str, time_str):
+    if time_str == '':
+        time_str = '00:00'
+    if len(time_str) > 5:
+        time_str = time_str[:5]
+    return timezone.make_aware(datetime.strptime(date_str + ' ' + time_str, '%Y-%m-%d %H:%M'))
+
+
+# This command measures the due date parse path of the task forms: the old strptime
+# parsing against SplitISODateTimeField.to_python, on the same picker values
+class Command(BaseCommand):
+    help = 'Measure the time spent parsing the due date of the task forms'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        count = options['iterations']
+        values = [('2024-05-01', '13:30'), ('2024-12-31', '23:59:00'), ('2025-02-28', '')]
+        field = SplitISODateTimeField()
+
+        for name, parse in (('strptime', lambda value: strptime_parse(*value)),
+                            ('fromisoformat', field.to_python)):
+            start = time.perf_counter()
+            for i in range(count):
+                parse(values[i % len(values)])
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'{name}: {elapsed / count * 1000000:.2f} us per parse')
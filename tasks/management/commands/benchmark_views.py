@@ -0,0 +1,132 @@
+import json
+import statistics
+import subprocess
+import time
+import tracemalloc
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from tasks import urls
+from tasks.models import Task
+from users.models import User
+
+
+# The views behind a login, and who they are requested as
+LOGIN_AS = {
+    'task-create': 'author',
+    'task-update': 'author',
+    'task-delete': 'author',
+    'task-complete': 'completer',
+}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+# This command requests every GET view of tasks/urls.py through the test client against the
+# current database (see seed_tasks) and reports, per URL, the p50/p95 latency and the queries
+# per request of --requests timed requests, after --warmup untimed ones (so caches are warm),
+# and the peak memory allocated by one request, measured separately with tracemalloc.
+# The JSON output is meant to be kept and compared across commits
+class Command(BaseCommand):
+    help = 'Benchmark the task views, prints JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per URL')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per URL before timing')
+        parser.add_argument('--output', help='Write the JSON here instead of stdout')
+        parser.add_argument('--views', nargs='+', help='Only these URL names')
+
+    def handle(self, *args, **options):
+        task = Task.objects.filter(status=Task.OPEN, completer__isnull=True).select_related('author').first()
+        completer = User.objects.filter(role=User.COMPLETER).first()
+        if task is None or completer is None:
+            raise CommandError('Seed some data first, e.g. manage.py seed_tasks')
+        users = {'author': task.author, 'completer': completer}
+        kwargs = {'pk': task.pk, 'username': task.author.username}
+
+        results = []
+        for pattern in urls.urlpatterns:
+            name = pattern.name
+            if options['views'] and name not in options['views']:
+                continue
+            view_class = getattr(pattern.callback, 'view_class', None)
+            if view_class is not None and not hasattr(view_class, 'get'):
+                continue
+            url = reverse(name, kwargs={key: kwargs[key] for key in pattern.pattern.converters})
+            client = Client(HTTP_HOST=self.host())
+            if name in LOGIN_AS:
+                client.force_login(users[LOGIN_AS[name]])
+            results.append(self.benchmark(client, name, url, options['requests'], options['warmup']))
+            self.stderr.write(f"{name}: p50 {results[-1]['p50_ms']} ms")
+
+        report = {
+            'commit': self.commit(),
+            'database': connection.vendor,
+            'tasks': Task.objects.count(),
+            'requests_per_url': options['requests'],
+            'results': results,
+        }
+        data = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(data + '\n')
+        else:
+            self.stdout.write(data)
+
+    def benchmark(self, client, name, url, requests, warmup):
+        for _ in range(warmup):
+            client.get(url)
+
+        counter = QueryCounter()
+        latencies = []
+        statuses = set()
+        with connection.execute_wrapper(counter):
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - started)
+                statuses.add(response.status_code)
+
+        tracemalloc.start()
+        try:
+            client.get(url)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'name': name,
+            'url': url,
+            'status': sorted(statuses),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+            'queries_per_request': round(counter.count / requests, 2),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    # The test client's requests must pass the ALLOWED_HOSTS check
+    def host(self):
+        return next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+
+    def commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  cwd=settings.BASE_DIR, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,80 @@
+from datetime import timedelta
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.utils import timezone
+from django_filters.widgets import RangeWidget
+from tasks.scheduler import due_tasks
+from tasks.views import TaskListView, CompletedTasksListView, UserTaskListView
+from users.models import User
+
+
+# Words that show up in the query plan when an index is used, per database vendor
+INDEX_MARKERS = {
+    'postgresql': ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan'),
+    'sqlite': ('USING INDEX', 'USING COVERING INDEX'),
+}
+
+
+# This command runs EXPLAIN (ANALYZE on Postgres) on the first page of every task list view
+# and on the scheduler's scan, and reports whether the query planner picked an index
+class Command(BaseCommand):
+    help = "Explain the task list views' queries and report whether an index is used"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Insert this many random tasks before explaining (e.g. 1000000)')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--verbose-plan', action='store_true', help='Print the full query plans')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            call_command('seed_tasks', users=10, tasks=options['seed'], batch_size=options['batch_size'],
+                         prefix='explain_user', stdout=self.stderr, stderr=self.stderr)
+
+        author = User.objects.filter(author__isnull=False).first()
+        if author is None:
+            self.stderr.write('There are no tasks to explain, use --seed to create some')
+            return
+
+        factory = RequestFactory()
+        checks = [
+            ('tasks-home', TaskListView, factory.get('/'), {}),
+            ('tasks-home (filtered)', TaskListView,
+             factory.get('/', self.month_ago_filter()), {}),
+            ('tasks-completed', CompletedTasksListView, factory.get('/completed/'), {}),
+            ('tasks-completed (filtered)', CompletedTasksListView,
+             factory.get('/completed/', self.month_ago_filter()), {}),
+            ('user-tasks', UserTaskListView, factory.get('/user/'), {'username': author.username}),
+        ]
+
+        querysets = []
+        for name, view_class, request, kwargs in checks:
+            view = view_class()
+            view.setup(request, **kwargs)
+            queryset = view.get_queryset()
+            # the completed list may continue in the archive (see ArchiveChain)
+            for index, part in enumerate(getattr(queryset, 'querysets', [queryset])):
+                querysets.append((f'{name} (archive)' if index else name, part[:view.paginate_by]))
+        # a batch of the task scheduler's scan
+        now = timezone.now()
+        querysets.append(('scheduler', due_tasks(now - timedelta(hours=1), now).values_list('id', 'due_date')[:500]))
+
+        explain_options = {'analyze': True} if connection.vendor == 'postgresql' else {}
+        markers = INDEX_MARKERS.get(connection.vendor, ('Index',))
+        for name, queryset in querysets:
+            plan = queryset.explain(**explain_options)
+            uses_index = any(marker in plan for marker in markers)
+            if uses_index:
+                self.stdout.write(self.style.SUCCESS(f'{name}: index used'))
+            else:
+                self.stdout.write(self.style.WARNING(f'{name}: NO index used'))
+            if options['verbose_plan']:
+                self.stdout.write(plan + '\n')
+
+    # The start of the lists' date range filter. RangeWidget names its inputs with its own
+    # suffixes (date_field_min), an unknown parameter would be ignored and nothing filtered
+    def month_ago_filter(self):
+        month_ago = (timezone.now() - timedelta(days=30)).date().isoformat()
+        return {f'date_field_{RangeWidget.suffixes[0]}': month_ago}
@@ -0,0 +1,38 @@
+import sys
+from django.core.management.base import BaseCommand
+from tasks.models import Task
+from tasks.transfer import TASK_COLUMNS, guess_format, write_rows
+
+
+# This command streams the tasks to a CSV or JSONL file in constant memory
+class Command(BaseCommand):
+    help = 'Export tasks to CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="File to write, '-' for stdout")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Defaults to jsonl for .jsonl files, csv otherwise')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--status', type=int, choices=[status for status, _ in Task.TASK_STATUS])
+
+    def handle(self, *args, **options):
+        queryset = Task.objects.order_by('pk')
+        if options['status']:
+            queryset = queryset.filter(status=options['status'])
+        fields = ['author__username' if column == 'author' else
+                  'completer__username' if column == 'completer' else column
+                  for column in TASK_COLUMNS]
+        rows = queryset.values_list(*fields).iterator(chunk_size=options['chunk_size'])
+        fmt = guess_format(options['output'], options['format'])
+
+        stream = sys.stdout if options['output'] == '-' else open(options['output'], 'w', newline='')
+        try:
+            exported = 0
+            for _ in write_rows(rows, stream, fmt):
+                exported += 1
+                if exported % options['chunk_size'] == 0:
+                    self.stderr.write(f'Exported {exported} tasks')
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        self.stderr.write(f'Exported {exported} tasks in total')
@@ -0,0 +1,76 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from tasks.models import Task
+from tasks.pagecache import purge_all_pages
+from tasks.pagination import invalidate_task_counts
+from tasks.stats import record_changes
+from tasks.transfer import batched, guess_format, read_rows
+from users.models import User
+
+
+# This command streams tasks from a CSV or JSONL file (see export_tasks) and inserts them
+# with bulk_create, one batch at a time. Authors and completers are resolved by username
+# with a single query per batch. The whole import is one transaction: an invalid row
+# leaves nothing behind, and the file can be imported again once it's fixed
+class Command(BaseCommand):
+    help = 'Import tasks from CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="File to read, '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Defaults to jsonl for .jsonl files, csv otherwise')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fmt = guess_format(options['input'], options['format'])
+        stream = sys.stdin if options['input'] == '-' else open(options['input'], newline='')
+        imported = skipped = 0
+        try:
+            with transaction.atomic():
+                for batch in batched(read_rows(stream, fmt), options['batch_size']):
+                    created, missing = self.import_batch(batch)
+                    imported += created
+                    skipped += missing
+                    self.stderr.write(f'Imported {imported} tasks, skipped {skipped}')
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        if imported:
+            # bulk_create doesn't send post_save, so the cached list counts and the
+            # anonymous pages are dropped here
+            invalidate_task_counts()
+            purge_all_pages()
+        self.stdout.write(self.style.SUCCESS(f'Imported {imported} tasks, skipped {skipped} '
+                                             f'with an unknown author or completer'))
+
+    def import_batch(self, batch):
+        usernames = {row['author'] for row in batch} | {row['completer'] for row in batch if row['completer']}
+        users = User.objects.in_bulk(usernames, field_name='username')
+
+        tasks = []
+        for row in batch:
+            author = users.get(row['author'])
+            completer = users.get(row['completer']) if row['completer'] else None
+            if author is None or (row['completer'] and completer is None):
+                continue
+            task = Task(
+                title=row['title'],
+                content=row['content'] or '',
+                status=row['status'] or Task.OPEN,
+                author=author,
+                completer=completer,
+                date_completed=row['date_completed'],
+                completion_comment=row['completion_comment'],
+            )
+            # missing dates keep the model defaults
+            for column in ('date_posted', 'due_date'):
+                if row[column] is not None:
+                    setattr(task, column, row[column])
+            tasks.append(task)
+        Task.objects.bulk_create(tasks)
+        # nor does it update the statistics
+        record_changes([(None, task.stats_state()) for task in tasks])
+        return len(tasks), len(batch) - len(tasks)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from tasks.models import UserTaskStats, Watermark
+from tasks.stats import OVERDUE_WATERMARK, compute_stats
+
+
+# This command recounts the per-user task statistics from the task table and replaces
+# the incrementally maintained rows. It also moves the overdue mark to now
+class Command(BaseCommand):
+    help = 'Recount the per-user task statistics'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # the mark never moves backwards, the scheduler may already be past now
+            mark = Watermark.objects.select_for_update().filter(name=OVERDUE_WATERMARK).first()
+            now = max(timezone.now(), mark.value) if mark else timezone.now()
+            current = {stats.user_id: stats for stats in UserTaskStats.objects.select_for_update()}
+            rebuilt = compute_stats(now)
+            rebuilt_by_user = {stats.user_id: stats for stats in rebuilt}
+            drifted = sum(1 for user_id in current.keys() | rebuilt_by_user.keys()
+                          if self.counts(current.get(user_id)) != self.counts(rebuilt_by_user.get(user_id)))
+            UserTaskStats.objects.all().delete()
+            UserTaskStats.objects.bulk_create(rebuilt)
+            Watermark.set_value(OVERDUE_WATERMARK, now)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the task statistics of {len(rebuilt)} users, '
+                                             f'{drifted} had drifted'))
+
+    # a missing row counts as zeros
+    def counts(self, stats):
+        return [getattr(stats, field, 0) for field in UserTaskStats.COUNT_FIELDS]
@@ -0,0 +1,30 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from tasks.scheduler import run_once
+
+
+# This command is the long-running task scheduler. Every --interval seconds it writes the
+# notifications of the tasks that became overdue or due soon since its last pass into the
+# outbox (TaskNotification), and moves the overdue counters of the task statistics forward
+class Command(BaseCommand):
+    help = 'Notify overdue and due soon tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run one pass and exit')
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds between passes')
+        parser.add_argument('--due-soon-hours', type=float, default=24.0,
+                            help='Tasks due within this many hours are due soon')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        due_soon = timedelta(hours=options['due_soon_hours'])
+        while True:
+            started = time.monotonic()
+            overdue, soon = run_once(timezone.now(), due_soon, options['batch_size'])
+            if overdue or soon:
+                self.stdout.write(f'Notified {overdue} overdue and {soon} due soon tasks')
+            if options['once']:
+                return
+            time.sleep(max(options['interval'] - (time.monotonic() - started), 0))
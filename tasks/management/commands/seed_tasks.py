@@ -0,0 +1,86 @@
+import random
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from tasks.models import Task
+from tasks.pagination import invalidate_task_counts
+from users.models import Profile, User
+
+
+WORDS = ('fix', 'update', 'review', 'deploy', 'write', 'check', 'clean', 'order', 'call', 'plan',
+         'report', 'invoice', 'server', 'garden', 'kitchen', 'roof', 'meeting', 'budget', 'boiler',
+         'fence', 'backup', 'printer', 'newsletter', 'inventory', 'contract', 'website', 'office')
+
+
+# This command generates a reproducible dataset for benchmarks: --users users with their
+# profiles (half CREATORs, half COMPLETERs) and --tasks tasks posted over the last --days days.
+# About 60% of the tasks are completed, 30% of the open ones are assigned, and the due dates
+# range from hours to a week after posting, so some open tasks are overdue.
+# Everything is inserted with bulk_create; the task statistics are rebuilt at the end
+class Command(BaseCommand):
+    help = 'Insert random users and tasks, e.g. for benchmark_views'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--tasks', type=int, default=10000)
+        parser.add_argument('--days', type=int, default=730, help='How far back the tasks are posted')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--random-seed', type=int, default=0, help='The same seed generates the same data')
+        parser.add_argument('--prefix', default='seed_user', help='Username prefix of the generated users')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['random_seed'])
+        creators, completers = self.seed_users(options['users'], options['prefix'])
+        now = timezone.now()
+        created = 0
+        while created < options['tasks']:
+            size = min(options['batch_size'], options['tasks'] - created)
+            batch = [self.make_task(rng, now, options['days'], creators, completers) for _ in range(size)]
+            with transaction.atomic():
+                Task.objects.bulk_create(batch)
+            created += size
+            self.stderr.write(f'Seeded {created}/{options["tasks"]} tasks')
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Task._meta.db_table}')
+        # bulk_create sends no signals
+        invalidate_task_counts()
+        call_command('rebuild_task_stats', stdout=self.stdout)
+
+    # Existing users with the same names are reused, so the command can be run again to add tasks
+    def seed_users(self, count, prefix):
+        usernames = [f'{prefix}{i}' for i in range(count)]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        password = make_password(None)
+        users = [User(username=username, password=password, email=f'{username}@example.com',
+                      role=User.CREATOR if i % 2 == 0 else User.COMPLETER)
+                 for i, username in enumerate(usernames) if username not in existing]
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            users = list(User.objects.filter(username__in=usernames).order_by('username'))
+            Profile.objects.bulk_create([Profile(user=user) for user in users], ignore_conflicts=True)
+        creators = [user for user in users if user.role == User.CREATOR]
+        completers = [user for user in users if user.role == User.COMPLETER]
+        return creators or users, completers or users
+
+    def make_task(self, rng, now, days, creators, completers):
+        posted = now - timedelta(minutes=rng.randint(0, days * 24 * 60))
+        task = Task(
+            title=' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).capitalize(),
+            content=' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 40))).capitalize() + '.',
+            author=rng.choice(creators),
+            date_posted=posted,
+            due_date=posted + timedelta(hours=rng.choice((4, 24, 24, 72, 168))),
+        )
+        if rng.random() < 0.6:
+            task.status = Task.COMPLETED
+            task.completer = rng.choice(completers)
+            task.date_completed = min(posted + timedelta(minutes=rng.randint(10, 7 * 24 * 60)), now)
+            task.completion_comment = rng.choice(('Done.', 'Fixed.', 'All good.', '', 'See the report.'))
+        elif rng.random() < 0.3:
+            task.completer = rng.choice(completers)
+        return task
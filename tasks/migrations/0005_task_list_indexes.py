@@ -0,0 +1,25 @@
+# Generated by Django 4.2.3 on 2026-10-18 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0004_alter_task_completer_alter_task_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status', 1)), fields=['-date_posted'], name='task_open_posted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status', 3)), fields=['-date_completed'], name='task_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['author', '-date_posted'], name='task_author_posted_idx'),
+        ),
+    ]
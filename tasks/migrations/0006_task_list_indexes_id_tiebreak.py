@@ -0,0 +1,37 @@
+# Generated by Django 4.2.3 on 2026-10-18 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_task_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_open_posted_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_completed_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_author_posted_idx',
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status', 1)), fields=['-date_posted', '-id'], name='task_open_posted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status', 3)), fields=['-date_completed', '-id'], name='task_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['author', '-date_posted', '-id'], name='task_author_posted_idx'),
+        ),
+    ]
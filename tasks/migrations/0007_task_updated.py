@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 14:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_task_list_indexes_id_tiebreak'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
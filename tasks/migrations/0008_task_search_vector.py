@@ -0,0 +1,66 @@
+# Generated by Django 4.2.3 on 2026-10-18 15:00
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# The search vector is maintained by a trigger, so that every write path (save, bulk_create,
+# the import command, raw SQL) keeps it in sync. Title weighs more than the rest.
+# The trigger and the GIN index only exist on Postgres, other databases search with icontains
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('english', coalesce({row}title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}content, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce({row}completion_comment, '')), 'C')
+"""
+
+CREATE_SQL = [
+    """
+    CREATE FUNCTION tasks_task_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := %s;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """ % SEARCH_VECTOR_SQL.format(row='NEW.'),
+    """
+    CREATE TRIGGER tasks_task_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, content, completion_comment ON tasks_task
+    FOR EACH ROW EXECUTE FUNCTION tasks_task_search_vector_update()
+    """,
+    'UPDATE tasks_task SET search_vector = %s' % SEARCH_VECTOR_SQL.format(row=''),
+    'CREATE INDEX task_search_vector_idx ON tasks_task USING gin (search_vector)',
+]
+
+DROP_SQL = [
+    'DROP INDEX IF EXISTS task_search_vector_idx',
+    'DROP TRIGGER IF EXISTS tasks_task_search_vector_trigger ON tasks_task',
+    'DROP FUNCTION IF EXISTS tasks_task_search_vector_update()',
+]
+
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in CREATE_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0007_task_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.3 on 2026-10-18 15:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_profile_image_hash'),
+        ('tasks', '0008_task_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTaskStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='task_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('created_open', models.IntegerField(default=0)),
+                ('created_completed', models.IntegerField(default=0)),
+                ('created_overdue', models.IntegerField(default=0)),
+                ('assigned_open', models.IntegerField(default=0)),
+                ('assigned_completed', models.IntegerField(default=0)),
+                ('assigned_overdue', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Watermark',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('value', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.3 on 2026-10-18 15:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0009_usertaskstats_watermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('overdue', 'Overdue'), ('due_soon', 'Due soon')], max_length=20)),
+                ('due_date', models.DateTimeField()),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'due_date', 'id'], name='task_status_due_idx'),
+        ),
+        migrations.AddField(
+            model_name='tasknotification',
+            name='task',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='tasks.task'),
+        ),
+        migrations.AddIndex(
+            model_name='tasknotification',
+            index=models.Index(condition=models.Q(('sent__isnull', True)), fields=['created'], name='tasknotification_unsent_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='tasknotification',
+            constraint=models.UniqueConstraint(fields=('task', 'kind', 'due_date'), name='tasknotification_unique'),
+        ),
+    ]
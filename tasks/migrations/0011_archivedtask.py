@@ -0,0 +1,37 @@
+# Generated by Django 4.2.3 on 2026-10-18 15:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0010_task_scheduler'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200)),
+                ('content', models.TextField()),
+                ('date_posted', models.DateTimeField()),
+                ('due_date', models.DateTimeField()),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'Open'), (2, 'In progress'), (3, 'Completed')], default=3)),
+                ('date_completed', models.DateTimeField(blank=True, null=True)),
+                ('completion_comment', models.TextField(blank=True, null=True)),
+                ('updated', models.DateTimeField()),
+                ('archived', models.DateTimeField(default=django.utils.timezone.now)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_tasks', to=settings.AUTH_USER_MODEL)),
+                ('completer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_completed_tasks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-date_completed', '-id'], name='archivedtask_completed_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-18 15:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0011_archivedtask'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['updated', 'id'], name='task_updated_idx'),
+        ),
+    ]
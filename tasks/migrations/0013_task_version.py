@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0012_task_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.3 on 2026-10-18 15:24
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0013_task_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('assigned', 'Assigned'), ('claimed', 'Claimed'), ('completed', 'Completed'), ('reopened', 'Reopened'), ('deleted', 'Deleted')], max_length=20)),
+                ('changes', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='task_events', to=settings.AUTH_USER_MODEL)),
+                ('task', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='tasks.task')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['task', 'created_at'], name='taskevent_task_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:00
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# The archive is searched like the task table: the trigger function of migration 0008 only
+# reads the NEW row's title, content and completion_comment, which the archive has too.
+# The trigger and the GIN index only exist on Postgres
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(content, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(completion_comment, '')), 'C')
+"""
+
+CREATE_SQL = [
+    """
+    CREATE TRIGGER tasks_archivedtask_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, content, completion_comment ON tasks_archivedtask
+    FOR EACH ROW EXECUTE FUNCTION tasks_task_search_vector_update()
+    """,
+    'UPDATE tasks_archivedtask SET search_vector = %s' % SEARCH_VECTOR_SQL,
+    'CREATE INDEX archivedtask_search_vector_idx ON tasks_archivedtask USING gin (search_vector)',
+]
+
+DROP_SQL = [
+    'DROP INDEX IF EXISTS archivedtask_search_vector_idx',
+    'DROP TRIGGER IF EXISTS tasks_archivedtask_search_vector_trigger ON tasks_archivedtask',
+]
+
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in CREATE_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0014_taskevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtask',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0015_archivedtask_search_vector'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedtask',
+            name='author',
+            field=models.ForeignKey(on_delete=models.SET('deleted user'), related_name='archived_tasks', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -3,12 +3,58 @@ from django.utils import timezone
 from datetime import timedelta
 from django.urls import reverse
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.contrib.postgres.search import SearchVectorField
 from users.models import User
 
 
 def one_day_after():
     return timezone.now() + timedelta(1)
 
+
+# This queryset joins everything the task templates touch (author avatar and completer),
+# so that rendering a page of tasks doesn't issue extra queries per row.
+# Orderings end with an id tiebreak, so that pages are stable and can be cursor paginated
+class TaskQuerySet(models.QuerySet):
+    def with_related(self):
+        return self.select_related('author__profile', 'completer__profile')
+
+    def open(self):
+        return self.filter(status=Task.OPEN).order_by('-date_posted', '-id')
+
+    def completed(self):
+        return self.filter(status=Task.COMPLETED).order_by('-date_completed', '-id')
+
+    def by_author(self, user):
+        return self.filter(author=user).order_by('-date_posted', '-id')
+
+    # These are the permission rules of the task views as set-based filters,
+    # they must agree with Task.can_be_completed_by/can_be_edited_by
+    def completable_by(self, user):
+        if user.role != User.COMPLETER:
+            return self.none()
+        return self.filter(models.Q(completer__isnull=True) | models.Q(completer=user),
+                           status__in=(Task.OPEN, Task.IN_PROGRESS))
+
+    def claimable_by(self, user):
+        return self.completable_by(user).filter(status=Task.OPEN)
+
+    def editable_by(self, user):
+        return self.filter(author=user)
+
+
+# Nothing renders the search vector, so it isn't loaded with the tasks
+class TaskManager(models.Manager.from_queryset(TaskQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().defer('search_vector')
+
+
+# Raised by Task.save() when the row changed since the instance was loaded. Like any error
+# in a save, it breaks the enclosing transaction: save in atomic() to recover from it
+class TaskConflict(Exception):
+    pass
+
+
 # This is a db model for the tasks
 class Task(models.Model):
     OPEN = 1
@@ -37,10 +83,251 @@ class Task(models.Model):
     date_completed = models.DateTimeField(blank=True, null=True)
     completion_comment = models.TextField(blank=True, null=True)
 
+    # Bumped on every save, used as the version of the cached task cards
+    updated = models.DateTimeField(auto_now=True)
+
+    # Incremented by every write, saves and updates are conditional on it (see Task.save)
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    # The weighted tsvector of title, content and completion_comment (see tasks/search.py).
+    # It is maintained by a Postgres trigger and stays empty on other databases
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = TaskManager()
+
+    # These indexes match the list views' filter/sort patterns (see explain_task_queries).
+    # Statuses are literals here, since Task.OPEN/Task.COMPLETED aren't reachable from Meta
+    class Meta:
+        indexes = [
+            models.Index(fields=['-date_posted', '-id'], condition=models.Q(status=1),
+                         name='task_open_posted_idx'),
+            models.Index(fields=['-date_completed', '-id'], condition=models.Q(status=3),
+                         name='task_completed_idx'),
+            models.Index(fields=['author', '-date_posted', '-id'], name='task_author_posted_idx'),
+            # the scheduler's range scans over due dates (see tasks/scheduler.py)
+            models.Index(fields=['status', 'due_date', 'id'], name='task_status_due_idx'),
+            # the live list's high-water mark scan (see tasks/events.py)
+            models.Index(fields=['updated', 'id'], name='task_updated_idx'),
+        ]
+
+    # The fields the per-user statistics depend on (see tasks/stats.py)
+    STATS_FIELDS = ('status', 'author_id', 'completer_id', 'due_date')
+    # The fields whose changes are kept in the task history (see tasks/history.py)
+    HISTORY_FIELDS = ('title', 'content', 'due_date', 'completer_id', 'status')
+
+    # Remembers the loaded state, so that the statistics and the history can apply the
+    # difference on save
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_stats_state = instance.stats_state()
+        instance._loaded_history_state = instance.history_state()
+        return instance
+
+    # Archived tasks are read-only (see ArchivedTask)
+    is_archived = False
+
+    def stats_state(self):
+        return tuple(self.__dict__.get(field) for field in Task.STATS_FIELDS)
+
+    def history_state(self):
+        return tuple(self.__dict__.get(field) for field in Task.HISTORY_FIELDS)
+
+    # Optimistic concurrency: saving an existing task is an UPDATE ... WHERE version = <the
+    # version of this instance> that increments it. When another request wrote the row in
+    # between, nothing is updated and TaskConflict is raised instead of overwriting its change
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        self.version += 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        try:
+            super().save(*args, **kwargs)
+        except TaskConflict:
+            self.version -= 1
+            raise
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        updated = super()._do_update(base_qs.filter(version=self.version - 1), using, pk_val,
+                                     values, update_fields, forced_update)
+        if not updated and base_qs.filter(pk=pk_val).exists():
+            raise TaskConflict(f'Task {pk_val} was changed by someone else')
+        return updated
+
     def __str__(self):
         return self.title
     
     def get_absolute_url(self):
         return reverse("task-detail", kwargs={"pk": self.pk})
-    
 
+    # To complete a task:
+    # 1. The task has to be open (or claimed, see Task.claim)
+    # 2. You have to be a COMPLETER
+    # 3. You have to be assigned to this task
+    #    OR the task can be assigned to anyone
+    def can_be_completed_by(self, user):
+        is_task_open = self.status in (Task.OPEN, Task.IN_PROGRESS)
+        user_can_complete = user.role == User.COMPLETER
+        assigned_to_me = self.completer_id == user.pk
+        assigned_to_anyone = self.completer_id is None
+        return is_task_open and user_can_complete and (assigned_to_anyone or assigned_to_me)
+
+    def can_be_claimed_by(self, user):
+        return self.status == Task.OPEN and self.can_be_completed_by(user)
+
+    # To update or delete a task, you have to be its creator
+    def can_be_edited_by(self, user):
+        return self.author_id == user.pk
+
+
+# Completed tasks older than TASK_ARCHIVE_AFTER_DAYS are moved here by manage.py
+# archive_tasks, so that the task table only holds the recent ones. The rows keep their
+# task id and have the same field names, so the same querysets, filters and templates
+# work on both tables (see tasks/archive.py)
+class ArchivedTask(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=200)
+    content = models.TextField()
+    date_posted = models.DateTimeField()
+    due_date = models.DateTimeField()
+    author = models.ForeignKey(User, on_delete=models.SET("deleted user"), related_name='archived_tasks')
+    status = models.PositiveSmallIntegerField(choices=Task.TASK_STATUS, default=Task.COMPLETED)
+    completer = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True,
+                                  related_name='archived_completed_tasks')
+    date_completed = models.DateTimeField(blank=True, null=True)
+    completion_comment = models.TextField(blank=True, null=True)
+    updated = models.DateTimeField()
+    archived = models.DateTimeField(default=timezone.now)
+
+    # Filled by the same trigger as Task.search_vector when the row is inserted
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = TaskManager()
+
+    is_archived = True
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-date_completed', '-id'], name='archivedtask_completed_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    def get_absolute_url(self):
+        return reverse("task-detail", kwargs={"pk": self.pk})
+
+
+# The append-only change history of the tasks, one row per change with the fields it
+# changed as {field: [old, new]}. The rows are written in batches at commit (see
+# tasks/history.py). They outlive the task: there is no foreign key constraint, so
+# archiving or deleting a task keeps its history
+class TaskEvent(models.Model):
+    CREATED = 'created'
+    UPDATED = 'updated'
+    ASSIGNED = 'assigned'
+    CLAIMED = 'claimed'
+    COMPLETED = 'completed'
+    REOPENED = 'reopened'
+    DELETED = 'deleted'
+
+    KINDS = (
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (ASSIGNED, 'Assigned'),
+        (CLAIMED, 'Claimed'),
+        (COMPLETED, 'Completed'),
+        (REOPENED, 'Reopened'),
+        (DELETED, 'Deleted'),
+    )
+
+    task = models.ForeignKey(Task, on_delete=models.DO_NOTHING, db_constraint=False, related_name='events')
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name='task_events')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # the timeline of a task (see TaskDetailView)
+            models.Index(fields=['task', 'created_at'], name='taskevent_task_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} task {self.task_id}'
+
+
+# Open/completed/overdue task counts per user, as the creator and as the completer.
+# The rows are kept up to date incrementally by tasks/signals.py, so that pages can show
+# them without aggregating the task table. manage.py rebuild_task_stats repairs any drift
+class UserTaskStats(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='task_stats')
+    created_open = models.IntegerField(default=0)
+    created_completed = models.IntegerField(default=0)
+    created_overdue = models.IntegerField(default=0)
+    assigned_open = models.IntegerField(default=0)
+    assigned_completed = models.IntegerField(default=0)
+    assigned_overdue = models.IntegerField(default=0)
+
+    COUNT_FIELDS = ('created_open', 'created_completed', 'created_overdue',
+                    'assigned_open', 'assigned_completed', 'assigned_overdue')
+
+    def __str__(self):
+        return f'{self.user} task stats'
+
+    # A user without any task has no row yet
+    @classmethod
+    def for_user(cls, user):
+        try:
+            return user.task_stats
+        except cls.DoesNotExist:
+            return cls(user=user)
+
+
+# This is the outbox of the task scheduler: one row per notification, written in the same
+# transaction as the scheduler's progress, and sent by whatever reads the unsent rows.
+# A task gets one notification of each kind per due date, a new due date notifies again
+class TaskNotification(models.Model):
+    OVERDUE = 'overdue'
+    DUE_SOON = 'due_soon'
+
+    KINDS = (
+        (OVERDUE, 'Overdue'),
+        (DUE_SOON, 'Due soon'),
+    )
+
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    due_date = models.DateTimeField()
+    created = models.DateTimeField(default=timezone.now)
+    sent = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'kind', 'due_date'], name='tasknotification_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['created'], condition=models.Q(sent__isnull=True),
+                         name='tasknotification_unsent_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()}: {self.task_id}'
+
+
+# Named timestamps persisted by the background jobs, e.g. how far they got
+class Watermark(models.Model):
+    name = models.CharField(max_length=100, primary_key=True)
+    value = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+    @classmethod
+    def get_value(cls, name):
+        return cls.objects.filter(name=name).values_list('value', flat=True).first()
+
+    @classmethod
+    def set_value(cls, name, value):
+        cls.objects.update_or_create(name=name, defaults={'value': value})
@@ -0,0 +1,154 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import cc_delim_re
+
+
+GENERATION_KEY = 'page-gen:{}'
+ALL_PAGES = 'all'
+# How long the request that renders a stale page keeps the others serving it
+LOCK_SECONDS = 30
+
+
+def page_cache():
+    return caches[getattr(settings, 'TASK_PAGE_CACHE', 'default')]
+
+
+def page_cache_timeout():
+    return getattr(settings, 'TASK_PAGE_CACHE_TIMEOUT', None)
+
+
+def stale_seconds():
+    return getattr(settings, 'TASK_PAGE_CACHE_STALE_SECONDS', 0) or 0
+
+
+# Called by the Task/Profile signals: a new generation of a group makes every cached page
+# of that group stale at once. Generations are random tokens, so one set_many purges
+# any number of groups without reading them first. It happens on commit: a request that
+# read the new generation before would render the old rows and store them as fresh
+def purge_pages(groups):
+    groups = list(groups)
+
+    def purge():
+        token = f'{time.time_ns():x}'
+        page_cache().set_many({GENERATION_KEY.format(group): token for group in groups}, None)
+    transaction.on_commit(purge)
+
+
+def purge_all_pages():
+    purge_pages([ALL_PAGES])
+
+
+# A user's page, or all of them without a username
+def user_page_group(username=None):
+    return f'user:{username}' if username else 'users'
+
+
+def task_page_group(task_id):
+    return f'task:{task_id}'
+
+
+# The pages that show a user's avatar or username apart from the lists and the user's page
+def profile_page_group(user_id):
+    return f'profile:{user_id}'
+
+
+# The filters in any order, and empty filters, are the same page
+def normalized_query(request):
+    items = sorted((key, value) for key, values in request.GET.lists() for value in values if value != '')
+    return urlencode(items)
+
+
+# This caches whole pages for anonymous visitors, who all see the same page. A page belongs
+# to groups (e.g. the open list, a user's page, a task's detail page), the signals purge the
+# groups a change affects. A cached page is fresh while its groups' generations are the
+# current ones and it's younger than TASK_PAGE_CACHE_TIMEOUT. An expired or purged page is
+# still served for TASK_PAGE_CACHE_STALE_SECONDS, while one request (the one that gets the
+# lock) renders the new page: a popular page that changes doesn't bring every visitor
+# to the database at once.
+# The key holds the request headers the response varies on, except Cookie: only
+# anonymous requests without a messages cookie read or fill the cache, and responses
+# that set a cookie are never stored.
+# get_page_cache_extra_groups() is for groups that take a query to find: it's called
+# before rendering, and the cached page keeps them for the next requests
+class AnonymousPageCacheMixin:
+    def get_page_cache_groups(self):
+        raise NotImplementedError
+
+    def get_page_cache_extra_groups(self):
+        return []
+
+    def dispatch(self, request, *args, **kwargs):
+        if (page_cache_timeout() is None or request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated or request.COOKIES.get('messages')):
+            return super().dispatch(request, *args, **kwargs)
+
+        cache = page_cache()
+        groups = [ALL_PAGES] + self.get_page_cache_groups()
+        vary_key = f'page-vary:{request.path}'
+        values = cache.get_many([vary_key] + [GENERATION_KEY.format(group) for group in groups])
+        generations = tuple(values.get(GENERATION_KEY.format(group)) for group in groups)
+        vary = values.get(vary_key, ())
+        key = self.page_cache_key(request, vary)
+
+        entry = cache.get(key)
+        now = time.time()
+        locked = False
+        if entry is not None:
+            age = now - entry['stored']
+            current = generations + self.read_generations(cache, entry.get('extra_groups', []))
+            if entry['generations'] == current and age < page_cache_timeout():
+                return self.cached_response(entry, 'hit')
+            if stale_seconds() and age < page_cache_timeout() + stale_seconds():
+                locked = cache.add(f'{key}:lock', 1, LOCK_SECONDS)
+                if not locked:
+                    return self.cached_response(entry, 'stale')
+
+        extra_groups = self.get_page_cache_extra_groups()
+        generations += self.read_generations(cache, extra_groups)
+        response = super().dispatch(request, *args, **kwargs)
+        response['X-Page-Cache'] = 'miss'
+
+        # stored once rendered, which TemplateResponses are after the middleware
+        def store(response):
+            if request.method == 'GET' and self.is_cacheable(response):
+                response_vary = tuple(sorted(header.lower() for header in cc_delim_re.split(response.get('Vary', ''))
+                                             if header and header.lower() != 'cookie'))
+                if response_vary != vary:
+                    cache.set(vary_key, response_vary, None)
+                cache.set(self.page_cache_key(request, response_vary),
+                          {'generations': generations, 'extra_groups': extra_groups, 'stored': now,
+                           'response': response},
+                          page_cache_timeout() + stale_seconds())
+            if locked:
+                cache.delete(f'{key}:lock')
+
+        if getattr(response, 'is_rendered', True):
+            store(response)
+        else:
+            response.add_post_render_callback(store)
+        return response
+
+    def read_generations(self, cache, groups):
+        if not groups:
+            return ()
+        values = cache.get_many([GENERATION_KEY.format(group) for group in groups])
+        return tuple(values.get(GENERATION_KEY.format(group)) for group in groups)
+
+    def page_cache_key(self, request, vary):
+        headers = '|'.join(request.headers.get(header, '') for header in vary)
+        source = f'{request.path}?{normalized_query(request)}|{headers}'
+        return f'page:{hashlib.sha1(source.encode()).hexdigest()}'
+
+    def is_cacheable(self, response):
+        cache_control = response.get('Cache-Control', '')
+        return (response.status_code == 200 and not response.cookies and not response.streaming
+                and 'private' not in cache_control and 'no-store' not in cache_control)
+
+    def cached_response(self, entry, state):
+        response = entry['response']
+        response['X-Page-Cache'] = state
+        return response
@@ -0,0 +1,274 @@
+import base64
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page, Paginator, PageNotAnInteger, EmptyPage
+from django.db import connections, router
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+COUNT_VERSION_KEY = 'task-count-version'
+
+
+# Called by the Task signals: bumping the version orphans every cached count at once
+def invalidate_task_counts():
+    try:
+        cache.incr(COUNT_VERSION_KEY)
+    except ValueError:
+        cache.set(COUNT_VERSION_KEY, 2, None)
+
+
+def count_cache_timeout():
+    return getattr(settings, 'TASK_COUNT_CACHE_TIMEOUT', 30)
+
+
+# The cache key of a count (or another aggregate, by `kind`) of a queryset: its SQL, under
+# the version that invalidate_task_counts() bumps
+def task_count_key(queryset, kind='count'):
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.sha1(f'{sql}{params!r}'.encode()).hexdigest()
+    version = cache.get_or_set(COUNT_VERSION_KEY, 1, None)
+    return f'task-{kind}:{version}:{digest}'
+
+
+# This paginator caches the row count per filter combination (the count query's SQL)
+# for TASK_COUNT_CACHE_TIMEOUT seconds. On Postgres, counts above
+# TASK_COUNT_ESTIMATE_THRESHOLD come from the planner's estimate instead of COUNT(*).
+# An ArchiveChain is counted per queryset
+class CachedCountPaginator(Paginator):
+    approximate = False
+
+    @cached_property
+    def count(self):
+        querysets = getattr(self.object_list, 'querysets', None)
+        if querysets is None:
+            self.approximate, count = self.cached_count(self.object_list)
+            return count
+        counts = [self.cached_count(queryset) for queryset in querysets]
+        self.approximate = any(approximate for approximate, _ in counts)
+        # the chain slices with the exact counts, it counts the others itself
+        self.object_list.counts.update(
+            (index, count) for index, (approximate, count) in enumerate(counts) if not approximate)
+        return sum(count for _, count in counts)
+
+    def cached_count(self, queryset):
+        queryset = queryset.order_by()
+        key = task_count_key(queryset)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        approximate, count = False, None
+        threshold = getattr(settings, 'TASK_COUNT_ESTIMATE_THRESHOLD', None)
+        if threshold is not None and connections[queryset.db].vendor == 'postgresql':
+            estimate = self.estimate_count(queryset)
+            if estimate >= threshold:
+                approximate, count = True, estimate
+        if count is None:
+            count = queryset.count()
+        cache.set(key, (approximate, count), count_cache_timeout())
+        return approximate, count
+
+    # Unfiltered tables use pg_class.reltuples, anything else the top row estimate of EXPLAIN
+    def estimate_count(self, queryset):
+        with connections[queryset.db].cursor() as cursor:
+            if not queryset.query.where:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                               [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+                return max(row[0], 0) if row else 0
+            plan = json.loads(queryset.explain(format='json'))
+            return int(plan[0]['Plan']['Plan Rows'])
+
+    # An estimate can be lower than the real count: the page is sliced without the count's
+    # cap, with one more row that tells whether there is a next page
+    def page(self, number):
+        if not self.count or not self.approximate:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('That page contains no results')
+        return ApproximatePage(rows[:self.per_page], number, self, len(rows) > self.per_page)
+
+    # ... and pages past the estimated end don't 404
+    def validate_number(self, number):
+        if not self.approximate:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+
+# A page of an approximately counted list, it knows from the extra row whether a next one exists
+class ApproximatePage(Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+# This is a page of a keyset (cursor) paginated queryset. It mimics the parts of
+# django.core.paginator.Page that the templates use, but it never knows the total count
+class CursorPage:
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next:
+            return self.paginator.encode_cursor(self.object_list[-1], 'next')
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous:
+            return self.paginator.encode_cursor(self.object_list[0], 'previous')
+
+
+# Keyset paginator: instead of OFFSET it filters on the ordering columns of the last
+# (or first) row of the current page, so deep pages cost the same as the first one.
+# The queryset must be ordered by unique plain fields, e.g. ('-date_posted', '-id')
+class CursorPaginator:
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(queryset.query.order_by)
+        if not self.ordering or self.ordering[-1].lstrip('-') not in ('id', 'pk'):
+            raise ValueError('CursorPaginator needs a queryset ordered with an id tiebreak')
+        self.fields = [(field.lstrip('-'), field.startswith('-')) for field in self.ordering]
+        self.nullable = {name for name, _ in self.fields
+                         if name != 'pk' and queryset.model._meta.get_field(name).null}
+        # where the database sorts NULLs: Postgres after every value, SQLite before
+        self.nulls_largest = connections[router.db_for_read(queryset.model)].features.nulls_order_largest
+
+    def page(self, cursor=None):
+        if not cursor:
+            rows = list(self.queryset[:self.per_page + 1])
+            return CursorPage(rows[:self.per_page], self, len(rows) > self.per_page, False)
+
+        direction, values = self.decode_cursor(cursor)
+        backwards = direction == 'previous'
+        try:
+            queryset = self.queryset.filter(self.keyset_filter(values, backwards))
+        except (ValidationError, ValueError, TypeError):
+            raise InvalidCursor('Invalid cursor')
+        if backwards:
+            queryset = queryset.reverse()
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            return CursorPage(rows, self, True, has_more)
+        return CursorPage(rows, self, has_more, True)
+
+    # Builds (a < x) OR (a = x AND b < y) OR ... for the ordering columns. A nullable
+    # column's NULLs come before or after its values like in the database's ORDER BY
+    def keyset_filter(self, values, backwards):
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, values):
+            lookup = 'lt' if descending != backwards else 'gt'
+            nulls_after = name in self.nullable and (descending != backwards) != self.nulls_largest
+            if value is None:
+                if not nulls_after:
+                    condition |= equal & Q(**{f'{name}__isnull': False})
+                equal &= Q(**{f'{name}__isnull': True})
+                continue
+            beyond = Q(**{f'{name}__{lookup}': value})
+            if nulls_after:
+                beyond |= Q(**{f'{name}__isnull': True})
+            condition |= equal & beyond
+            equal &= Q(**{name: value})
+        return condition
+
+    def encode_cursor(self, obj, direction):
+        values = []
+        for name, _ in self.fields:
+            value = getattr(obj, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        data = json.dumps([direction, values], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(data)
+        except (ValueError, TypeError):
+            raise InvalidCursor('Invalid cursor')
+        if direction not in ('next', 'previous') or not isinstance(values, list) \
+                or len(values) != len(self.fields):
+            raise InvalidCursor('Invalid cursor')
+        parsed = []
+        for value in values:
+            if isinstance(value, str):
+                try:
+                    value = parse_datetime(value) or value
+                except ValueError:
+                    raise InvalidCursor('Invalid cursor')
+            parsed.append(value)
+        return direction, parsed
+
+
+# This mixin switches a ListView to cursor pagination when TASK_CURSOR_PAGINATION is on.
+# The filters are applied by get_queryset() as usual, the cursor only adds a keyset condition
+class CursorPaginationMixin:
+    cursor_query_param = 'cursor'
+
+    def use_cursor_pagination(self):
+        return getattr(settings, 'TASK_CURSOR_PAGINATION', False)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_query_param))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cursor_pagination'] = self.use_cursor_pagination()
+        return context
@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.db.models import Q
+from .models import Task, TaskNotification, Watermark
+from .stats import advance_overdue_mark
+
+
+# How far each scan got, so that a restarted scheduler continues instead of rescanning
+OVERDUE_MARK = 'scheduler-overdue'
+DUE_SOON_MARK = 'scheduler-due-soon'
+
+UNFINISHED = (Task.OPEN, Task.IN_PROGRESS)
+
+
+def due_tasks(start, end):
+    return (Task.objects.filter(status__in=UNFINISHED, due_date__gte=start, due_date__lte=end)
+            .order_by('due_date', 'id'))
+
+
+# Writes a notification for every unfinished task due in [start, end], in (due_date, id)
+# order with a keyset over the (status, due_date, id) index, one transaction per batch.
+# The mark is saved with every batch. It's inclusive, so tasks sharing the due date of
+# the last batch are scanned again after a restart, and the unique constraint drops the
+# repeated notifications. Returns the number of scanned tasks
+def scan(kind, mark_name, start, end, batch_size):
+    tasks = due_tasks(start, end)
+    scanned = 0
+    after = None
+    while True:
+        batch = tasks
+        if after is not None:
+            batch = batch.filter(Q(due_date__gt=after[1]) | Q(due_date=after[1], id__gt=after[0]))
+        rows = list(batch.values_list('id', 'due_date')[:batch_size])
+        finished = len(rows) < batch_size
+        with transaction.atomic():
+            TaskNotification.objects.bulk_create(
+                [TaskNotification(task_id=pk, kind=kind, due_date=due_date) for pk, due_date in rows],
+                ignore_conflicts=True)
+            Watermark.set_value(mark_name, end if finished else rows[-1][1])
+        scanned += len(rows)
+        if finished:
+            return scanned
+        after = rows[-1]
+
+
+# One pass of the scheduler. On the first run the scans start at `now`, the tasks that
+# were already overdue aren't notified. Neither are tasks created or rescheduled into a
+# range that was already scanned
+def run_once(now, due_soon, batch_size):
+    overdue_start = Watermark.get_value(OVERDUE_MARK) or now
+    overdue = scan(TaskNotification.OVERDUE, OVERDUE_MARK, overdue_start, now, batch_size)
+
+    due_soon_end = now + due_soon
+    due_soon_start = max(Watermark.get_value(DUE_SOON_MARK) or now, now)
+    soon = 0
+    if due_soon_start < due_soon_end:
+        soon = scan(TaskNotification.DUE_SOON, DUE_SOON_MARK, due_soon_start, due_soon_end, batch_size)
+
+    advance_overdue_mark(now)
+    return overdue, soon
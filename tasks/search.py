@@ -0,0 +1,33 @@
+from django.db import connection
+from django.db.models import F, FloatField, Q, TextField, Value
+from django.db.models.functions import Cast, Coalesce, Concat
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+
+
+# The text search configuration, it must match the one of the trigger in migration 0008
+SEARCH_CONFIG = 'english'
+
+# ts_headline marks the matches with these, the highlight filter escapes the snippet
+# and only then turns them into <mark> tags, since the task text is user input
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_STOP = '\x03'
+
+
+# Full-text search over title, content and completion comment, of the tasks or of the
+# archive. On Postgres it matches the trigger maintained search_vector (GIN indexed), orders
+# by rank and adds a highlighted snippet as `headline`. Other databases (SQLite in dev)
+# fall back to icontains
+def search_tasks(queryset, text):
+    if connection.vendor != 'postgresql':
+        return queryset.filter(Q(title__icontains=text) | Q(content__icontains=text)
+                               | Q(completion_comment__icontains=text))
+
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    body = Concat('content', Value(' '), Coalesce('completion_comment', Value('')),
+                  output_field=TextField())
+    # ts_rank is a real, as a double its value survives a round trip through a page cursor
+    return queryset.filter(search_vector=query).annotate(
+        rank=Cast(SearchRank(F('search_vector'), query), FloatField()),
+        headline=SearchHeadline(body, query, config=SEARCH_CONFIG, max_fragments=2,
+                                start_sel=HIGHLIGHT_START, stop_sel=HIGHLIGHT_STOP),
+    ).order_by('-rank', *queryset.query.order_by)
@@ -0,0 +1,170 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver, Signal
+from django.core.cache import cache
+from django.utils import timezone
+from .api import LAST_DELETED_KEY, USERS_CHANGED_KEY
+from .events import notify_task_events
+from .fragments import invalidate_cards
+from .history import record_events, task_saved_event, tasks_updated_events
+from .models import Task, TaskEvent
+from .pagecache import profile_page_group, purge_pages, task_page_group, user_page_group
+from .pagination import invalidate_task_counts
+from .stats import record_changes
+from users.models import Profile, User
+
+
+# Sent after set-based updates (queryset.update() sends no post_save), with the ids of the
+# changed tasks. The receivers do what the post_save receivers do for a single task.
+# Optional arguments: `previous`, the {pk: Task.stats_state()} before the update, and
+# `changes`, the {field: value} it applied; without them the statistics and the history
+# aren't updated. `actor` is the user who made the change, for the history
+tasks_updated = Signal()
+
+
+# Creating, completing or deleting a task changes the list counts
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_counts(sender, instance, **kwargs):
+    invalidate_task_counts()
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_cards(sender, instance, **kwargs):
+    invalidate_cards([instance.pk])
+
+
+@receiver(tasks_updated)
+def invalidate_updated_tasks(sender, task_ids, **kwargs):
+    invalidate_task_counts()
+    invalidate_cards(task_ids)
+
+
+# The cached anonymous pages (see tasks/pagecache.py): a task is on one of the lists, on its
+# own page, on its author's page and, in the Assigned counts, on its completers' pages.
+# When the author isn't loaded, every user page goes rather than spending a query on the
+# username, like after a set-based update. This runs before update_stats_on_save replaces
+# the loaded state, which holds the previous completer
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def purge_task_pages(sender, instance, created=False, **kwargs):
+    groups = ['open', 'completed', task_page_group(instance.pk)]
+    if not Task.author.is_cached(instance):
+        purge_pages(groups + [user_page_group()])
+        return
+    groups.append(user_page_group(instance.author.username))
+    completer_ids = changed_completer_ids(instance, created, kwargs['signal'] is post_delete)
+    if completer_ids is None:
+        groups.append(user_page_group())
+    elif completer_ids:
+        usernames = {}
+        if Task.completer.is_cached(instance) and instance.completer_id in completer_ids:
+            usernames[instance.completer_id] = instance.completer.username
+        missing = completer_ids - set(usernames)
+        if missing:
+            usernames.update(User.objects.filter(pk__in=missing).values_list('pk', 'username'))
+        groups += [user_page_group(username) for username in usernames.values()]
+    purge_pages(groups)
+
+
+# The completers whose Assigned counts a save or deletion changes, None when the previous
+# state isn't known
+def changed_completer_ids(instance, created, deleted):
+    status, completer_id = instance.status, instance.completer_id
+    previous = None if created else getattr(instance, '_loaded_stats_state', None)
+    if previous is None:
+        return {completer_id} - {None} if created or deleted else None
+    previous = dict(zip(Task.STATS_FIELDS, previous))
+    if deleted:
+        return {previous['completer_id']} - {None}
+    if (previous['status'], previous['completer_id']) == (status, completer_id):
+        return set()
+    return {previous['completer_id'], completer_id} - {None}
+
+
+# The per-user statistics get the difference between the loaded and the saved task
+@receiver(post_save, sender=Task)
+def update_stats_on_save(sender, instance, created, **kwargs):
+    state = instance.stats_state()
+    previous = None if created else getattr(instance, '_loaded_stats_state', None)
+    record_changes([(previous, state)])
+    instance._loaded_stats_state = state
+
+
+@receiver(post_delete, sender=Task)
+def update_stats_on_delete(sender, instance, **kwargs):
+    previous = getattr(instance, '_loaded_stats_state', None) or instance.stats_state()
+    record_changes([(previous, None)])
+
+
+@receiver(tasks_updated)
+def update_stats_on_bulk_update(sender, task_ids, previous=None, changes=None, **kwargs):
+    if previous is None or changes is None:
+        return
+    record_changes([
+        (state, tuple(changes.get(field, value) for field, value in zip(Task.STATS_FIELDS, state)))
+        for state in previous.values()
+    ])
+
+
+# Wakes the live task list streams (see tasks/events.py)
+@receiver(post_save, sender=Task)
+def notify_saved_task(sender, instance, **kwargs):
+    notify_task_events()
+
+
+@receiver(tasks_updated)
+def notify_updated_tasks(sender, task_ids, **kwargs):
+    notify_task_events()
+
+
+# The history (see tasks/history.py). Views set `changed_by` on the task they save
+@receiver(post_save, sender=Task)
+def record_saved_task(sender, instance, created, **kwargs):
+    event = task_saved_event(instance, created, getattr(instance, 'changed_by', None))
+    if event is not None:
+        record_events([event])
+    instance._loaded_history_state = instance.history_state()
+
+
+@receiver(post_delete, sender=Task)
+def record_deleted_task(sender, instance, **kwargs):
+    record_events([TaskEvent(task_id=instance.pk, actor=getattr(instance, 'changed_by', None),
+                             kind=TaskEvent.DELETED)])
+
+
+@receiver(tasks_updated)
+def record_updated_tasks(sender, task_ids, previous=None, changes=None, actor=None, **kwargs):
+    if previous is None or changes is None:
+        return
+    record_events(tasks_updated_events(previous, changes, actor))
+
+
+# A deletion is a modification of the lists, even though no remaining row changed
+@receiver(post_delete, sender=Task)
+def remember_deletion(sender, instance, **kwargs):
+    cache.set(LAST_DELETED_KEY, timezone.now(), None)
+
+
+# The API rows carry the authors' and completers' usernames, see task_version()
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def remember_profile_change(sender, instance, **kwargs):
+    cache.set(USERS_CHANGED_KEY, timezone.now(), None)
+
+
+# The lists, the user's page and the detail pages of the user's tasks show the avatar and
+# the username (the cards see the profile's version, see card_version()). A username change
+# saves the profile too (see users/signals.py), the page under the old username goes then
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def purge_profile_pages(sender, instance, **kwargs):
+    user = instance.user
+    usernames = {user.username, getattr(user, '_loaded_username', None) or user.username}
+    purge_pages(['open', 'completed', profile_page_group(user.pk)]
+                + [user_page_group(username) for username in usernames])
+
+
+@receiver(tasks_updated)
+def purge_updated_task_pages(sender, task_ids, **kwargs):
+    purge_pages(['open', 'completed', user_page_group(None)] + [task_page_group(task_id) for task_id in task_ids])
@@ -0,0 +1,58 @@
+// Patches the open task list from the task events stream (see tasks/events.py).
+// Events are applied idempotently: a task's card is replaced or inserted while it's open,
+// and removed when it leaves the list
+(function () {
+  var list = document.getElementById('task-list');
+  if (!list || !window.EventSource) {
+    return;
+  }
+  var notice = document.getElementById('task-list-notice');
+  var liveInserts = list.dataset.liveInserts === 'true';
+  var selectable = list.dataset.selectable === 'true';
+
+  function findItem(id) {
+    return list.querySelector('.task-item[data-task-id="' + id + '"]');
+  }
+
+  function makeItem(task) {
+    var item = document.createElement('div');
+    item.className = 'task-item';
+    item.dataset.taskId = task.id;
+    if (selectable) {
+      item.innerHTML =
+        '<div class="form-check">' +
+        '<input class="form-check-input" type="checkbox" name="ids" value="' + task.id +
+        '" id="select-' + task.id + '" form="bulk-form">' +
+        '<label class="form-check-label text-muted" for="select-' + task.id + '">Select</label>' +
+        '</div>';
+    }
+    var card = document.createElement('div');
+    card.className = 'task-card';
+    card.innerHTML = task.html;
+    item.appendChild(card);
+    return item;
+  }
+
+  function apply(task) {
+    var item = findItem(task.id);
+    if (!task.html) {
+      if (item) {
+        item.remove();
+      }
+    } else if (item) {
+      item.querySelector('.task-card').innerHTML = task.html;
+    } else if (task.kind === 'created') {
+      if (liveInserts) {
+        list.insertBefore(makeItem(task), list.firstChild);
+      } else if (notice) {
+        notice.classList.remove('d-none');
+      }
+    }
+  }
+
+  var url = list.dataset.eventsUrl + '?since=' + encodeURIComponent(list.dataset.since);
+  var source = new EventSource(url);
+  source.addEventListener('task', function (event) {
+    apply(JSON.parse(event.data));
+  });
+})();
@@ -0,0 +1,104 @@
+from collections import Counter
+from django.db import transaction
+from django.db.models import Count, F, Q
+from .models import ArchivedTask, Task, UserTaskStats, Watermark
+
+
+# Open tasks due before this mark count as overdue. It's advanced by rebuild_task_stats,
+# which recounts everything, and by the task scheduler, which adds the tasks that became
+# overdue in between (see advance_overdue_mark), so that the counters never depend on the
+# current time
+OVERDUE_WATERMARK = 'task-stats-overdue'
+
+
+# The counters a task adds to, for a Task.stats_state() tuple
+def contributions(state, overdue_before):
+    counter = Counter()
+    if state is None:
+        return counter
+    status, author_id, completer_id, due_date = state
+    completed = status == Task.COMPLETED
+    overdue = (not completed and overdue_before is not None and due_date is not None
+               and due_date < overdue_before)
+    for role, user_id in (('created', author_id), ('assigned', completer_id)):
+        if user_id is None:
+            continue
+        counter[user_id, f'{role}_completed' if completed else f'{role}_open'] += 1
+        if overdue:
+            counter[user_id, f'{role}_overdue'] += 1
+    return counter
+
+
+# Applies (old state, new state) pairs to the counters, None is a missing task.
+# Every counter is incremented in the database (field = field + n), so concurrent
+# changes don't overwrite each other
+def record_changes(changes):
+    changes = [(old, new) for old, new in changes if old != new]
+    if not changes:
+        return
+    overdue_before = Watermark.get_value(OVERDUE_WATERMARK)
+    deltas = Counter()
+    for old, new in changes:
+        deltas.update(contributions(new, overdue_before))
+        deltas.subtract(contributions(old, overdue_before))
+    apply_deltas(deltas)
+
+
+# Adds a {(user id, counter): n} Counter to the rows
+def apply_deltas(deltas):
+    by_user = {}
+    for (user_id, field), delta in deltas.items():
+        if delta:
+            by_user.setdefault(user_id, {})[field] = delta
+    if not by_user:
+        return
+    UserTaskStats.objects.bulk_create([UserTaskStats(user_id=user_id) for user_id in by_user],
+                                      ignore_conflicts=True)
+    for user_id, fields in by_user.items():
+        UserTaskStats.objects.filter(user_id=user_id).update(
+            **{field: F(field) + delta for field, delta in fields.items()})
+
+
+# Recounts everything with GROUP BY queries over the tasks and the archive, returns the new rows
+def compute_stats(overdue_before):
+    is_open = ~Q(status=Task.COMPLETED)
+    counts = {
+        'open': Count('id', filter=is_open),
+        'completed': Count('id', filter=Q(status=Task.COMPLETED)),
+        'overdue': Count('id', filter=is_open & Q(due_date__lt=overdue_before)),
+    }
+    stats = {}
+    for role, field in (('created', 'author'), ('assigned', 'completer')):
+        rows = (Task.objects.filter(**{f'{field}__isnull': False}).order_by()
+                .values(field).annotate(**counts))
+        for row in rows:
+            user_stats = stats.setdefault(row[field], UserTaskStats(user_id=row[field]))
+            for name in counts:
+                setattr(user_stats, f'{role}_{name}', row[name])
+        # archived tasks are all completed
+        rows = (ArchivedTask.objects.filter(**{f'{field}__isnull': False}).order_by()
+                .values(field).annotate(completed=Count('id')))
+        for row in rows:
+            user_stats = stats.setdefault(row[field], UserTaskStats(user_id=row[field]))
+            setattr(user_stats, f'{role}_completed', getattr(user_stats, f'{role}_completed') + row['completed'])
+    return list(stats.values())
+
+
+# Moves the overdue mark forward, adding the open tasks that were due in between to the
+# overdue counters. The range is scanned through the (status, due_date) index
+def advance_overdue_mark(until):
+    with transaction.atomic():
+        mark = Watermark.objects.select_for_update().filter(name=OVERDUE_WATERMARK).first()
+        if mark is not None and mark.value >= until:
+            return
+        tasks = Task.objects.filter(status__in=(Task.OPEN, Task.IN_PROGRESS), due_date__lt=until)
+        if mark is not None:
+            tasks = tasks.filter(due_date__gte=mark.value)
+        deltas = Counter()
+        for role, field in (('created', 'author'), ('assigned', 'completer')):
+            rows = (tasks.filter(**{f'{field}__isnull': False}).order_by()
+                    .values(field).annotate(count=Count('id')))
+            for row in rows:
+                deltas[row[field], f'{role}_overdue'] += row['count']
+        apply_deltas(deltas)
+        Watermark.set_value(OVERDUE_WATERMARK, until)
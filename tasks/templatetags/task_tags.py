@@ -0,0 +1,32 @@
+from django import template
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+from ..fragments import render_card
+from ..search import HIGHLIGHT_START, HIGHLIGHT_STOP
+
+register = template.Library()
+
+
+# Returns the current querystring with some parameters replaced, so that pagination
+# links keep the active filters: {% query_replace page=2 %} -> ?date_field_min=...&page=2
+@register.simple_tag(takes_context=True)
+def query_replace(context, **kwargs):
+    query = context['request'].GET.copy()
+    for key in ('page', 'cursor'):
+        query.pop(key, None)
+    for key, value in kwargs.items():
+        query[key] = value
+    return '?' + query.urlencode()
+
+
+# Renders a task card template through the per-task fragment cache
+@register.simple_tag
+def task_card(task, template_name):
+    return mark_safe(render_card(template_name, task))
+
+
+# Turns a search headline into HTML: the snippet is escaped, then its match markers become <mark>
+@register.filter
+def highlight(headline):
+    html = conditional_escape(headline)
+    return mark_safe(html.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>'))
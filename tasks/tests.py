@@ -1,3 +1,1539 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache, caches
+from django.core.management import call_command, CommandError
+from django.core.paginator import EmptyPage
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Sum
+from django.db.models.signals import post_delete
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+from asgiref.sync import async_to_sync
+from . import api, urls as tasks_urls
+from .archive import archive_batch, archive_boundary
+from .claims import claim_task
+from .events import CHANGES_LIMIT, EVENT_LAG, hub, stream_events, task_changes
+from .models import ArchivedTask, Task, TaskConflict, TaskEvent, TaskNotification, UserTaskStats, Watermark
+from .fragments import card_cache, card_stats
+from .management.commands.explain_task_queries import Command as ExplainCommand
+from .pagecache import page_cache, purge_pages
+from .pagination import CachedCountPaginator
+from .scheduler import DUE_SOON_MARK, OVERDUE_MARK, run_once
+from .search import HIGHLIGHT_START, HIGHLIGHT_STOP
+from .signals import tasks_updated
+from .templatetags.task_tags import highlight
+from .views import TaskListView
+from django_project import urls as project_urls
+from django_project.metrics import DB_QUERIES, HISTOGRAMS
+from users.models import Profile, User
 
-# Create your tests here.
+
+def make_user(username, role=User.CREATOR):
+    return User.objects.create_user(username=username, password='testpass123', role=role)
+
+
+# The counts, cards, sessions and anonymous pages of the other tests
+def clear_caches():
+    for alias_cache in caches.all():
+        alias_cache.clear()
+
+
+# These tests pin the number of queries per page, so that N+1 regressions fail the suite
+class TaskQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creators = [make_user(f'creator{i}') for i in range(3)]
+        cls.completer = make_user('completer', role=User.COMPLETER)
+        for i in range(10):
+            author = cls.creators[i % 3]
+            Task.objects.create(title=f'open {i}', content='content', author=author,
+                                completer=cls.completer if i % 2 else None)
+            Task.objects.create(title=f'done {i}', content='content', author=author,
+                                completer=cls.completer, status=Task.COMPLETED,
+                                date_completed=timezone.now(), completion_comment='ok')
+
+    def setUp(self):
+        clear_caches()
+
+    def test_open_tasks_page(self):
+        # 1. count for the paginator, 2. the page of tasks
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('tasks-home'))
+        self.assertEqual(len(response.context['tasks']), 5)
+
+    def test_open_tasks_page_with_filter(self):
+        Task.objects.filter(title__in=['open 0', 'open 1', 'open 2']).update(
+            date_posted=datetime(2001, 1, 1, tzinfo=dt_timezone.utc))
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('tasks-home'), {'date_field_min': '2010-01-01', 'page': 2})
+        self.assertEqual(response.context['paginator'].count, 7)
+        self.assertEqual(len(response.context['tasks']), 2)
+
+    def test_completed_tasks_page(self):
+        # the unfiltered list reaches into the archive: its count is one more query
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('tasks-completed'))
+        self.assertEqual(len(response.context['tasks']), 5)
+
+    def test_user_tasks_page(self):
+        # 1. the user, 2. count for the paginator, 3. the page of tasks
+        with self.assertNumQueries(3):
+            self.client.get(reverse('user-tasks', args=[self.creators[0].username]))
+
+    def test_task_detail_page(self):
+        task = Task.objects.filter(completer__isnull=False).first()
+        # 1. the author for the page cache groups (anonymous misses only), 2. the task with
+        # its author and completer, 3. a page of its history
+        with self.assertNumQueries(3):
+            self.client.get(reverse('task-detail', args=[task.pk]))
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        for i in range(20):
+            Task.objects.create(title=f'extra {i}', content='content', author=self.creators[0],
+                                completer=self.completer)
+        with self.assertNumQueries(2):
+            self.client.get(reverse('tasks-home'), {'page': 3})
+
+
+class ExplainTaskQueriesCommandTests(TestCase):
+    def test_every_list_view_uses_an_index(self):
+        out = StringIO()
+        call_command('explain_task_queries', seed=200, batch_size=100, stdout=out, stderr=StringIO())
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 7)
+        for line in lines:
+            self.assertIn('index used', line)
+            self.assertNotIn('NO index', line)
+
+    def test_filtered_checks_filter(self):
+        author = make_user('author')
+        Task.objects.create(title='old', content='content', author=author,
+                            date_posted=timezone.now() - timedelta(days=60))
+        Task.objects.create(title='new', content='content', author=author)
+        view = TaskListView()
+        view.setup(RequestFactory().get('/', ExplainCommand().month_ago_filter()))
+        titles = [task.title for task in view.get_queryset()]
+        self.assertEqual(titles, ['new'])
+
+
+@override_settings(TASK_CURSOR_PAGINATION=True)
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.posted = timezone.now() - timedelta(days=30)
+        # pairs of tasks share a date_posted, so the id tiebreak matters
+        cls.tasks = [Task.objects.create(title=f'task {i}', content='content', author=cls.author,
+                                         date_posted=cls.posted + timedelta(days=i // 2))
+                     for i in range(12)]
+
+    def setUp(self):
+        clear_caches()
+
+    def walk(self, params=None, url='tasks-home'):
+        params = dict(params or {})
+        titles = []
+        cursors = []
+        while True:
+            response = self.client.get(reverse(url), params)
+            page = response.context['page_obj']
+            titles += [task.title for task in page]
+            cursors.append(params.get('cursor'))
+            if not page.has_next():
+                return titles, page, cursors
+            params['cursor'] = page.next_cursor
+
+    def test_walks_every_task_once_in_order(self):
+        titles, _, _ = self.walk()
+        expected = [task.title for task in Task.objects.open()]
+        self.assertEqual(titles, expected)
+        self.assertEqual(len(titles), 12)
+
+    def test_previous_cursor_returns_the_previous_page(self):
+        first = self.client.get(reverse('tasks-home')).context['page_obj']
+        second = self.client.get(reverse('tasks-home'), {'cursor': first.next_cursor}).context['page_obj']
+        back = self.client.get(reverse('tasks-home'), {'cursor': second.previous_cursor}).context['page_obj']
+        self.assertEqual(list(back), list(first))
+        self.assertTrue(back.has_next())
+
+    def test_works_with_the_date_filter(self):
+        after = (self.posted + timedelta(days=3)).date().isoformat()
+        titles, _, _ = self.walk({'date_field_min': after})
+        self.assertEqual(titles, [f'task {i}' for i in range(11, 5, -1)])
+
+    def test_never_counts(self):
+        response = self.client.get(reverse('tasks-home'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('tasks-home'), {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT', queries[0]['sql'])
+
+    def test_links_keep_the_filters(self):
+        response = self.client.get(reverse('tasks-home'), {'date_field_min': '2000-01-01'})
+        self.assertContains(response, '?date_field_min=2000-01-01&amp;cursor=')
+
+    # Completed tasks without a date_completed sort where the database puts NULLs
+    def test_walks_through_null_ordering_values(self):
+        for i, task in enumerate(self.tasks):
+            task.status = Task.COMPLETED
+            task.date_completed = None if i % 3 else self.posted + timedelta(days=i)
+            task.save()
+        expected = [task.title for task in Task.objects.completed()]
+        titles, page, _ = self.walk(url='tasks-completed')
+        self.assertEqual(titles, expected)
+
+        back = []
+        while page.has_previous():
+            page = self.client.get(reverse('tasks-completed'),
+                                   {'cursor': page.previous_cursor}).context['page_obj']
+            back = [task.title for task in page] + back
+        self.assertEqual(back, expected[:len(back)])
+        self.assertEqual(len(back), 10)
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ('garbage', 'WyJuZXh0IiwgWyJub3QgYSBkYXRlIiwgMV1d'):
+            response = self.client.get(reverse('tasks-home'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+# The anonymous pages would hide the counts
+@override_settings(TASK_PAGE_CACHE_TIMEOUT=None)
+class CachedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        for i in range(7):
+            Task.objects.create(title=f'task {i}', content='content', author=cls.author)
+
+    def setUp(self):
+        clear_caches()
+
+    def test_count_is_cached_per_filter_combination(self):
+        self.client.get(reverse('tasks-home'))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('tasks-home'), {'page': 2})
+        self.assertEqual(response.context['paginator'].count, 7)
+        # a different filter is a different count
+        with self.assertNumQueries(2):
+            self.client.get(reverse('tasks-home'), {'date_field_min': '2000-01-01'})
+
+    def test_count_is_invalidated_by_task_changes(self):
+        self.client.get(reverse('tasks-home'))
+        task = Task.objects.create(title='new', content='content', author=self.author)
+        self.assertEqual(self.client.get(reverse('tasks-home')).context['paginator'].count, 8)
+        task.status = Task.COMPLETED
+        task.date_completed = timezone.now()
+        task.save()
+        self.assertEqual(self.client.get(reverse('tasks-home')).context['paginator'].count, 7)
+        Task.objects.filter(status=Task.OPEN).first().delete()
+        self.assertEqual(self.client.get(reverse('tasks-home')).context['paginator'].count, 6)
+
+    def test_estimate_above_threshold(self):
+        paginator = CachedCountPaginator(Task.objects.open(), 5)
+        with mock.patch('tasks.pagination.connections') as connections, \
+                mock.patch.object(CachedCountPaginator, 'estimate_count', return_value=500):
+            connections.__getitem__.return_value.vendor = 'postgresql'
+            with override_settings(TASK_COUNT_ESTIMATE_THRESHOLD=100):
+                self.assertEqual(paginator.count, 500)
+        self.assertTrue(paginator.approximate)
+        # the real last page is past the estimate, but it's still reachable
+        self.assertEqual(paginator.validate_number(200), 200)
+
+    def test_pages_past_a_low_estimate(self):
+        paginator = CachedCountPaginator(Task.objects.open().order_by('id'), 3)
+        with mock.patch('tasks.pagination.connections') as connections, \
+                mock.patch.object(CachedCountPaginator, 'estimate_count', return_value=2):
+            connections.__getitem__.return_value.vendor = 'postgresql'
+            with override_settings(TASK_COUNT_ESTIMATE_THRESHOLD=1):
+                self.assertEqual(paginator.count, 2)
+        pages = [paginator.page(number) for number in (1, 2, 3)]
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([page.has_next() for page in pages], [True, True, False])
+        self.assertEqual(pages[2].end_index(), 7)
+        with self.assertRaises(EmptyPage):
+            paginator.page(4)
+
+    def test_exact_count_below_threshold(self):
+        paginator = CachedCountPaginator(Task.objects.open(), 5)
+        with mock.patch('tasks.pagination.connections') as connections, \
+                mock.patch.object(CachedCountPaginator, 'estimate_count', return_value=50):
+            connections.__getitem__.return_value.vendor = 'postgresql'
+            with override_settings(TASK_COUNT_ESTIMATE_THRESHOLD=100):
+                self.assertEqual(paginator.count, 7)
+        self.assertFalse(paginator.approximate)
+
+
+# The anonymous pages would hide the cards
+@override_settings(TASK_PAGE_CACHE_TIMEOUT=None)
+class TaskCardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.task = Task.objects.create(title='cached title', content='content', author=cls.author)
+
+    def setUp(self):
+        clear_caches()
+        card_cache().clear()
+        card_stats.reset()
+
+    def test_second_render_is_a_hit(self):
+        self.client.get(reverse('tasks-home'))
+        self.assertEqual(card_stats.snapshot(), {'hits': 0, 'misses': 1})
+        response = self.client.get(reverse('tasks-home'))
+        self.assertEqual(card_stats.snapshot(), {'hits': 1, 'misses': 1})
+        self.assertContains(response, 'cached title')
+
+    def test_each_page_has_its_own_card(self):
+        self.client.get(reverse('tasks-home'))
+        self.client.get(reverse('user-tasks', args=['author']))
+        self.assertEqual(card_stats.snapshot(), {'hits': 0, 'misses': 2})
+
+    def test_task_save_invalidates_the_card(self):
+        self.client.get(reverse('tasks-home'))
+        self.task.title = 'new title'
+        self.task.save()
+        response = self.client.get(reverse('tasks-home'))
+        self.assertContains(response, 'new title')
+        self.assertEqual(card_stats.snapshot(), {'hits': 0, 'misses': 2})
+
+    def test_update_without_signals_is_caught_by_the_version(self):
+        self.client.get(reverse('tasks-home'))
+        Task.objects.filter(pk=self.task.pk).update(title='sneaky title', updated=timezone.now())
+        self.assertContains(self.client.get(reverse('tasks-home')), 'sneaky title')
+
+    def test_profile_save_invalidates_the_authors_cards(self):
+        self.client.get(reverse('tasks-home'))
+        self.author.username = 'renamed'
+        self.author.save()
+        self.author.profile.save()
+        response = self.client.get(reverse('tasks-home'))
+        self.assertContains(response, 'renamed')
+        self.assertEqual(card_stats.snapshot()['hits'], 0)
+
+    # Nothing deletes the cards of the completer's tasks, their version has the profile
+    def test_completer_rename_changes_the_card_version(self):
+        completer = make_user('completer', role=User.COMPLETER)
+        Task.objects.filter(pk=self.task.pk).update(completer=completer)
+        self.client.get(reverse('tasks-home'))
+        completer.username = 'renamed'
+        completer.save()
+        response = self.client.get(reverse('tasks-home'))
+        self.assertContains(response, 'renamed')
+        self.assertEqual(card_stats.snapshot(), {'hits': 0, 'misses': 2})
+
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.task = Task.objects.create(title='first title', content='content', author=cls.author)
+        cls.other = Task.objects.create(title='other title', content='content', author=make_user('other'))
+
+    def setUp(self):
+        clear_caches()
+
+    def test_second_anonymous_visit_is_a_hit_without_queries(self):
+        self.assertEqual(self.client.get(reverse('tasks-home'))['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('tasks-home'))
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'first title')
+
+    def test_query_string_is_normalized(self):
+        self.client.get(reverse('tasks-home') + '?q=title&date_field_after=')
+        response = self.client.get(reverse('tasks-home') + '?date_field_after=&q=title')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        response = self.client.get(reverse('tasks-home') + '?q=other')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self.client.get(reverse('tasks-home'))
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('tasks-home'))
+        self.assertNotIn('X-Page-Cache', response)
+
+    def test_task_save_purges_its_pages_only(self):
+        for url in (reverse('tasks-home'), reverse('task-detail', args=[self.task.pk]),
+                    reverse('task-detail', args=[self.other.pk]), reverse('user-tasks', args=['other'])):
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.title = 'new title'
+            self.task.save()
+        response = self.client.get(reverse('tasks-home'))
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'new title')
+        self.assertContains(self.client.get(reverse('task-detail', args=[self.task.pk])), 'new title')
+        self.assertEqual(self.client.get(reverse('task-detail', args=[self.other.pk]))['X-Page-Cache'], 'hit')
+        self.assertEqual(self.client.get(reverse('user-tasks', args=['other']))['X-Page-Cache'], 'hit')
+
+    # A request in between would store the old rows under the new generation
+    def test_pages_are_purged_on_commit(self):
+        self.client.get(reverse('tasks-home'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.title = 'new title'
+            self.task.save()
+            self.assertEqual(self.client.get(reverse('tasks-home'))['X-Page-Cache'], 'hit')
+        self.assertEqual(self.client.get(reverse('tasks-home'))['X-Page-Cache'], 'miss')
+
+    # The user pages show the Assigned counts of the completers
+    def test_assignment_purges_the_completers_pages(self):
+        comp = make_user('comp', role=User.COMPLETER)
+        for username in ('comp', 'other'):
+            self.client.get(reverse('user-tasks', args=[username]))
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(title='assigned', content='content', author=self.author, completer=comp)
+        response = self.client.get(reverse('user-tasks', args=['comp']))
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertEqual(response.context['task_stats'].assigned_open, 1)
+
+        # reassigned on a task loaded without its users: both completers' pages go
+        self.client.get(reverse('user-tasks', args=['comp']))
+        task = Task.objects.select_related('author').get(pk=task.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            task.completer = self.other.author
+            task.save()
+        response = self.client.get(reverse('user-tasks', args=['comp']))
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertEqual(response.context['task_stats'].assigned_open, 0)
+        self.assertEqual(self.client.get(reverse('user-tasks', args=['other']))['X-Page-Cache'], 'miss')
+
+    def test_set_based_update_purges_the_pages(self):
+        self.client.get(reverse('task-detail', args=[self.task.pk]))
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.filter(pk=self.task.pk).update(title='bulk title')
+            tasks_updated.send(sender=Task, task_ids=[self.task.pk])
+        self.assertContains(self.client.get(reverse('task-detail', args=[self.task.pk])), 'bulk title')
+
+    def test_username_change_purges_the_old_user_page(self):
+        self.assertEqual(self.client.get(reverse('user-tasks', args=['author'])).status_code, 200)
+        self.client.get(reverse('task-detail', args=[self.task.pk]))
+        self.client.get(reverse('task-detail', args=[self.other.pk]))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.username = 'renamed'
+            self.author.save()
+        self.assertEqual(self.client.get(reverse('user-tasks', args=['author'])).status_code, 404)
+        self.assertContains(self.client.get(reverse('task-detail', args=[self.task.pk])), 'renamed')
+        # the detail pages of the other users' tasks stay
+        self.assertEqual(self.client.get(reverse('task-detail', args=[self.other.pk]))['X-Page-Cache'], 'hit')
+
+    @override_settings(TASK_PAGE_CACHE_STALE_SECONDS=30)
+    def test_stale_page_is_served_while_one_request_renders(self):
+        url = reverse('tasks-home')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            purge_pages(['open'])
+        # another request holds the lock: the stale page is served
+        with mock.patch.object(page_cache(), 'add', return_value=False):
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'stale')
+        # this one gets the lock, renders and releases it
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'hit')
+        # and the lock was released
+        with self.captureOnCommitCallbacks(execute=True):
+            purge_pages(['open'])
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss')
+
+
+class TaskAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.completer = make_user('completer', role=User.COMPLETER)
+        cls.posted = timezone.now() - timedelta(days=10)
+        for i in range(25):
+            Task.objects.create(title=f'task {i}', content='content', author=cls.author,
+                                completer=cls.completer if i % 2 else None,
+                                date_posted=cls.posted + timedelta(days=i % 5))
+
+    def setUp(self):
+        clear_caches()
+
+    def test_open_list(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('api-tasks'))
+        data = response.json()
+        self.assertEqual(data['count'], 25)
+        self.assertEqual(data['num_pages'], 2)
+        self.assertEqual(len(data['results']), 20)
+        self.assertIn('page=2', data['next'])
+        row = data['results'][0]
+        self.assertEqual(row['author_username'], 'author')
+        self.assertIn(row['completer_username'], ('completer', None))
+        self.assertEqual(set(row), {'id', 'title', 'content', 'status', 'date_posted', 'due_date',
+                                    'date_completed', 'completion_comment', 'updated',
+                                    'author_username', 'completer_username'})
+
+    def test_reuses_the_list_filters(self):
+        after = (self.posted + timedelta(days=3)).date().isoformat()
+        data = self.client.get(reverse('api-tasks'), {'date_field_min': after}).json()
+        self.assertEqual(data['count'], 10)
+        response = self.client.get(reverse('api-tasks'), {'date_field_min': 'not a date'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_conditional_get(self):
+        response = self.client.get(reverse('api-tasks'))
+        etag = response['ETag']
+        # the version is cached with the counts
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('api-tasks'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.get(reverse('api-tasks'),
+                                   HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        Task.objects.create(title='new', content='content', author=self.author)
+        response = self.client.get(reverse('api-tasks'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_renaming_a_user_is_a_modification(self):
+        task = Task.objects.first()
+        for url in (reverse('api-tasks'), reverse('api-task-detail', args=[task.pk])):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.completer.username = f'renamed {url}'
+                self.completer.save()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_deleting_the_newest_task_is_a_modification(self):
+        response = self.client.get(reverse('api-tasks'))
+        Task.objects.order_by('-updated').first().delete()
+        response = self.client.get(reverse('api-tasks'), HTTP_IF_NONE_MATCH=response['ETag'],
+                                   HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 24)
+
+    def test_detail_and_user_tasks(self):
+        task = Task.objects.first()
+        response = self.client.get(reverse('api-task-detail', args=[task.pk]))
+        self.assertEqual(response.json()['title'], task.title)
+        self.assertEqual(self.client.get(reverse('api-task-detail', args=[0])).status_code, 404)
+
+        data = self.client.get(reverse('api-user-tasks', args=['author'])).json()
+        self.assertEqual(data['count'], 25)
+        self.assertEqual(self.client.get(reverse('api-user-tasks', args=['nobody'])).status_code, 404)
+
+    def test_completed_list(self):
+        Task.objects.filter(title='task 0').update(status=Task.COMPLETED, date_completed=timezone.now())
+        data = self.client.get(reverse('api-tasks-completed')).json()
+        self.assertEqual([row['title'] for row in data['results']], ['task 0'])
+
+    def test_read_only(self):
+        self.assertEqual(self.client.post(reverse('api-tasks')).status_code, 405)
+
+    def async_get(self, view_class, path, headers=None, **kwargs):
+        request = AsyncRequestFactory().get(path, headers=headers)
+        return async_to_sync(view_class.as_view())(request, **kwargs)
+
+    def test_async_views_match_the_sync_views(self):
+        task = Task.objects.first()
+        cases = [
+            (api.AsyncOpenTaskListAPIView, reverse('api-tasks') + '?page=2', {}),
+            (api.AsyncCompletedTaskListAPIView, reverse('api-tasks-completed'), {}),
+            (api.AsyncTaskDetailAPIView, reverse('api-task-detail', args=[task.pk]), {'pk': task.pk}),
+            (api.AsyncUserTaskListAPIView, reverse('api-user-tasks', args=['author']), {'username': 'author'}),
+        ]
+        for view_class, path, kwargs in cases:
+            with self.subTest(path=path):
+                expected = self.client.get(path)
+                response = self.async_get(view_class, path, **kwargs)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(json.loads(response.content), expected.json())
+                self.assertEqual(response['ETag'], expected['ETag'])
+
+    def reload_urls(self):
+        importlib.reload(tasks_urls)
+        importlib.reload(project_urls)
+        clear_url_caches()
+
+    # The urls pick the views on import, with TASK_ASYNC_API they are the async ones
+    async def test_async_api_urls(self):
+        self.addCleanup(self.reload_urls)
+        with override_settings(TASK_ASYNC_API=True):
+            self.reload_urls()
+            self.assertIs(resolve(reverse('api-tasks')).func.view_class, api.AsyncOpenTaskListAPIView)
+            self.assertIs(resolve(reverse('api-user-tasks', args=['author'])).func.view_class,
+                          api.AsyncUserTaskListAPIView)
+            response = await self.async_client.get(reverse('api-tasks'))
+            self.assertEqual(response.json()['count'], 25)
+            response = await self.async_client.get(reverse('api-tasks'), headers={'If-None-Match': response['ETag']})
+            self.assertEqual(response.status_code, 304)
+            response = await self.async_client.get(reverse('api-user-tasks', args=['nobody']))
+            self.assertEqual(response.status_code, 404)
+        self.reload_urls()
+        self.assertIs(resolve(reverse('api-tasks')).func.view_class, api.OpenTaskListAPIView)
+
+    def test_async_views_errors_and_conditional_get(self):
+        path = reverse('api-tasks')
+        self.assertEqual(self.async_get(api.AsyncTaskDetailAPIView, '/api/tasks/0/', pk=0).status_code, 404)
+        response = self.async_get(api.AsyncUserTaskListAPIView, '/api/users/nobody/tasks/', username='nobody')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.async_get(api.AsyncOpenTaskListAPIView, path + '?page=x').status_code, 400)
+        with self.assertNumQueries(2):
+            etag = self.async_get(api.AsyncOpenTaskListAPIView, path)['ETag']
+        with self.assertNumQueries(0):
+            response = self.async_get(api.AsyncOpenTaskListAPIView, path, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+
+class TaskTransferCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.completer = make_user('completer', role=User.COMPLETER)
+        for i in range(7):
+            Task.objects.create(title=f'task {i}', content=f'line one\nline "two", {i}', author=cls.author,
+                                completer=cls.completer if i % 2 else None,
+                                status=Task.COMPLETED if i % 3 == 0 else Task.OPEN,
+                                date_completed=timezone.now() if i % 3 == 0 else None,
+                                completion_comment='done' if i % 3 == 0 else None)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def snapshot(self):
+        return list(Task.objects.order_by('title').values_list(
+            'title', 'content', 'status', 'date_posted', 'due_date', 'author__username',
+            'completer__username', 'date_completed', 'completion_comment'))
+
+    def round_trip(self, filename):
+        path = os.path.join(self.directory, filename)
+        before = self.snapshot()
+        call_command('export_tasks', path, chunk_size=3, stderr=StringIO())
+        Task.objects.all().delete()
+        # per batch of 3: one user lookup, one insert
+        with CaptureQueriesContext(connection) as queries:
+            call_command('import_tasks', path, batch_size=3, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(len([q for q in queries if 'users_user' in q['sql']]), 3)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('INSERT INTO "tasks_task"')]), 3)
+        self.assertEqual(self.snapshot(), before)
+
+    def test_csv_round_trip(self):
+        self.round_trip('tasks.csv')
+
+    def test_jsonl_round_trip(self):
+        self.round_trip('tasks.jsonl')
+
+    def test_unknown_users_are_skipped(self):
+        path = os.path.join(self.directory, 'tasks.jsonl')
+        with open(path, 'w') as f:
+            f.write(json.dumps({'title': 'a', 'content': 'x', 'author': 'author'}) + '\n')
+            f.write(json.dumps({'title': 'b', 'content': 'x', 'author': 'ghost'}) + '\n')
+            f.write(json.dumps({'title': 'c', 'content': 'x', 'author': 'author', 'completer': 'ghost'}) + '\n')
+        out = StringIO()
+        call_command('import_tasks', path, stdout=out, stderr=StringIO())
+        self.assertIn('Imported 1 tasks, skipped 2', out.getvalue())
+        self.assertTrue(Task.objects.filter(title='a', status=Task.OPEN).exists())
+
+    def test_import_purges_the_cached_pages(self):
+        clear_caches()
+        self.assertEqual(self.client.get(reverse('tasks-home'))['X-Page-Cache'], 'miss')
+        path = os.path.join(self.directory, 'tasks.jsonl')
+        with open(path, 'w') as f:
+            f.write(json.dumps({'title': 'imported', 'content': 'x', 'author': 'author'}) + '\n')
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_tasks', path, stdout=StringIO(), stderr=StringIO())
+        response = self.client.get(reverse('tasks-home'))
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'imported')
+        self.assertEqual(response.context['paginator'].count, 5)
+
+    def test_invalid_rows_fail_with_their_line(self):
+        path = os.path.join(self.directory, 'tasks.jsonl')
+        valid = json.dumps({'title': 'a', 'content': 'x', 'author': 'author'}) + '\n'
+        cases = [
+            (json.dumps({'title': 'a', 'content': 'x', 'author': 'author', 'due_date': 'soon'}), 'Line 5: due_date'),
+            ('[1, 2]', 'Line 5: not an object'),
+            ('3', 'Line 5: not an object'),
+            (json.dumps({'content': 'x', 'author': 'author'}), 'Line 5: title: missing'),
+            (json.dumps({'title': 'a', 'author': 'author', 'status': 'done'}), 'Line 5: status'),
+            (json.dumps({'title': 'a', 'author': 'author', 'status': 9}), 'Line 5: status: invalid value 9'),
+            ('{not json', 'Line 5: invalid JSON'),
+        ]
+        for line, message in cases:
+            with self.subTest(line=line):
+                with open(path, 'w') as f:
+                    f.write(valid * 3 + '\n' + line + '\n')
+                with self.assertRaisesMessage(CommandError, message):
+                    call_command('import_tasks', path, batch_size=2, stdout=StringIO(), stderr=StringIO())
+                # the batch before the invalid row is rolled back too
+                self.assertEqual(Task.objects.count(), 7)
+
+        path = os.path.join(self.directory, 'tasks.csv')
+        with open(path, 'w') as f:
+            f.write('title,content,author\na,x,author\nb,x,\n')
+        with self.assertRaisesMessage(CommandError, 'Line 3: author: missing'):
+            call_command('import_tasks', path, stdout=StringIO(), stderr=StringIO())
+
+
+class TaskEventsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.completer = make_user('completer', role=User.COMPLETER)
+
+    def setUp(self):
+        clear_caches()
+        card_cache().clear()
+        self.since = timezone.now()
+
+    def events(self, body):
+        return [json.loads(line[len('data: '):]) for line in body.splitlines() if line.startswith('data: ')]
+
+    def test_polling_fallback_sends_the_changes_since_the_mark(self):
+        created = Task.objects.create(title='fresh task', content='content', author=self.author)
+        done = Task.objects.create(title='done', content='content', author=self.author,
+                                   date_posted=self.since - timedelta(days=1))
+        done.status = Task.COMPLETED
+        done.save()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('task-events'), {'since': self.since.isoformat()})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = response.content.decode()
+        self.assertIn('retry: 2000', body)
+        events = self.events(body)
+        self.assertEqual([(event['id'], event['kind']) for event in events],
+                         [(created.pk, 'created'), (done.pk, 'completed')])
+        self.assertIn('fresh task', events[0]['html'])
+        self.assertIsNone(events[1]['html'])
+
+        # the browser comes back with the last id, rows older than the lag aren't sent again
+        Task.objects.filter(pk__in=[created.pk, done.pk]).update(updated=self.since - EVENT_LAG * 2)
+        response = self.client.get(reverse('task-events'), HTTP_LAST_EVENT_ID=self.since.isoformat())
+        self.assertEqual(self.events(response.content.decode()), [])
+
+    def test_assignment_and_scan_bookkeeping(self):
+        task = Task.objects.create(title='task', content='content', author=self.author,
+                                   date_posted=self.since - timedelta(days=1))
+        task.save()
+        seen = {}
+        events, mark, after = task_changes(self.since, seen)
+        self.assertEqual([event['kind'] for event in events], ['updated'])
+        self.assertEqual(mark, task.updated)
+        self.assertIsNone(after)
+        # scanned again within the lag, but nothing changed
+        self.assertEqual(task_changes(mark, seen)[0], [])
+
+        task.completer = self.completer
+        task.save()
+        events, mark, after = task_changes(mark, seen)
+        self.assertEqual([event['kind'] for event in events], ['assigned'])
+
+    # The mark can pass date_posted before the creating transaction commits
+    def test_task_committed_late_is_still_created(self):
+        task = Task.objects.create(title='late', content='content', author=self.author,
+                                   date_posted=self.since - timedelta(seconds=3))
+        events = task_changes(self.since)[0]
+        self.assertEqual([(event['id'], event['kind']) for event in events], [(task.pk, 'created')])
+
+    # A bulk update gives more than a page of rows the same `updated`
+    def test_scan_pages_through_rows_with_the_same_updated(self):
+        Task.objects.bulk_create([Task(title=f'bulk {i}', content='content', author=self.author,
+                                       date_posted=self.since - timedelta(days=1))
+                                  for i in range(CHANGES_LIMIT + 20)])
+        Task.objects.update(updated=self.since + timedelta(seconds=1))
+        seen = {}
+        events, mark, after = task_changes(self.since, seen)
+        self.assertEqual(len(events), CHANGES_LIMIT + 20)
+        self.assertIsNone(after)
+        self.assertEqual(task_changes(mark, seen)[0], [])
+
+        later = Task.objects.create(title='later', content='content', author=self.author)
+        events, mark, after = task_changes(mark, seen)
+        self.assertEqual([event['id'] for event in events], [later.pk])
+        self.assertEqual(len(task_changes(self.since)[0]), CHANGES_LIMIT + 21)
+
+    # A scan stops after MAX_SCAN_PAGES, the next one carries on after its last row
+    @mock.patch('tasks.events.MAX_SCAN_PAGES', 2)
+    def test_scan_is_capped_and_carries_on(self):
+        Task.objects.bulk_create([Task(title=f'bulk {i}', content='content', author=self.author)
+                                  for i in range(CHANGES_LIMIT * 2 + 30)])
+        Task.objects.update(updated=self.since - timedelta(seconds=1))
+        seen = {}
+        with self.assertNumQueries(2):
+            events, mark, after = task_changes(self.since, seen)
+        self.assertEqual(len(events), CHANGES_LIMIT * 2)
+        self.assertEqual(after, (self.since - timedelta(seconds=1), events[-1]['id']))
+        rest, mark, after = task_changes(mark, seen, after)
+        self.assertEqual(len(rest), 30)
+        self.assertIsNone(after)
+        self.assertEqual(len({event['id'] for event in events + rest}), CHANGES_LIMIT * 2 + 30)
+
+        # the polling fallback hands the browser the row to carry on from
+        response = self.client.get(reverse('task-events'), {'since': self.since.isoformat()})
+        event_id = response.content.decode().rsplit('id: ', 1)[1].strip()
+        self.assertEqual(event_id, f"{(self.since - timedelta(seconds=1)).isoformat()}/{events[-1]['id']}")
+        response = self.client.get(reverse('task-events'), HTTP_LAST_EVENT_ID=event_id)
+        self.assertEqual([event['id'] for event in self.events(response.content.decode())],
+                         [event['id'] for event in rest])
+
+    def test_stream_catches_up_then_closes(self):
+        Task.objects.create(title='streamed', content='content', author=self.author)
+
+        async def read():
+            return [chunk async for chunk in stream_events(self.since)]
+
+        with mock.patch.object(hub, 'subscribe', side_effect=asyncio.Queue), \
+                mock.patch.object(hub, 'unsubscribe') as unsubscribe, \
+                override_settings(TASK_EVENTS_STREAM_SECONDS=0):
+            chunks = async_to_sync(read)()
+        self.assertEqual(chunks[0], 'retry: 2000\n\n')
+        self.assertEqual([event['kind'] for event in self.events(''.join(chunks))], ['created'])
+        unsubscribe.assert_called_once()
+
+    def test_home_page_is_wired_to_the_stream(self):
+        task = Task.objects.create(title='task', content='content', author=self.author)
+        response = self.client.get(reverse('tasks-home'))
+        self.assertContains(response, f'data-task-id="{task.pk}"')
+        self.assertContains(response, 'data-live-inserts="true"')
+        self.assertContains(response, reverse('task-events'))
+        self.assertContains(response, 'tasks/live_tasks.js')
+        response = self.client.get(reverse('tasks-home'), {'page': 1})
+        self.assertContains(response, 'data-live-inserts="false"')
+
+
+class TaskBulkActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.other_author = make_user('other_author')
+        cls.completer = make_user('completer', role=User.COMPLETER)
+        cls.other_completer = make_user('other_completer', role=User.COMPLETER)
+        cls.free = [Task.objects.create(title=f'free {i}', content='c', author=cls.author) for i in range(5)]
+        cls.mine = Task.objects.create(title='mine', content='c', author=cls.author, completer=cls.completer)
+        cls.theirs = Task.objects.create(title='theirs', content='c', author=cls.author,
+                                         completer=cls.other_completer)
+        cls.done = Task.objects.create(title='done', content='c', author=cls.other_author,
+                                       status=Task.COMPLETED, date_completed=timezone.now())
+
+    def setUp(self):
+        clear_caches()
+
+    def post(self, action, tasks, **data):
+        return self.client.post(reverse('task-bulk'), {'action': action, 'ids': [t.pk for t in tasks], **data},
+                                HTTP_ACCEPT='application/json')
+
+    def test_complete_applies_the_completion_rules(self):
+        self.client.force_login(self.completer)
+        requested = self.free + [self.mine, self.theirs, self.done]
+        # user (the session is cached), savepoint, select for update, update, savepoint release,
+        # and the statistics: overdue mark, row creation, one update per user
+        with self.assertNumQueries(9):
+            response = self.post('complete', requested, completion_comment='all done')
+        data = response.json()
+        allowed = self.free + [self.mine]
+        self.assertEqual(data['updated'], sorted(t.pk for t in allowed))
+        self.assertEqual(data['rejected'], sorted([self.theirs.pk, self.done.pk]))
+        for task in Task.objects.filter(pk__in=data['updated']):
+            self.assertEqual(task.status, Task.COMPLETED)
+            self.assertEqual(task.completer, self.completer)
+            self.assertEqual(task.completion_comment, 'all done')
+            self.assertIsNotNone(task.date_completed)
+        # the rules agree with the single-task view
+        for task in Task.objects.all():
+            self.assertEqual(task.can_be_completed_by(self.completer),
+                             Task.objects.completable_by(self.completer).filter(pk=task.pk).exists())
+
+    def test_creators_cannot_complete(self):
+        self.client.force_login(self.author)
+        data = self.post('complete', self.free).json()
+        self.assertEqual(data['updated'], [])
+        self.assertEqual(Task.objects.filter(status=Task.COMPLETED).count(), 1)
+
+    def test_assign_and_delete_need_the_author(self):
+        self.client.force_login(self.author)
+        data = self.post('assign', self.free + [self.done], completer=self.completer.pk).json()
+        self.assertEqual(data['rejected'], [self.done.pk])
+        self.assertEqual(Task.objects.filter(completer=self.completer).count(), 6)
+        # the completer is checked before any task row is locked
+        with self.assertNumQueries(1):
+            response = self.post('assign', self.free, completer=self.author.pk)
+        self.assertEqual(response.status_code, 400)
+        response = self.post('assign', self.free, completer='abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Unknown completer'})
+
+        data = self.post('delete', self.free + [self.done]).json()
+        self.assertEqual(data['rejected'], [self.done.pk])
+        self.assertFalse(Task.objects.filter(pk__in=[t.pk for t in self.free]).exists())
+
+    def test_caches_are_invalidated(self):
+        self.assertEqual(self.client.get(reverse('tasks-home')).context['paginator'].count, 7)
+        self.client.force_login(self.completer)
+        self.post('complete', self.free)
+        response = self.client.get(reverse('tasks-home'))
+        self.assertEqual(response.context['paginator'].count, 2)
+
+    def test_form_post_redirects_with_messages(self):
+        self.client.force_login(self.completer)
+        response = self.client.get(reverse('tasks-home'))
+        self.assertContains(response, 'Complete selected')
+        response = self.client.post(reverse('task-bulk'), {
+            'action': 'complete', 'ids': [self.free[0].pk, self.theirs.pk], 'next': '/?page=1',
+        }, follow=True)
+        self.assertRedirects(response, '/?page=1')
+        self.assertContains(response, '1 task(s) updated.')
+        self.assertContains(response, f'#{self.theirs.pk}')
+
+    def test_single_task_views_fetch_the_task_once(self):
+        self.client.force_login(self.completer)
+        # the session is cached, then the user with its profile (cached from here on), then the task
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('task-complete', args=[self.free[0].pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(reverse('task-complete', args=[self.theirs.pk])).status_code, 403)
+
+
+class TaskClaimTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.completer = make_user('completer', role=User.COMPLETER)
+        cls.other = make_user('other', role=User.COMPLETER)
+
+    def setUp(self):
+        clear_caches()
+        self.task = Task.objects.create(title='task', content='content', author=self.author)
+
+    def test_claim_then_complete(self):
+        self.client.force_login(self.completer)
+        self.assertContains(self.client.get(reverse('task-detail', args=[self.task.pk])), 'Claim task')
+        response = self.client.post(reverse('task-claim', args=[self.task.pk]))
+        self.assertRedirects(response, reverse('task-complete', args=[self.task.pk]))
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.status, self.task.completer, self.task.version),
+                         (Task.IN_PROGRESS, self.completer, 1))
+        self.assertEqual(UserTaskStats.objects.get(user=self.completer).assigned_open, 1)
+        # a claimed task leaves the open list
+        self.assertNotContains(self.client.get(reverse('tasks-home')), f'data-task-id="{self.task.pk}"')
+
+        self.client.force_login(self.other)
+        response = self.client.post(reverse('task-claim', args=[self.task.pk]), follow=True)
+        self.assertContains(response, 'This task can no longer be claimed.')
+        self.assertEqual(self.client.get(reverse('task-complete', args=[self.task.pk])).status_code, 403)
+
+        self.client.force_login(self.completer)
+        response = self.client.post(reverse('task-complete', args=[self.task.pk]),
+                                    {'completion_comment': 'done', 'version': 1})
+        self.assertEqual(response.status_code, 302)
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.status, self.task.version), (Task.COMPLETED, 2))
+        stats = UserTaskStats.objects.get(user=self.completer)
+        self.assertEqual((stats.assigned_open, stats.assigned_completed), (0, 1))
+
+    def test_creators_cannot_claim(self):
+        self.assertFalse(claim_task(self.task.pk, self.author))
+        self.assertEqual(Task.objects.get(pk=self.task.pk).status, Task.OPEN)
+
+    def test_stale_saves_are_rejected(self):
+        stale = Task.objects.get(pk=self.task.pk)
+        self.assertTrue(claim_task(self.task.pk, self.completer))
+        stale.title = 'renamed'
+        with self.assertRaises(TaskConflict), transaction.atomic():
+            stale.save()
+        self.assertEqual(stale.version, 0)
+        self.assertEqual(Task.objects.get(pk=self.task.pk).title, 'task')
+
+    def test_completing_a_form_of_a_changed_task_shows_the_conflict(self):
+        self.client.force_login(self.completer)
+        self.client.get(reverse('task-complete', args=[self.task.pk]))
+        # the author edits the task while the form is open
+        task = Task.objects.get(pk=self.task.pk)
+        task.content = 'changed'
+        task.save()
+        response = self.client.post(reverse('task-complete', args=[self.task.pk]),
+                                    {'completion_comment': 'done', 'version': 0})
+        self.assertContains(response, 'This task was changed by someone else in the meantime.')
+        self.assertContains(response, 'name="version" value="1"')
+        self.assertEqual(Task.objects.get(pk=self.task.pk).status, Task.OPEN)
+
+
+# Real threads with their own database connections race for the same tasks
+class TaskClaimConcurrencyTests(TransactionTestCase):
+    def test_one_claim_wins(self):
+        author = make_user('author')
+        completers = [make_user(f'completer{i}', role=User.COMPLETER) for i in range(8)]
+        tasks = [Task.objects.create(title=f'task {i}', content='content', author=author) for i in range(5)]
+
+        def claim(args):
+            task, completer = args
+            try:
+                while True:
+                    try:
+                        return task.pk, completer.pk, claim_task(task.pk, completer)
+                    except OperationalError:
+                        # SQLite's shared in-memory test database fails a write on a
+                        # locked table instead of waiting, the statement had no effect
+                        if connection.vendor != 'sqlite':
+                            raise
+            finally:
+                connections.close_all()
+
+        attempts = [(task, completer) for task in tasks for completer in completers]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(claim, attempts))
+
+        for task in tasks:
+            winners = [completer_id for task_id, completer_id, won in results if task_id == task.pk and won]
+            self.assertEqual(len(winners), 1)
+            task.refresh_from_db()
+            self.assertEqual((task.status, task.completer_id, task.version), (Task.IN_PROGRESS, winners[0], 1))
+        assigned = UserTaskStats.objects.filter(user__in=completers).aggregate(total=Sum('assigned_open'))
+        self.assertEqual(assigned['total'], len(tasks))
+
+
+class TaskFormTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.completer = make_user('completer', role=User.COMPLETER)
+
+    def setUp(self):
+        clear_caches()
+        self.client.force_login(self.author)
+
+    def create(self, date, time):
+        return self.client.post(reverse('task-create'), {
+            'title': 'task', 'content': 'content', 'due_date_0': date, 'due_date_1': time,
+        })
+
+    def test_due_date_is_parsed_from_the_pickers(self):
+        self.assertEqual(self.create('2030-05-01', '13:30').status_code, 302)
+        self.assertEqual(Task.objects.get().due_date, datetime(2030, 5, 1, 13, 30, tzinfo=dt_timezone.utc))
+        # without a time it's midnight
+        self.create('2030-05-02', '')
+        self.assertEqual(Task.objects.latest('pk').due_date, datetime(2030, 5, 2, tzinfo=dt_timezone.utc))
+
+    def test_malformed_due_date_is_a_form_error(self):
+        for date, time in (('2030-13-45', '10:00'), ('yesterday', ''), ('2030-05-01', '25:00'), ('', '10:00')):
+            response = self.create(date, time)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'Enter a valid date and time.')
+        self.assertFalse(Task.objects.exists())
+
+    def test_update_form_shows_the_due_date(self):
+        task = Task.objects.create(title='task', content='content', author=self.author,
+                                   due_date=datetime(2030, 5, 1, 13, 30, 15, tzinfo=dt_timezone.utc))
+        response = self.client.get(reverse('task-update', args=[task.pk]))
+        self.assertContains(response, 'value="2030-05-01"')
+        self.assertContains(response, 'value="13:30"')
+
+    def test_completion_date_is_a_datetime(self):
+        task = Task.objects.create(title='task', content='content', author=self.author)
+        self.client.force_login(self.completer)
+        before = timezone.now()
+        self.client.post(reverse('task-complete', args=[task.pk]), {'completion_comment': 'done', 'version': 0})
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.COMPLETED)
+        self.assertGreaterEqual(task.date_completed, before)
+
+    def test_bench_date_parsing_command(self):
+        out = StringIO()
+        call_command('bench_date_parsing', iterations=10, stdout=out)
+        self.assertIn('strptime:', out.getvalue())
+        self.assertIn('fromisoformat:', out.getvalue())
+
+
+class TaskHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.completer = make_user('completer', role=User.COMPLETER)
+
+    def setUp(self):
+        clear_caches()
+
+    def create_task(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Task.objects.create(title='task', content='content', author=self.author, **kwargs)
+
+    def event_inserts(self, queries):
+        return [query for query in queries if query['sql'].startswith('INSERT INTO "tasks_taskevent"')]
+
+    def test_edit_is_one_insert_and_keeps_the_author(self):
+        task = self.create_task()
+        self.assertEqual(TaskEvent.objects.get().kind, TaskEvent.CREATED)
+        self.client.force_login(self.author)
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('task-update', args=[task.pk]), {
+                'title': 'renamed', 'content': 'content', 'due_date_0': '2030-05-01', 'due_date_1': '10:00',
+                'completer': self.completer.pk, 'version': 0,
+            })
+        self.assertEqual(len(self.event_inserts(queries)), 1)
+        task.refresh_from_db()
+        self.assertEqual(task.author, self.author)
+        event = TaskEvent.objects.latest('id')
+        self.assertEqual((event.kind, event.actor), (TaskEvent.ASSIGNED, self.author))
+        self.assertEqual(event.changes['title'], ['task', 'renamed'])
+        self.assertEqual(event.changes['completer_id'], [None, self.completer.pk])
+        self.assertEqual(set(event.changes), {'title', 'due_date', 'completer_id'})
+
+    def test_set_based_changes_are_one_insert(self):
+        tasks = [self.create_task() for _ in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(claim_task(tasks[0].pk, self.completer))
+        self.client.force_login(self.completer)
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('task-bulk'), {'action': 'complete', 'ids': [task.pk for task in tasks]},
+                             HTTP_ACCEPT='application/json')
+        self.assertEqual(len(self.event_inserts(queries)), 1)
+        kinds = list(TaskEvent.objects.filter(task=tasks[0]).order_by('id').values_list('kind', 'actor'))
+        self.assertEqual(kinds, [(TaskEvent.CREATED, None), (TaskEvent.CLAIMED, self.completer.pk),
+                                 (TaskEvent.COMPLETED, self.completer.pk)])
+        self.assertEqual(TaskEvent.objects.filter(kind=TaskEvent.COMPLETED).count(), 3)
+
+    def test_rolled_back_changes_leave_no_history(self):
+        task = self.create_task()
+        try:
+            with transaction.atomic():
+                task.title = 'renamed'
+                task.save()
+                raise ValueError
+        except ValueError:
+            pass
+        task = Task.objects.get(pk=task.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            task.content = 'changed'
+            task.save()
+        self.assertEqual(list(TaskEvent.objects.order_by('id').values_list('kind', flat=True)),
+                         [TaskEvent.CREATED, TaskEvent.UPDATED])
+        self.assertEqual(set(TaskEvent.objects.latest('id').changes), {'content'})
+
+    def test_deleted_task_keeps_its_history(self):
+        task = self.create_task()
+        self.client.force_login(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('task-delete', args=[task.pk]))
+        self.assertFalse(Task.objects.filter(pk=task.pk).exists())
+        event = TaskEvent.objects.latest('id')
+        self.assertEqual((event.task_id, event.kind, event.actor), (task.pk, TaskEvent.DELETED, self.author))
+
+    def test_timeline_is_paginated(self):
+        task = self.create_task()
+        for i in range(11):
+            with self.captureOnCommitCallbacks(execute=True):
+                task.title = f'title {i}'
+                task.save()
+        task.changed_by = self.completer
+        with self.captureOnCommitCallbacks(execute=True):
+            task.completer = self.completer
+            task.save()
+
+        response = self.client.get(reverse('task-detail', args=[task.pk]))
+        self.assertContains(response, 'Assigned by completer')
+        self.assertContains(response, 'Completer: - &rarr; completer')
+        self.assertContains(response, 'Title: title 9 &rarr; title 10')
+        self.assertContains(response, '?history=2')
+        self.assertNotContains(response, 'Title: title 0 &rarr; title 1')
+        response = self.client.get(reverse('task-detail', args=[task.pk]), {'history': 2})
+        self.assertContains(response, 'Title: title 0 &rarr; title 1')
+        self.assertContains(response, 'Title: task &rarr; title 0')
+        self.assertContains(response, '?history=1')
+        self.assertNotContains(response, '?history=3')
+
+
+class TaskSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        Task.objects.create(title='Fix the boiler', content='it leaks', author=cls.author)
+        Task.objects.create(title='Paint the fence', content='the boiler room too', author=cls.author)
+        Task.objects.create(title='Buy milk', content='two bottles', author=cls.author)
+        Task.objects.create(title='Call the plumber', content='about the sink', author=cls.author,
+                            status=Task.COMPLETED, date_completed=timezone.now(),
+                            completion_comment='Boiler fixed as well')
+
+    def setUp(self):
+        clear_caches()
+
+    def test_open_and_completed_lists(self):
+        response = self.client.get(reverse('tasks-home'), {'q': 'boiler'})
+        self.assertEqual([t.title for t in response.context['tasks']], ['Paint the fence', 'Fix the boiler'])
+        self.assertContains(response, 'name="q"')
+        response = self.client.get(reverse('tasks-completed'), {'q': 'boiler'})
+        self.assertEqual([t.title for t in response.context['tasks']], ['Call the plumber'])
+
+    def test_search_keeps_the_other_filters(self):
+        tomorrow = (timezone.now() + timedelta(days=1)).date().isoformat()
+        response = self.client.get(reverse('tasks-home'), {'q': 'boiler', 'date_field_min': tomorrow})
+        self.assertEqual(len(response.context['tasks']), 0)
+        data = self.client.get(reverse('api-tasks'), {'q': 'milk'}).json()
+        self.assertEqual([row['title'] for row in data['results']], ['Buy milk'])
+
+    def test_highlight_escapes_the_task_text(self):
+        headline = f'<b>the {HIGHLIGHT_START}boiler{HIGHLIGHT_STOP} room</b>'
+        self.assertEqual(highlight(headline), '&lt;b&gt;the <mark>boiler</mark> room&lt;/b&gt;')
+
+
+class UserTaskStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.completer = make_user('completer', role=User.COMPLETER)
+        cls.other = make_user('other', role=User.COMPLETER)
+
+    def setUp(self):
+        clear_caches()
+
+    def stats(self, user):
+        return UserTaskStats.for_user(User.objects.get(pk=user.pk))
+
+    def assertStatsMatchRebuild(self):
+        incremental = {s.user_id: [getattr(s, f) for f in UserTaskStats.COUNT_FIELDS]
+                       for s in UserTaskStats.objects.all()}
+        out = StringIO()
+        call_command('rebuild_task_stats', stdout=out)
+        self.assertIn('0 had drifted', out.getvalue())
+        rebuilt = {s.user_id: [getattr(s, f) for f in UserTaskStats.COUNT_FIELDS]
+                   for s in UserTaskStats.objects.all()}
+        self.assertEqual({k: v for k, v in incremental.items() if any(v)}, rebuilt)
+
+    def test_single_task_changes(self):
+        task = Task.objects.create(title='t', content='c', author=self.author)
+        Task.objects.create(title='u', content='c', author=self.author, completer=self.completer)
+        self.assertEqual((self.stats(self.author).created_open, self.stats(self.completer).assigned_open), (2, 1))
+
+        task = Task.objects.get(pk=task.pk)
+        task.title = 'renamed'
+        with self.assertNumQueries(1):
+            task.save()
+
+        task.status, task.completer, task.date_completed = Task.COMPLETED, self.other, timezone.now()
+        task.save()
+        stats = self.stats(self.author)
+        self.assertEqual((stats.created_open, stats.created_completed), (1, 1))
+        self.assertEqual(self.stats(self.other).assigned_completed, 1)
+        Task.objects.get(pk=task.pk).delete()
+        self.assertEqual(self.stats(self.author).created_completed, 0)
+        self.assertStatsMatchRebuild()
+
+    def test_bulk_actions(self):
+        tasks = [Task.objects.create(title=f't{i}', content='c', author=self.author) for i in range(4)]
+        self.client.force_login(self.author)
+        self.client.post(reverse('task-bulk'), {'action': 'assign', 'completer': self.other.pk,
+                                                'ids': [t.pk for t in tasks[:3]]})
+        self.assertEqual(self.stats(self.other).assigned_open, 3)
+        self.client.post(reverse('task-bulk'), {'action': 'delete', 'ids': [tasks[0].pk]})
+        self.client.force_login(self.other)
+        self.client.post(reverse('task-bulk'), {'action': 'complete', 'ids': [t.pk for t in tasks]})
+        stats = self.stats(self.other)
+        self.assertEqual((stats.assigned_open, stats.assigned_completed), (0, 3))
+        self.assertEqual(self.stats(self.author).created_completed, 3)
+        self.assertStatsMatchRebuild()
+
+    def test_overdue_counts_up_to_the_rebuild(self):
+        past = timezone.now() - timedelta(days=1)
+        Task.objects.create(title='late', content='c', author=self.author, due_date=past)
+        self.assertEqual(self.stats(self.author).created_overdue, 0)
+        call_command('rebuild_task_stats', stdout=StringIO())
+        self.assertEqual(self.stats(self.author).created_overdue, 1)
+        # from now on the overdue counts follow the task
+        task = Task.objects.create(title='late too', content='c', author=self.author, due_date=past)
+        self.assertEqual(self.stats(self.author).created_overdue, 2)
+        task.status = Task.COMPLETED
+        task.save()
+        self.assertEqual(self.stats(self.author).created_overdue, 1)
+        self.assertStatsMatchRebuild()
+
+    def test_rebuild_repairs_drift(self):
+        Task.objects.create(title='t', content='c', author=self.author)
+        UserTaskStats.objects.filter(user=self.author).update(created_open=42)
+        out = StringIO()
+        call_command('rebuild_task_stats', stdout=out)
+        self.assertIn('1 had drifted', out.getvalue())
+        self.assertEqual(self.stats(self.author).created_open, 1)
+
+    def test_pages_show_the_counts(self):
+        Task.objects.create(title='t', content='c', author=self.author, completer=self.completer)
+        # the stats come with the user, the page doesn't aggregate
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('user-tasks', args=['author']))
+        self.assertEqual(response.context['task_stats'].created_open, 1)
+        self.client.force_login(self.completer)
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.context['task_stats'].assigned_open, 1)
+        self.assertContains(response, 'Assigned')
+
+
+class TaskSchedulerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.now = timezone.now()
+        for hours in (-30, -20, -10, -10, -5, 2, 30):
+            Task.objects.create(title=f'due {hours}', content='c', author=cls.author,
+                                due_date=cls.now + timedelta(hours=hours))
+        Task.objects.create(title='done', content='c', author=cls.author, status=Task.COMPLETED,
+                            due_date=cls.now - timedelta(hours=1))
+
+    def setUp(self):
+        clear_caches()
+
+    def notified(self, kind):
+        return sorted(TaskNotification.objects.filter(kind=kind).values_list('task__title', flat=True))
+
+    def test_scans_from_the_marks_in_batches(self):
+        Watermark.set_value(OVERDUE_MARK, self.now - timedelta(hours=24))
+        Watermark.set_value(DUE_SOON_MARK, self.now)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(run_once(self.now, timedelta(hours=24), batch_size=2), (4, 1))
+        self.assertEqual(self.notified(TaskNotification.OVERDUE), ['due -10', 'due -10', 'due -20', 'due -5'])
+        self.assertEqual(self.notified(TaskNotification.DUE_SOON), ['due 2'])
+        self.assertEqual(Watermark.get_value(OVERDUE_MARK), self.now)
+        # three batches of at most 2 overdue tasks
+        selects = [q for q in queries if q['sql'].startswith('SELECT "tasks_task"."id", "tasks_task"."due_date"')]
+        self.assertEqual(len(selects), 4)
+
+        # nothing changed since the last pass: nothing is scanned again
+        later = self.now + timedelta(minutes=1)
+        self.assertEqual(run_once(later, timedelta(hours=24), batch_size=2), (0, 0))
+        self.assertEqual(TaskNotification.objects.count(), 5)
+
+    def test_restart_after_a_partial_batch_does_not_duplicate(self):
+        Watermark.set_value(OVERDUE_MARK, self.now - timedelta(hours=24))
+        first_batch = list(Task.objects.filter(title__in=['due -20', 'due -10']).order_by('due_date', 'id')[:2])
+        for task in first_batch:
+            TaskNotification.objects.create(task=task, kind=TaskNotification.OVERDUE, due_date=task.due_date)
+        Watermark.set_value(OVERDUE_MARK, first_batch[-1].due_date)
+        run_once(self.now, timedelta(hours=1), batch_size=2)
+        self.assertEqual(self.notified(TaskNotification.OVERDUE), ['due -10', 'due -10', 'due -20', 'due -5'])
+
+    def test_first_run_starts_now_and_moves_the_overdue_counts(self):
+        call_command('rebuild_task_stats', stdout=StringIO())
+        self.assertEqual(UserTaskStats.objects.get(user=self.author).created_overdue, 5)
+        call_command('run_task_scheduler', once=True, stdout=StringIO())
+        self.assertEqual(self.notified(TaskNotification.OVERDUE), [])
+        self.assertEqual(self.notified(TaskNotification.DUE_SOON), ['due 2'])
+
+        later = timezone.now() + timedelta(hours=3)
+        run_once(later, timedelta(hours=24), batch_size=100)
+        self.assertEqual(self.notified(TaskNotification.OVERDUE), ['due 2'])
+        self.assertEqual(UserTaskStats.objects.get(user=self.author).created_overdue, 6)
+        out = StringIO()
+        call_command('rebuild_task_stats', stdout=out)
+        self.assertIn('0 had drifted', out.getvalue())
+
+
+class TaskArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.completer = make_user('completer', role=User.COMPLETER)
+        now = timezone.now()
+        for days in (800, 500, 400, 20, 10, 1):
+            Task.objects.create(title=f'done {days}', content='c', author=cls.author,
+                                completer=cls.completer, status=Task.COMPLETED,
+                                date_posted=now - timedelta(days=days + 1),
+                                date_completed=now - timedelta(days=days))
+        Task.objects.create(title='open', content='c', author=cls.author, date_posted=now - timedelta(days=900))
+        cls.expected = ['done 1', 'done 10', 'done 20', 'done 400', 'done 500', 'done 800']
+
+    def setUp(self):
+        clear_caches()
+        card_cache().clear()
+
+    def archive(self, **options):
+        out = StringIO()
+        call_command('archive_tasks', stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def titles(self, params=None):
+        titles = []
+        page = 1
+        while page:
+            response = self.client.get(reverse('tasks-completed'), {**(params or {}), 'page': page})
+            titles += [task.title for task in response.context['tasks']]
+            page = response.context['page_obj'].next_page_number() if response.context['page_obj'].has_next() else None
+        return titles
+
+    def test_moves_old_completed_tasks_in_batches(self):
+        self.assertIn('Archived 3 tasks', self.archive(batch_size=2))
+        self.assertEqual(sorted(ArchivedTask.objects.values_list('title', flat=True)),
+                         ['done 400', 'done 500', 'done 800'])
+        self.assertEqual(Task.objects.filter(status=Task.COMPLETED).count(), 3)
+        self.assertTrue(Task.objects.filter(title='open').exists())
+        # nothing left to do
+        self.assertIn('Archived 0 tasks', self.archive())
+
+    # The rows are deleted without the collector: no signals, no cascades to miss
+    def test_batch_deletes_only_the_task_rows(self):
+        task = Task.objects.get(title='done 800')
+        TaskNotification.objects.create(task=task, kind=TaskNotification.OVERDUE, due_date=task.due_date)
+        events = TaskEvent.objects.filter(task_id=task.pk).count()
+        stats = UserTaskStats.objects.get(user=self.author).created_completed
+        deleted = []
+
+        def receiver(sender, instance, **kwargs):
+            deleted.append(instance.pk)
+        post_delete.connect(receiver, sender=Task)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Task)
+        self.assertEqual(archive_batch(archive_boundary(), 1), 1)
+        self.assertEqual(deleted, [])
+        self.assertFalse(Task.objects.filter(pk=task.pk).exists())
+        self.assertFalse(TaskNotification.objects.filter(task_id=task.pk).exists())
+        self.assertEqual(TaskEvent.objects.filter(task_id=task.pk).count(), events)
+        self.assertEqual(UserTaskStats.objects.get(user=self.author).created_completed, stats)
+        self.assertTrue(ArchivedTask.objects.filter(pk=task.pk).exists())
+
+    # The task row stays when the archive already holds its id
+    def test_conflicting_id_fails_the_batch(self):
+        task = Task.objects.get(title='done 800')
+        ArchivedTask.objects.create(id=task.pk, title='stray', content='c', author=self.author,
+                                    date_posted=task.date_posted, due_date=task.due_date,
+                                    date_completed=task.date_completed, updated=task.updated)
+        with self.assertRaisesMessage(CommandError, 'already archived'):
+            self.archive(batch_size=2)
+        self.assertTrue(Task.objects.filter(pk=task.pk).exists())
+        self.assertEqual(list(ArchivedTask.objects.values_list('title', flat=True)), ['stray'])
+
+    # Like a task, an archived task doesn't go away with its author
+    def test_archived_author_is_deleted_like_a_tasks(self):
+        on_delete = [model._meta.get_field('author').remote_field.on_delete for model in (Task, ArchivedTask)]
+        self.assertEqual(on_delete[1].deconstruct(), on_delete[0].deconstruct())
+
+    def test_resumes_after_an_interruption(self):
+        archive_batch(archive_boundary(), 1)
+        self.assertEqual(ArchivedTask.objects.count(), 1)
+        self.archive()
+        self.assertEqual(ArchivedTask.objects.count(), 3)
+
+    def test_completed_list_reads_the_archive_when_needed(self):
+        self.archive()
+        self.assertEqual(self.titles(), self.expected)
+        self.assertEqual(self.titles({'date_field_min': '2000-01-01'}), self.expected)
+        recent = (timezone.now() - timedelta(days=30)).date().isoformat()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.titles({'date_field_min': recent}), self.expected[:3])
+        self.assertFalse(any('tasks_archivedtask' in q['sql'] for q in queries))
+        with override_settings(TASK_CURSOR_PAGINATION=True):
+            titles, cursor = [], None
+            while True:
+                response = self.client.get(reverse('tasks-completed'), {'cursor': cursor} if cursor else {})
+                titles += [task.title for task in response.context['tasks']]
+                cursor = response.context['page_obj'].next_cursor
+                if not cursor:
+                    break
+            self.assertEqual(titles, self.expected)
+
+    # The archive has its own search vector, which nothing loads
+    def test_search_reaches_the_archive(self):
+        self.archive()
+        self.assertEqual(self.titles({'q': 'done 800'}), ['done 800'])
+        self.assertNotIn('search_vector', str(ArchivedTask.objects.with_related().query).split('FROM')[0])
+
+    def test_archived_tasks_keep_their_page_and_statistics(self):
+        call_command('rebuild_task_stats', stdout=StringIO())
+        task = Task.objects.get(title='done 800')
+        self.archive()
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('task-detail', args=[task.pk]))
+        self.assertContains(response, 'done 800')
+        self.assertNotContains(response, 'Update task')
+        self.assertEqual(UserTaskStats.objects.get(user=self.author).created_completed, 6)
+        out = StringIO()
+        call_command('rebuild_task_stats', stdout=out)
+        self.assertIn('0 had drifted', out.getvalue())
+
+
+@override_settings(TASK_PAGE_CACHE_TIMEOUT=None)
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        Task.objects.create(title='t', content='c', author=cls.author)
+
+    def setUp(self):
+        clear_caches()
+        card_cache().clear()
+        card_stats.reset()
+        for histogram in HISTOGRAMS:
+            histogram.reset()
+
+    def test_histograms_per_url_name(self):
+        self.client.get(reverse('tasks-home'))
+        self.client.get(reverse('tasks-home'))
+        self.client.get(reverse('task-detail', args=[Task.objects.get().pk]))
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('django_request_duration_seconds_count{view="tasks-home"} 2', body)
+        self.assertIn('django_request_duration_seconds_count{view="task-detail"} 1', body)
+        # count + page on the first visit, the page only (cached count) on the second
+        self.assertIn('django_request_db_queries_bucket{view="tasks-home",le="1"} 1', body)
+        self.assertIn('django_request_db_queries_bucket{view="tasks-home",le="2"} 2', body)
+        self.assertIn('django_request_db_queries_sum{view="tasks-home"} 3', body)
+        self.assertIn('django_request_template_duration_seconds_count{view="tasks-home"} 2', body)
+        self.assertIn('task_card_cache_hits_total 1', body)
+        self.assertIn('task_card_cache_misses_total 1', body)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_need_an_allowed_address_or_the_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.7').status_code, 403)
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.7', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.7', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    # Under ASGI the queries run in the request's thread sensitive thread
+    async def test_async_requests(self):
+        await self.async_client.get(reverse('api-tasks'))
+        counts, total = DB_QUERIES.series['api-tasks']
+        self.assertEqual((counts[-1], total), (1, 2))
+
+    @override_settings(SLOW_REQUEST_SECONDS=0)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.assertLogs('django_project.metrics', 'WARNING') as logs:
+            self.client.get(reverse('tasks-home'))
+        self.assertIn('Slow request GET / (tasks-home)', logs.output[0])
+        self.assertIn('FROM "tasks_task"', logs.output[0])
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_seed_tasks_is_reproducible(self):
+        call_command('seed_tasks', users=6, tasks=300, batch_size=100, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(User.objects.filter(username__startswith='seed_user').count(), 6)
+        self.assertEqual(Profile.objects.filter(user__username__startswith='seed_user').count(), 6)
+        self.assertEqual(Task.objects.count(), 300)
+        completed = Task.objects.filter(status=Task.COMPLETED)
+        self.assertTrue(120 < completed.count() < 240)
+        self.assertFalse(completed.filter(completer__isnull=True).exists())
+        first = list(Task.objects.order_by('id').values_list('title', 'status', 'author__username')[:20])
+        self.assertEqual(UserTaskStats.objects.aggregate(n=Sum('created_open') + Sum('created_completed'))['n'], 300)
+
+        Task.objects.all().delete()
+        call_command('seed_tasks', users=6, tasks=300, batch_size=100, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(User.objects.filter(username__startswith='seed_user').count(), 6)
+        self.assertEqual(list(Task.objects.order_by('id').values_list('title', 'status', 'author__username')[:20]),
+                         first)
+
+    def test_benchmark_views_covers_every_get_view(self):
+        call_command('seed_tasks', users=4, tasks=50, stdout=StringIO(), stderr=StringIO())
+        out = StringIO()
+        call_command('benchmark_views', requests=2, warmup=1, stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['tasks'], 50)
+        names = [result['name'] for result in report['results']]
+        self.assertIn('task-complete', names)
+        self.assertNotIn('task-bulk', names)
+        for result in report['results']:
+            self.assertEqual(result['status'], [200], result['name'])
+            self.assertGreater(result['peak_memory_kb'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
@@ -0,0 +1,103 @@
+import csv
+import json
+from itertools import islice
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Task
+
+
+# The columns of an exported task. Users are referenced by username, so the files can be
+# imported into another environment where the ids differ
+TASK_COLUMNS = ('title', 'content', 'status', 'date_posted', 'due_date', 'author', 'completer',
+                'date_completed', 'completion_comment')
+DATETIME_COLUMNS = ('date_posted', 'due_date', 'date_completed')
+REQUIRED_COLUMNS = ('title', 'author')
+
+
+def guess_format(path, fmt):
+    if fmt:
+        return fmt
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def serialize_value(value):
+    if value is None:
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+# Writes rows (tuples in TASK_COLUMNS order) one by one, nothing is kept in memory
+def write_rows(rows, stream, fmt):
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(TASK_COLUMNS)
+        for row in rows:
+            writer.writerow(['' if value is None else serialize_value(value) for value in row])
+            yield
+    else:
+        for row in rows:
+            stream.write(json.dumps(dict(zip(TASK_COLUMNS, map(serialize_value, row)))) + '\n')
+            yield
+
+
+# Yields the rows of a file as dicts, with None for empty values and parsed datetimes.
+# Invalid rows raise a ValueError with their line in the file
+def read_rows(stream, fmt):
+    for line, record in read_records(stream, fmt):
+        try:
+            row = parse_record(record)
+        except ValueError as e:
+            raise ValueError(f'Line {line}: {e}')
+        yield row
+
+
+# (line, record) pairs, the line of a CSV record is the one it ends on
+def read_records(stream, fmt):
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line, text in enumerate(stream, 1):
+        if text.strip():
+            try:
+                yield line, json.loads(text)
+            except ValueError as e:
+                raise ValueError(f'Line {line}: invalid JSON ({e})')
+
+
+def parse_record(record):
+    if not isinstance(record, dict):
+        raise ValueError('not an object')
+    row = {column: record.get(column) or None for column in TASK_COLUMNS}
+    for column in REQUIRED_COLUMNS:
+        if row[column] is None:
+            raise ValueError(f'{column}: missing')
+    if row['status'] is not None:
+        try:
+            status = int(row['status'])
+        except (TypeError, ValueError):
+            status = None
+        if status not in dict(Task.TASK_STATUS):
+            raise ValueError(f"status: invalid value {row['status']!r}")
+        row['status'] = status
+    for column in DATETIME_COLUMNS:
+        if row[column] is not None:
+            value = parse_datetime(row[column]) if isinstance(row[column], str) else None
+            if value is None:
+                raise ValueError(f'{column}: invalid datetime {row[column]!r}')
+            if timezone.is_naive(value):
+                value = timezone.make_aware(value)
+            row[column] = value
+    return row
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
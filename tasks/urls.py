@@ -1,5 +1,12 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, api, events
+
+
+# The JSON API is served by the async views under an ASGI server (see TASK_ASYNC_API)
+def api_view(sync_view, async_view):
+    return (async_view if settings.TASK_ASYNC_API else sync_view).as_view()
+
 
 urlpatterns = [
     path('', views.TaskListView.as_view(), name='tasks-home'),
@@ -9,5 +16,12 @@ urlpatterns = [
     path('task/<int:pk>/update/', views.TaskUpdateView.as_view(), name='task-update'),
     path('task/<int:pk>/delete/', views.TaskDeleteView.as_view(), name='task-delete'),
     path('task/<int:pk>/complete/', views.TaskCompleteView.as_view(), name='task-complete'),
+    path('task/<int:pk>/claim/', views.TaskClaimView.as_view(), name='task-claim'),
+    path('task/bulk/', views.TaskBulkActionView.as_view(), name='task-bulk'),
     path('completed/', views.CompletedTasksListView.as_view(), name='tasks-completed'),
+    path('events/', events.task_events, name='task-events'),
+    path('api/tasks/', api_view(api.OpenTaskListAPIView, api.AsyncOpenTaskListAPIView), name='api-tasks'),
+    path('api/tasks/completed/', api_view(api.CompletedTaskListAPIView, api.AsyncCompletedTaskListAPIView), name='api-tasks-completed'),
+    path('api/tasks/<int:pk>/', api_view(api.TaskDetailAPIView, api.AsyncTaskDetailAPIView), name='api-task-detail'),
+    path('api/users/<str:username>/tasks/', api_view(api.UserTaskListAPIView, api.AsyncUserTaskListAPIView), name='api-user-tasks'),
 ]
\ No newline at end of file
@@ -1,23 +1,37 @@
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import (
-    ListView, DetailView, CreateView, UpdateView, DeleteView)
-from django.shortcuts import get_object_or_404
-from django.forms.widgets import NumberInput
-from django.forms import MultiWidget
+    ListView, DetailView, CreateView, UpdateView, DeleteView, View)
+from django.shortcuts import get_object_or_404, redirect
+from django.contrib import messages
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404, JsonResponse
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.forms import HiddenInput, IntegerField
 from django.utils import timezone
-from datetime import datetime
-from .models import Task
+from .models import ArchivedTask, Task, TaskConflict, TaskEvent, UserTaskStats
 from users.models import User
+from .archive import ArchiveChain
+from .claims import claim_task
 from .filters import CreationFilter, CompletionFilter
+from .forms import TaskForm
+from .history import describe_events
+from .pagecache import AnonymousPageCacheMixin, profile_page_group, task_page_group, user_page_group
+from .pagination import CursorPaginationMixin, CachedCountPaginator
+from .signals import tasks_updated
 import logging
 
 
 # This is a list of all COMPLETED tasks
-class CompletedTasksListView(ListView):
+class CompletedTasksListView(AnonymousPageCacheMixin, CursorPaginationMixin, ListView):
     model = Task
     template_name = 'tasks/completed.html'
     context_object_name = 'tasks'
     paginate_by = 5
+    paginator_class = CachedCountPaginator
+
+    def get_page_cache_groups(self):
+        return ['completed']
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -28,20 +42,27 @@ class CompletedTasksListView(ListView):
         return context
 
     def get_queryset(self):
-        queryset = Task.objects.all().filter(status=Task.COMPLETED).order_by('-date_completed')
+        queryset = Task.objects.completed().with_related()
         # need to apply the filter here
         self.filterset = CompletionFilter(self.request.GET, queryset=queryset)
         if self.filterset.is_bound and self.filterset.form.is_valid():
             queryset = self.filterset.qs
+        # older tasks continue in the archive
+        if self.filterset.reaches_archive():
+            queryset = ArchiveChain(queryset, self.filterset.archive_qs())
         return queryset
 
 
 # This is a list of all OPEN tasks
-class TaskListView(ListView):
+class TaskListView(AnonymousPageCacheMixin, CursorPaginationMixin, ListView):
     model = Task
     template_name = 'tasks/home.html'
     context_object_name = 'tasks'
     paginate_by = 5
+    paginator_class = CachedCountPaginator
+
+    def get_page_cache_groups(self):
+        return ['open']
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -49,10 +70,13 @@ class TaskListView(ListView):
         context['filter'] = self.filterset
         context['title'] = 'Open Tasks'
         context['need_filter'] = 'created'
+        # new tasks are only inserted live into the unfiltered first page (see tasks/events.py)
+        context['live_inserts'] = not self.request.GET
+        context['events_since'] = timezone.now().isoformat()
         return context
 
     def get_queryset(self):
-        queryset = Task.objects.all().filter(status=Task.OPEN).order_by('-date_posted')
+        queryset = Task.objects.open().with_related()
         # need to apply the filter here
         self.filterset = CreationFilter(self.request.GET, queryset=queryset)
         if self.filterset.is_bound and self.filterset.form.is_valid():
@@ -61,75 +85,122 @@ class TaskListView(ListView):
 
 
 # This is a list of Task for each specific User
-class UserTaskListView(ListView):
+class UserTaskListView(AnonymousPageCacheMixin, CursorPaginationMixin, ListView):
     model = Task
     template_name = 'tasks/user_tasks.html'
     context_object_name = 'tasks'
     paginate_by = 5
+    paginator_class = CachedCountPaginator
+
+    def get_page_cache_groups(self):
+        return [user_page_group(), user_page_group(self.kwargs.get('username'))]
 
     def get_queryset(self):
-        user = get_object_or_404(User, username=self.kwargs.get('username'))
-        return Task.objects.filter(author=user).order_by('-date_posted')
+        self.author = get_object_or_404(User.objects.select_related('task_stats'),
+                                        username=self.kwargs.get('username'))
+        return Task.objects.by_author(self.author).with_related()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['task_stats'] = UserTaskStats.for_user(self.author)
+        return context
 
 
-class TaskDetailView(DetailView):
+class TaskDetailView(AnonymousPageCacheMixin, DetailView):
     model = Task
+    queryset = Task.objects.with_related()
+    template_name = 'tasks/task_detail.html'
+    context_object_name = 'task'
+    history_page_size = 10
+
+    def get_page_cache_groups(self):
+        return [task_page_group(self.kwargs.get('pk'))]
+
+    # The page shows the author's avatar and username
+    def get_page_cache_extra_groups(self):
+        pk = self.kwargs.get('pk')
+        author_id = (Task.objects.filter(pk=pk).values_list('author_id', flat=True).first()
+                     or ArchivedTask.objects.filter(pk=pk).values_list('author_id', flat=True).first())
+        return [profile_page_group(author_id)] if author_id else []
+
+    # Archived tasks keep their id, and their detail page
+    def get_object(self, queryset=None):
+        try:
+            return super().get_object(queryset)
+        except Http404:
+            if queryset is not None:
+                raise
+            return super().get_object(ArchivedTask.objects.with_related())
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        task, user = self.object, self.request.user
+        completable = user.is_authenticated and not task.is_archived and task.can_be_completed_by(user)
+        context['can_claim'] = completable and task.status == Task.OPEN
+        context['can_complete'] = completable
+        context.update(self.get_history_page(task))
+        return context
 
-# This is a View for the DateTime input (it has separate pickers matched to a single field)
-class DateTimeMultiWidget(MultiWidget):
-    def __init__(self, attrs=None):
-        date_widget = NumberInput(attrs={'type': 'date',
-                                         'class': 'form-control',
-                                         'style': 'margin-right: 0.5em;'})
-        time_widget = NumberInput(attrs={'type': 'time',
-                                         'class': 'form-control',
-                                         'style': 'margin-left: 0.5em;'})
-        widgets = (date_widget, time_widget)
-        super().__init__(widgets, attrs)
-
-    def subwidgets(self, name, value, attrs=None):
-        context = self.get_context(name, value, attrs)
-        return context['widget']['subwidgets']    
-
-    def decompress(self, value):
-        if value:
-            return [value.date(), value.time()]
-        return [None, None]
-
-    def value_from_datadict(self, data, files, name):
-        date_str, time_str = super().value_from_datadict(data, files, name)
-        # DateField expects a single string that it can parse into a date.
-        
-        if date_str == time_str == '':
-            return None
-
-        # In case time is not set, we set it to midnight
-        if time_str == '':
-            time_str = '00:00'
+    # The task's change history, newest first, a page at a time (?history=<page>). One row
+    # more than the page tells whether there is an older page, so nothing is counted
+    def get_history_page(self, task):
+        try:
+            number = max(int(self.request.GET.get('history', 1)), 1)
+        except ValueError:
+            number = 1
+        offset = (number - 1) * self.history_page_size
+        events = list(TaskEvent.objects.filter(task_id=task.pk).select_related('actor')
+                      .order_by('-created_at', '-id')[offset:offset + self.history_page_size + 1])
+        return {
+            'history': describe_events(events[:self.history_page_size]),
+            'history_page': number,
+            'history_has_next': len(events) > self.history_page_size,
+        }
+
+
+# test_func() and the view itself both call get_object(), this fetches the task only once
+class CachedObjectMixin:
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if not hasattr(self, '_cached_object'):
+            self._cached_object = super().get_object()
+        return self._cached_object
+
+
+# The form carries the version of the task the user saw, and saving is conditional on it
+# (see Task.save): a change made by someone else in the meantime isn't overwritten,
+# the form is shown again with the error instead
+class VersionedFormMixin:
+    conflict_message = 'This task was changed by someone else in the meantime. Review it and submit again.'
 
-        if len(time_str) > 5:
-            time_str = time_str[:5]
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        form.fields['version'] = IntegerField(widget=HiddenInput, initial=self.object.version)
+        return form
 
-        my_datetime = datetime.strptime(date_str + ' ' + time_str, "%Y-%m-%d %H:%M")
-        # making timezone aware
-        return timezone.make_aware(my_datetime)
+    def form_valid(self, form):
+        form.instance.version = form.cleaned_data['version']
+        try:
+            # a savepoint, the failed save must not break an enclosing transaction
+            with transaction.atomic():
+                return super().form_valid(form)
+        except TaskConflict:
+            form.add_error(None, self.conflict_message)
+            form.data = form.data.copy()
+            form.data['version'] = Task.objects.filter(pk=self.object.pk).values_list('version', flat=True).first()
+            return self.form_invalid(form)
 
 
 # This is a form for task creation
 class TaskCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
     model = Task
-    fields = ['title', 'content', 'due_date', 'completer']
+    form_class = TaskForm
 
-    # Set the widget for the due_date
-    def get_form(self, form_class=None):
-        form = super(TaskCreateView, self).get_form(form_class)
-        form.fields['due_date'].widget = DateTimeMultiWidget() 
-        return form
-    
     # Set the author
     def form_valid(self, form):
         form.instance.author = self.request.user
+        form.instance.changed_by = self.request.user
         return super().form_valid(form)
     
     # To be able to see this form, you have to be a CREATOR
@@ -144,25 +215,18 @@ class TaskCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
 
 
 # This is a form for task updates
-class TaskUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class TaskUpdateView(LoginRequiredMixin, UserPassesTestMixin, CachedObjectMixin, VersionedFormMixin, UpdateView):
     model = Task
-    fields = ['title', 'content', 'due_date', 'completer']
+    form_class = TaskForm
 
-    # Set the widget for the due_date
-    def get_form(self, form_class=None):
-        form = super(TaskUpdateView, self).get_form(form_class)
-        form.fields['due_date'].widget = DateTimeMultiWidget() 
-        return form
-    
-    # Set the author
+    # The author stays, only the creator can edit a task anyway
     def form_valid(self, form):
-        form.instance.author = self.request.user
+        form.instance.changed_by = self.request.user
         return super().form_valid(form)
     
     # To be able to see this form, you have to be the creator of the task
     def test_func(self):
-        task = self.get_object()
-        return self.request.user == task.author
+        return self.get_object().can_be_edited_by(self.request.user)
 
     # Pass data to the html form 
     def get_context_data(self, **kwargs):
@@ -172,43 +236,148 @@ class TaskUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
 
 
 # This is a form for task deletion
-class TaskDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class TaskDeleteView(LoginRequiredMixin, UserPassesTestMixin, CachedObjectMixin, DeleteView):
     model = Task
     success_url = '/'
 
+    # The task history records who deleted it
+    def form_valid(self, form):
+        self.object.changed_by = self.request.user
+        return super().form_valid(form)
+
     # To be able to see this form, you have to be the creator of the task
     def test_func(self):
-        task = self.get_object()
-        return self.request.user == task.author
+        return self.get_object().can_be_edited_by(self.request.user)
 
 
 # This is a form for task completion
-class TaskCompleteView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class TaskCompleteView(LoginRequiredMixin, UserPassesTestMixin, CachedObjectMixin, VersionedFormMixin, UpdateView):
     model = Task
     fields = ['completion_comment']
     
     # Set the COMPLETER, the completion time and change the task's status
     def form_valid(self, form):
         form.instance.completer = self.request.user
-        form.instance.date_completed = datetime.strftime(timezone.now(), "%Y-%m-%d %H:%M")
+        form.instance.changed_by = self.request.user
+        form.instance.date_completed = timezone.now()
         form.instance.status = Task.COMPLETED
         return super().form_valid(form)
 
-    # To be able to see this form:
-    # 1. The task has to be open
-    # 2. You have to be a COMPLETER
-    # 3. You have to be assigned to this task
-    #    OR the task can be assigned to anyone
+    # To be able to see this form, you have to be able to complete the task
+    # (see Task.can_be_completed_by)
     def test_func(self):
-        task = self.get_object()
-        is_task_open = task.status == Task.OPEN
-        user_can_complete = self.request.user.role == User.COMPLETER
-        assigned_to_me = task.completer == self.request.user
-        assigned_to_anyone = task.completer == None
-        return (is_task_open and user_can_complete and (assigned_to_anyone or assigned_to_me))
+        return self.get_object().can_be_completed_by(self.request.user)
 
     # Pass data to the html form 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['calling_view'] = 'task-complete'
         return context
+
+
+# A COMPLETER takes an open task (see tasks/claims.py), then goes on to complete it
+class TaskClaimView(LoginRequiredMixin, View):
+    def post(self, request, pk):
+        if claim_task(pk, request.user):
+            messages.success(request, 'The task is yours now.')
+            return redirect('task-complete', pk=pk)
+        messages.error(request, 'This task can no longer be claimed.')
+        return redirect('task-detail', pk=pk)
+
+
+# This applies one action to many tasks in one request, as set-based statements:
+# the task rows the user may act on are locked and selected with the same rules as the
+# single-task views (see TaskQuerySet.completable_by/editable_by), then updated at once.
+# The response lists the ids that were updated and the ones that were rejected
+class TaskBulkActionView(LoginRequiredMixin, View):
+    ACTIONS = ('complete', 'assign', 'delete')
+    MAX_TASKS = 1000
+
+    def post(self, request):
+        action = request.POST.get('action')
+        if action not in self.ACTIONS:
+            return self.respond({'error': f'Unknown action {action!r}'}, status=400)
+
+        requested = []
+        for value in request.POST.getlist('ids')[:self.MAX_TASKS]:
+            try:
+                requested.append(int(value))
+            except ValueError:
+                pass
+        if not requested:
+            return self.respond({'error': 'No tasks selected'}, status=400)
+        # checked before the rows are locked
+        if action == 'assign':
+            try:
+                self.completer = self.get_completer()
+            except User.DoesNotExist:
+                return self.respond({'error': 'Unknown completer'}, status=400)
+
+        with transaction.atomic():
+            if action == 'complete':
+                allowed = Task.objects.completable_by(request.user)
+            elif action == 'assign':
+                allowed = Task.objects.editable_by(request.user).filter(status=Task.OPEN)
+            else:
+                allowed = Task.objects.editable_by(request.user)
+            # the previous states are passed on to the statistics (see tasks_updated)
+            self.previous = {row[0]: row[1:] for row in allowed.filter(pk__in=requested).select_for_update()
+                             .order_by('pk').values_list('pk', *Task.STATS_FIELDS)}
+            ids = list(self.previous)
+            if ids:
+                getattr(self, action)(ids)
+
+        updated = set(ids)
+        data = {
+            'action': action,
+            'updated': sorted(updated),
+            'rejected': sorted(set(requested) - updated),
+        }
+        return self.respond(data)
+
+    # The task is completed by the user, like in TaskCompleteView
+    def complete(self, ids):
+        now = timezone.now()
+        Task.objects.filter(pk__in=ids).update(
+            status=Task.COMPLETED, completer=self.request.user, date_completed=now,
+            completion_comment=self.request.POST.get('completion_comment') or None, updated=now,
+            version=F('version') + 1)
+        tasks_updated.send(sender=Task, task_ids=ids, previous=self.previous, actor=self.request.user,
+                           changes={'status': Task.COMPLETED, 'completer_id': self.request.user.pk})
+
+    # The COMPLETER of the assign action, None to leave the tasks to anyone
+    def get_completer(self):
+        value = self.request.POST.get('completer')
+        if not value:
+            return None
+        try:
+            return User.objects.get(pk=int(value), role=User.COMPLETER)
+        except ValueError:
+            raise User.DoesNotExist
+
+    # The tasks are assigned to a COMPLETER (or to anyone, without one), like in TaskUpdateView
+    def assign(self, ids):
+        completer = self.completer
+        Task.objects.filter(pk__in=ids).update(completer=completer, updated=timezone.now(),
+                                               version=F('version') + 1)
+        tasks_updated.send(sender=Task, task_ids=ids, previous=self.previous, actor=self.request.user,
+                           changes={'completer_id': completer.pk if completer else None})
+
+    # Deleting through the queryset still sends post_delete for every task
+    def delete(self, ids):
+        Task.objects.filter(pk__in=ids).delete()
+
+    def respond(self, data, status=200):
+        if 'application/json' in self.request.headers.get('Accept', ''):
+            return JsonResponse(data, status=status)
+        if 'error' in data:
+            messages.error(self.request, data['error'])
+        else:
+            messages.success(self.request, f"{len(data['updated'])} task(s) updated.")
+            if data['rejected']:
+                messages.warning(self.request, 'These tasks were not allowed: '
+                                 + ', '.join(f'#{pk}' for pk in data['rejected']))
+        next_url = self.request.POST.get('next')
+        if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={self.request.get_host()}):
+            next_url = 'tasks-home'
+        return redirect(next_url)
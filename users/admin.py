@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import User, Profile
+from .models import User, Profile, ImageJob
 
 admin.site.register(User)
-admin.site.register(Profile)
\ No newline at end of file
+admin.site.register(Profile)
+admin.site.register(ImageJob)
\ No newline at end of file
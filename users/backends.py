@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from .models import User
+
+
+def user_cache():
+    return caches[getattr(settings, 'AUTH_USER_CACHE', 'default')]
+
+
+def user_cache_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+# Called by the User/Profile signals
+def forget_cached_user(user_id):
+    user_cache().delete(user_cache_key(user_id))
+
+
+# This backend loads the user of a session together with its profile (every page shows
+# the avatar) and keeps the pair in the cache for AUTH_USER_CACHE_TIMEOUT seconds
+# (None: no caching). The session's auth hash is still checked against the cached user,
+# and any save of the user or the profile drops it from the cache
+class CachedUserBackend(ModelBackend):
+    def get_user(self, user_id):
+        timeout = getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', None)
+        user = user_cache().get(user_cache_key(user_id)) if timeout is not None else None
+        if user is None:
+            try:
+                user = User._default_manager.select_related('profile').get(pk=user_id)
+            except User.DoesNotExist:
+                return None
+            if timeout is not None:
+                user_cache().set(user_cache_key(user_id), user, timeout)
+        return user if self.user_can_authenticate(user) else None
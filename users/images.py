@@ -0,0 +1,66 @@
+import hashlib
+import os
+from io import BytesIO
+from django.core.files.base import ContentFile
+from PIL import Image
+
+
+# Avatar variants generated for every profile image: square-bounded sizes in pixels, and formats
+AVATAR_SIZES = (32, 64, 300)
+AVATAR_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+# The stored original is shrunk to fit this, like the uploads always were
+ORIGINAL_SIZE = 300
+
+
+# Variants are content-addressed: the name only depends on the image bytes, so a URL
+# never changes meaning (it can be cached forever) and identical uploads share their files
+def avatar_original_name(digest, extension):
+    return f'avatars/{digest[:2]}/{digest}{extension}'
+
+
+def avatar_variant_name(digest, size, fmt):
+    return f'avatars/{digest[:2]}/{digest}-{size}.{fmt}'
+
+
+def render_variant(img, size, fmt):
+    variant = img.copy()
+    variant.thumbnail((size, size))
+    if AVATAR_FORMATS[fmt] == 'JPEG' and variant.mode not in ('RGB', 'L'):
+        variant = variant.convert('RGB')
+    buffer = BytesIO()
+    variant.save(buffer, AVATAR_FORMATS[fmt], quality=85)
+    return buffer.getvalue()
+
+
+# This moves the profile image to its content-addressed name and generates the missing
+# variants. Returns the new image name and the content hash
+def process_profile_image(profile):
+    storage = profile.image.storage
+    uploaded_name = profile.image.name
+    with storage.open(uploaded_name, 'rb') as f:
+        data = f.read()
+
+    img = Image.open(BytesIO(data))
+    img.load()
+    if img.width > ORIGINAL_SIZE or img.height > ORIGINAL_SIZE:
+        img_format = img.format
+        img.thumbnail((ORIGINAL_SIZE, ORIGINAL_SIZE))
+        buffer = BytesIO()
+        img.save(buffer, img_format)
+        data = buffer.getvalue()
+    digest = hashlib.sha256(data).hexdigest()
+
+    extension = os.path.splitext(uploaded_name)[1].lower() or '.' + img.format.lower()
+    original_name = avatar_original_name(digest, extension)
+    if not storage.exists(original_name):
+        storage.save(original_name, ContentFile(data))
+
+    for size in AVATAR_SIZES:
+        for fmt in AVATAR_FORMATS:
+            name = avatar_variant_name(digest, size, fmt)
+            if not storage.exists(name):
+                storage.save(name, ContentFile(render_variant(img, size, fmt)))
+
+    if uploaded_name != original_name:
+        storage.delete(uploaded_name)
+    return original_name, digest
@@ -0,0 +1,54 @@
+import time
+import uuid
+from django.contrib.auth import user_logged_in
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from users.backends import forget_cached_user
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+# This command measures what a login costs besides checking the password: the
+# user_logged_in signal saves last_login, and the User post_save signals run after it.
+# Everything runs inside a transaction that is rolled back, with a user of its own
+class Command(BaseCommand):
+    help = 'Measure the queries and time spent per login (password hashing excluded)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200)
+
+    def handle(self, *args, **options):
+        count = options['logins']
+        user = None
+        try:
+            with transaction.atomic():
+                # a unique name, so that it never collides with a real user
+                user = User.objects.create_user(username=f'bench_login_{uuid.uuid4().hex[:12]}',
+                                                role=User.CREATOR)
+                request = RequestFactory().get('/')
+
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    for _ in range(count):
+                        # a fresh instance per login, like the one loaded by the login form
+                        user = User.objects.get(pk=user.pk)
+                        user_logged_in.send(sender=User, request=request, user=user)
+                    elapsed = time.perf_counter() - start
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            # the rollback deletes the user's rows, the cache may still hold it
+            if user is not None:
+                forget_cached_user(user.pk)
+
+        # one query per iteration is the User load above, it's not part of the login
+        queries_per_login = len(queries) / count - 1
+        self.stdout.write(f'logins: {count}')
+        self.stdout.write(f'queries per login: {queries_per_login:.1f}')
+        self.stdout.write(f'time per login: {elapsed / count * 1000:.3f} ms')
@@ -0,0 +1,61 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from users.models import ImageJob
+
+
+# This command is the background worker for profile images. Several workers can run at once:
+# jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED on Postgres
+class Command(BaseCommand):
+    help = 'Process the queued profile image jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the pending jobs and exit')
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Seconds after which a running job is considered abandoned by its worker')
+
+    def handle(self, *args, **options):
+        while True:
+            self.requeue_stale(options['stale_after'])
+            jobs = self.claim(options['batch_size'])
+            for job in jobs:
+                self.process(job)
+            if options['once'] and not jobs:
+                return
+            if not jobs:
+                time.sleep(options['sleep'])
+
+    def claim(self, batch_size):
+        with transaction.atomic():
+            jobs = list(ImageJob.objects.select_for_update(skip_locked=True, of=('self',))
+                        .select_related('profile')
+                        .filter(status=ImageJob.PENDING)
+                        .order_by('created')[:batch_size])
+            if jobs:
+                ImageJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                    status=ImageJob.RUNNING, attempts=F('attempts') + 1, updated=timezone.now())
+        for job in jobs:
+            job.attempts += 1
+        return jobs
+
+    def process(self, job):
+        try:
+            job.run()
+        except Exception as e:
+            job.error = repr(e)
+            job.status = ImageJob.PENDING if job.attempts < ImageJob.MAX_ATTEMPTS else ImageJob.FAILED
+            self.stderr.write(f'Image job {job.pk} failed: {job.error}')
+        else:
+            job.status = ImageJob.DONE
+            self.stdout.write(f'Image job {job.pk} done')
+        job.save(update_fields=['status', 'error', 'updated'])
+
+    def requeue_stale(self, stale_after):
+        cutoff = timezone.now() - timedelta(seconds=stale_after)
+        ImageJob.objects.filter(status=ImageJob.RUNNING, updated__lt=cutoff).update(
+            status=ImageJob.PENDING, updated=timezone.now())
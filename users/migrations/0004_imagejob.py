@@ -0,0 +1,31 @@
+# Generated by Django 4.2.3 on 2026-10-18 14:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_profile_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image_name', models.CharField(max_length=255)),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'Pending'), (2, 'Running'), (3, 'Done'), (4, 'Failed')], default=1)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_jobs', to='users.profile')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 1)), fields=['created'], name='imagejob_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_imagejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='image_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
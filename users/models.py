@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
-from PIL import Image
+from django.utils import timezone
+from .images import AVATAR_SIZES, avatar_variant_name, process_profile_image
 
 
 # this class extends the AbstractUser model to provide role choices
@@ -14,21 +15,107 @@ class User(AbstractUser):
     )
     role = models.PositiveSmallIntegerField(choices=ROLE_CHOICES, blank=False, null=False)
 
+    # remember the loaded username, so that the signals can tell whether it changed
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_username = instance.__dict__.get('username')
+        return instance
+
+    def username_changed(self):
+        return getattr(self, '_loaded_username', None) != self.username
+
 
 # this class creates a 1-to-1 matching between Users and their corresponding profiles
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     image = models.ImageField(default='default.png', upload_to='profile_pics')
+    # content hash of the processed image, the avatar variants are named after it
+    image_hash = models.CharField(max_length=64, blank=True, default='')
+    # Bumped on every save, used as the author's version of the cached task cards
+    updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'{self.user.username} Profile'
     
+    # remember the loaded image, so that save() only queues image processing when it changed
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_image = instance.__dict__.get('image')
+        return instance
+
     # this save the data, which contains Profile image and User fields
+    # a changed image is resized later by the image job worker (manage.py process_image_jobs),
+    # until then the original upload is served: the variants of the previous image are dropped
     def save(self, *args, **kwargs):
+        image_changed = self.image.name != getattr(self, '_loaded_image', None)
+        if image_changed and self.image_hash:
+            self.image_hash = ''
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'image_hash'}
         super(Profile, self).save(*args, **kwargs)
 
-        img = Image.open(self.image.path)
+        self._loaded_image = self.image.name
+        if image_changed and self.image.name != self._meta.get_field('image').default:
+            ImageJob.objects.create(profile=self, image_name=self.image.name)
+
+    # this is called by the image job worker, the processed image doesn't need another job
+    def set_processed_image(self, name, image_hash):
+        self.image.name = name
+        self.image_hash = image_hash
+        self._loaded_image = name
+        self.save(update_fields=['image', 'image_hash', 'updated'])
+
+    # the avatar variants exist once the image job is done, until then the original is served
+    def avatar_url(self, size, fmt='jpeg'):
+        if not self.image_hash:
+            return self.image.url
+        return self.image.storage.url(avatar_variant_name(self.image_hash, size, fmt))
+
+    def avatar_srcset(self, fmt='jpeg'):
+        if not self.image_hash:
+            return ''
+        return ', '.join(f'{self.avatar_url(size, fmt)} {size}w' for size in AVATAR_SIZES)
+
+
+# this class is a queue of profile image jobs, stored in the database so no broker is needed
+class ImageJob(models.Model):
+    PENDING = 1
+    RUNNING = 2
+    DONE = 3
+    FAILED = 4
+
+    JOB_STATUS = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    MAX_ATTEMPTS = 3
+
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='image_jobs')
+    # the file the job was created for, the profile image may have changed since
+    image_name = models.CharField(max_length=255)
+    status = models.PositiveSmallIntegerField(choices=JOB_STATUS, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    updated = models.DateTimeField(auto_now=True)
+
+    # the worker only ever scans the pending jobs (status=PENDING)
+    class Meta:
+        indexes = [
+            models.Index(fields=['created'], condition=models.Q(status=1), name='imagejob_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.image_name} ({self.get_status_display()})'
 
-        if img.height > 300 or img.width > 300:
-            img.thumbnail((300, 300))
-            img.save(self.image.path)
+    # this stores the image under its content hash and generates the avatar variants
+    def run(self):
+        if self.profile.image.name != self.image_name:
+            return
+        name, image_hash = process_profile_image(self.profile)
+        self.profile.set_processed_image(name, image_hash)
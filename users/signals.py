@@ -1,5 +1,6 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from .backends import forget_cached_user
 from .models import Profile, User
 
 
@@ -10,7 +11,23 @@ def create_profile(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)
 
 
-# this allows to save profile image
+# the profile is the version of everything shown about a user (e.g. the cached task cards),
+# so a username change touches it. Other User saves, like last_login on every login, don't
 @receiver(post_save, sender=User)
-def create_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+def touch_profile(sender, instance, created, **kwargs):
+    if not created and instance.username_changed():
+        instance.profile.save(update_fields=['updated'])
+    instance._loaded_username = instance.username
+
+
+# the cached session user carries its profile, a change of either one drops it
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user(sender, instance, **kwargs):
+    forget_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def forget_profile_user(sender, instance, **kwargs):
+    forget_cached_user(instance.user_id)
@@ -0,0 +1,24 @@
+from django import template
+from django.utils.html import format_html
+from ..images import AVATAR_SIZES
+
+register = template.Library()
+
+
+# Renders a profile avatar displayed at `size` CSS pixels. The browser picks the
+# variant it needs from the srcset, and WebP when it supports it
+@register.simple_tag
+def avatar(profile, size, css_class=''):
+    if not profile.image_hash:
+        return format_html('<img class="{}" src="{}" alt="">', css_class, profile.image.url)
+
+    sizes = f'{size}px'
+    fallback = next((s for s in AVATAR_SIZES if s >= size), AVATAR_SIZES[-1])
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img class="{}" src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="">'
+        '</picture>',
+        profile.avatar_srcset('webp'), sizes,
+        css_class, profile.avatar_url(fallback), profile.avatar_srcset(), sizes, size, size,
+    )
@@ -1,3 +1,216 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from django.contrib.auth import user_logged_in
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from .backends import user_cache, user_cache_key
+from .models import User, Profile, ImageJob
 
-# Create your tests here.
+
+def make_user(username, role=User.CREATOR):
+    return User.objects.create_user(username=username, password='testpass123', role=role)
+
+
+def make_image(size, color='red', name='avatar.jpg'):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+# Gives each test an empty MEDIA_ROOT, so uploads don't end up in the repository
+class MediaRootMixin:
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+
+class ImageJobTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('uploader')
+        self.client.force_login(self.user)
+
+    def upload(self, size):
+        return self.client.post(reverse('profile'), {
+            'username': 'uploader', 'email': 'uploader@example.com', 'role': User.CREATOR,
+            'image': make_image(size),
+        })
+
+    def run_worker(self):
+        call_command('process_image_jobs', once=True, stdout=StringIO(), stderr=StringIO())
+
+    def test_upload_is_processed_in_the_background(self):
+        response = self.upload((900, 600))
+        self.assertEqual(response.status_code, 302)
+        self.user.profile.refresh_from_db()
+        uploaded_path = self.user.profile.image.path
+        # the original is served until the job runs
+        self.assertEqual(self.user.profile.image_hash, '')
+        self.assertEqual(self.user.profile.avatar_url(64), self.user.profile.image.url)
+        job = ImageJob.objects.get()
+        self.assertEqual(job.status, ImageJob.PENDING)
+
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.DONE)
+        self.assertEqual(job.attempts, 1)
+
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(len(profile.image_hash), 64)
+        self.assertEqual(profile.image.name, f'avatars/{profile.image_hash[:2]}/{profile.image_hash}.jpg')
+        self.assertFalse(os.path.exists(uploaded_path))
+        # the stored original fits 300x300
+        self.assertEqual(Image.open(profile.image.path).size, (300, 200))
+        for size, expected in [(32, (32, 21)), (64, (64, 43)), (300, (300, 200))]:
+            for fmt in ('webp', 'jpeg'):
+                url = profile.avatar_url(size, fmt)
+                self.assertTrue(url.endswith(f'{profile.image_hash}-{size}.{fmt}'))
+                path = os.path.join(self.media_root, url[len('/media/'):])
+                self.assertEqual(Image.open(path).size, expected)
+
+    def test_saving_without_a_new_upload_does_not_queue_a_job(self):
+        self.user.profile.save()
+        self.user.save()
+        self.assertFalse(ImageJob.objects.exists())
+
+    def test_superseded_job_leaves_the_new_image_alone(self):
+        self.upload((900, 900))
+        self.upload((400, 400))
+        self.run_worker()
+        self.assertEqual(ImageJob.objects.filter(status=ImageJob.DONE).count(), 2)
+        self.user.profile.refresh_from_db()
+        self.assertEqual(Image.open(self.user.profile.image.path).size, (300, 300))
+        self.assertEqual(ImageJob.objects.count(), 2)
+
+    def test_identical_uploads_share_their_files(self):
+        other = make_user('other')
+        self.upload((500, 500))
+        self.client.force_login(other)
+        self.client.post(reverse('profile'), {
+            'username': 'other', 'email': 'other@example.com', 'role': User.CREATOR,
+            'image': make_image((500, 500)),
+        })
+        self.run_worker()
+        first = Profile.objects.get(user=self.user)
+        second = Profile.objects.get(user=other)
+        self.assertEqual(first.image.name, second.image.name)
+        files = os.listdir(os.path.join(self.media_root, 'avatars', first.image_hash[:2]))
+        self.assertEqual(len(files), 7)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'profile_pics')), [])
+
+    def test_avatar_markup_and_cache_headers(self):
+        self.upload((500, 500))
+        self.run_worker()
+        response = self.client.get(reverse('profile'))
+        profile = Profile.objects.get(user=self.user)
+        self.assertContains(response, f'{profile.avatar_url(32, "webp")} 32w')
+        self.assertContains(response, f'src="{profile.avatar_url(300)}"')
+
+        response = self.client.get(profile.avatar_url(64, 'webp'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertEqual(self.client.get('/media/avatars/missing.webp').status_code, 404)
+
+    # the variants of the previous image aren't served for the new upload
+    def test_new_upload_serves_the_original_until_processed(self):
+        self.upload((500, 500))
+        self.run_worker()
+        self.upload((600, 400))
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(profile.image_hash, '')
+        self.assertTrue(profile.image.name.startswith('profile_pics/'))
+        self.assertEqual(profile.avatar_url(64), profile.image.url)
+        self.assertEqual(profile.avatar_srcset(), '')
+
+    def test_failing_job_is_retried_then_failed(self):
+        self.upload((900, 900))
+        self.user.profile.refresh_from_db()
+        with open(self.user.profile.image.path, 'wb') as f:
+            f.write(b'not an image')
+        self.run_worker()
+        job = ImageJob.objects.get()
+        self.assertEqual(job.status, ImageJob.FAILED)
+        self.assertEqual(job.attempts, ImageJob.MAX_ATTEMPTS)
+        self.assertTrue(job.error)
+
+
+class UserSaveTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('someone')
+
+    def test_login_only_saves_last_login(self):
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            user_logged_in.send(sender=User, request=None, user=user)
+
+    def test_username_change_touches_the_profile(self):
+        user = User.objects.get(pk=self.user.pk)
+        before = user.profile.updated
+        user.username = 'renamed'
+        user.save()
+        user.profile.refresh_from_db()
+        self.assertGreater(user.profile.updated, before)
+        self.assertFalse(ImageJob.objects.exists())
+
+    def test_assigning_another_image_queues_a_job(self):
+        profile = User.objects.get(pk=self.user.pk).profile
+        profile.image = 'profile_pics/elsewhere.jpg'
+        profile.save()
+        profile.save()
+        self.assertEqual(ImageJob.objects.get().image_name, 'profile_pics/elsewhere.jpg')
+
+    def test_bench_logins_command(self):
+        users = User.objects.count()
+        out = StringIO()
+        call_command('bench_logins', logins=5, stdout=out)
+        self.assertIn('queries per login: 1.0', out.getvalue())
+        # the benchmark user is gone, and its name is its own
+        self.assertEqual(User.objects.count(), users)
+        make_user('bench_login_user')
+        call_command('bench_logins', logins=1, stdout=StringIO())
+
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        caches['sessions'].clear()
+        user_cache().clear()
+        self.user = make_user('cached')
+        self.client.force_login(self.user)
+
+    def test_logged_in_page_does_not_query_the_session_or_the_user(self):
+        self.client.get(reverse('profile'))
+        # the task statistics shown on the profile are the only query
+        with self.assertNumQueries(1):
+            request_user = self.client.get(reverse('profile')).wsgi_request.user
+        self.assertEqual(request_user.pk, self.user.pk)
+        self.assertEqual(request_user.profile.pk, self.user.profile.pk)
+
+    def test_saving_the_user_or_the_profile_drops_the_cached_user(self):
+        self.client.get(reverse('profile'))
+        self.assertIsNotNone(user_cache().get(user_cache_key(self.user.pk)))
+        self.user.profile.save()
+        self.assertIsNone(user_cache().get(user_cache_key(self.user.pk)))
+
+        self.client.get(reverse('profile'))
+        self.user.email = 'cached@example.com'
+        self.user.save()
+        self.assertIsNone(user_cache().get(user_cache_key(self.user.pk)))
+
+    def test_deactivated_user_is_logged_out(self):
+        self.client.get(reverse('profile'))
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 302)
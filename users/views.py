@@ -1,6 +1,10 @@
 from django.shortcuts import render, redirect
+from django.conf import settings
 from django.contrib import messages
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
 from .forms import UserRegisterForm, UserUpdateForm, ProfileUpdateForm
+from tasks.models import UserTaskStats
 from django.contrib.auth.decorators import login_required
 
 
@@ -38,7 +42,16 @@ def profile(request):
     
     context = {
         'u_form': u_form,
-        'p_form': p_form
+        'p_form': p_form,
+        'task_stats': UserTaskStats.for_user(request.user),
     }
 
-    return render(request, "users/profile.html", context)
\ No newline at end of file
+    return render(request, "users/profile.html", context)
+
+
+# this function serves the avatar variants. Their names are content hashes, so a URL
+# always points at the same bytes and browsers/CDNs can cache it forever
+def avatar(request, path):
+    response = serve(request, 'avatars/' + path, document_root=settings.MEDIA_ROOT)
+    patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return response